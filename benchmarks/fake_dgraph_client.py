@@ -0,0 +1,137 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Tuple
+
+from pydgraph import AbortedError, Assigned, Response, SchemaNode
+
+SCHEMA_LINE = re.compile(r"<(?P<predicate>[^>]+)>: (?P<type>\w+)(?P<directives>.*) \.")
+PAGE = re.compile(r"first: (?P<first>\d+)(?:, after: (?P<after>0x[0-9a-f]+))?")
+EQ_LOOKUP = re.compile(r"func: eq\((?P<predicate>\w+), (?P<values>\[.*?\])\)")
+
+
+class FakeDataSource:
+    def __init__(self, client: "FakeDgraphClient") -> None:
+        self.client = client
+
+
+class FakeDgraphClient:
+    """In-memory stand-in for pydgraph.DgraphClient that records committed mutations."""
+
+    def __init__(self, aborts: int = 0) -> None:
+        self.aborts = aborts
+        self.committed: List[List[Dict[str, Any]]] = []
+        self.deleted: List[Dict[str, Any]] = []
+        self.xids: Dict[str, str] = {}
+        self.queries: List[str] = []
+        self.requests: List[Tuple[str, ...]] = []  # what every mutate call carried, "delete" and/or "set"
+        self.operations = []
+        self.schema: Dict[str, SchemaNode] = {}
+        self.transactions = 0
+        self._next_uid = 1
+        self._lock = threading.Lock()
+
+    def txn(self, read_only=False, best_effort=False) -> "FakeTxn":
+        with self._lock:
+            self.transactions += 1
+        return FakeTxn(self)
+
+    def alter(self, operation, timeout=None, metadata=None, credentials=None):
+        self.operations.append(operation)
+        for line in operation.schema.splitlines():
+            match = SCHEMA_LINE.match(line)
+            if match:
+                self.schema[match["predicate"]] = _schema_node(match["predicate"], match["type"], match["directives"])
+
+    def query(self, query, variables=None, timeout=None, metadata=None, credentials=None) -> Response:
+        self.queries.append(query)
+        if query == "schema {}":
+            return Response(schema=list(self.schema.values()))
+        if "has(xid)" in query:
+            nodes = sorted(({"uid": uid, "xid": xid} for xid, uid in self.xids.items()), key=lambda n: int(n["uid"], 16))
+            page = PAGE.search(query)
+            if page and page["after"]:
+                nodes = [node for node in nodes if int(node["uid"], 16) > int(page["after"], 16)]
+            return _response({"nodes": nodes[:int(page["first"])] if page else nodes})
+        lookup = EQ_LOOKUP.search(query)
+        if lookup:
+            predicate, values = lookup["predicate"], set(json.loads(lookup["values"]))
+            return _response({"products": [obj for obj in self.committed_objects
+                                           if obj.get("label") == "product" and obj.get(predicate) in values]})
+        return _response({})
+
+    def assign_uid(self) -> str:
+        with self._lock:
+            uid = hex(self._next_uid)
+            self._next_uid += 1
+            return uid
+
+    def commit(self, mutations: List[List[Dict[str, Any]]], deletes: List[Dict[str, Any]], assigned: Dict[str, str]):
+        with self._lock:
+            if self.aborts > 0:
+                self.aborts -= 1
+                raise AbortedError()
+            self.deleted.extend(deletes)
+            self.committed.extend(mutations)
+            for obj in _objects(mutations):
+                if "xid" in obj:
+                    self.xids[obj["xid"]] = assigned[obj["uid"][2:]]
+
+    @property
+    def committed_objects(self) -> List[Dict[str, Any]]:
+        return [obj for mutation in self.committed for obj in mutation]
+
+
+class FakeTxn:
+
+    def __init__(self, client: FakeDgraphClient) -> None:
+        self.client = client
+        self.mutations = []
+        self.deletes = []
+        self.assigned: Dict[str, str] = {}
+        self.finished = False
+
+    def mutate(self, mutation=None, set_obj=None, del_obj=None, set_nquads=None, del_nquads=None, commit_now=None,
+               ignore_index_conflict=None, timeout=None, metadata=None, credentials=None):
+        if mutation is not None:
+            set_obj = json.loads(mutation.set_json.decode("utf8")) if mutation.set_json else None
+            del_obj = json.loads(mutation.delete_json.decode("utf8")) if mutation.delete_json else None
+        objects = set_obj or []
+        self.client.requests.append(tuple(kind for kind, value in (("delete", del_obj), ("set", objects)) if value))
+        self.deletes.extend(del_obj or [])
+        if objects:
+            self.mutations.append(objects)
+        uids = {}
+        for obj in _objects(objects):
+            if obj.get("uid", "").startswith("_:") and obj["uid"][2:] not in uids:
+                uids[obj["uid"][2:]] = self.client.assign_uid()
+        self.assigned.update(uids)
+        return Assigned(uids=uids)
+
+    def commit(self, timeout=None, metadata=None, credentials=None):
+        self.finished = True
+        self.client.commit(self.mutations, self.deletes, self.assigned)
+
+    def discard(self, timeout=None, metadata=None, credentials=None):
+        self.finished = True
+
+
+def _objects(value):
+    if isinstance(value, list):
+        for item in value:
+            yield from _objects(item)
+    elif isinstance(value, dict):
+        yield value
+        for item in value.values():
+            yield from _objects(item)
+
+
+def _schema_node(predicate: str, type_: str, directives: str) -> SchemaNode:
+    index = re.search(r"@index\(([^)]*)\)", directives)
+    tokenizers = [tokenizer.strip() for tokenizer in index.group(1).split(",")] if index else []
+    return SchemaNode(predicate=predicate, type=type_, index=bool(index), tokenizer=tokenizers,
+                      count="@count" in directives, reverse="@reverse" in directives, upsert="@upsert" in directives)
+
+
+def _response(result) -> Response:
+    return Response(json=json.dumps(result).encode("utf8"))
@@ -0,0 +1,65 @@
+"""
+Microbenchmark: construction time and per-object memory of the models against the per-instance labelling that
+`with_label` used to do (a new dataclasses.Field written into __dataclass_fields__ plus an instance attribute on every
+construction, on a regular __dict__ dataclass).
+
+    python -m benchmarks.model_construction
+"""
+import dataclasses
+import functools
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+
+from models.product_models import Ingredient
+
+NUMBER = 200_000
+
+
+def _legacy_with_label(label: str):
+    def first_wrapper(func):
+        @functools.wraps(func)
+        def second_wrapper(*args, **kwargs):
+            result = func(*args, **kwargs)
+            label_field = dataclasses.field(compare=False)
+            label_field.name = "label"
+            label_field.type = str
+            label_field._field_type = dataclasses._FIELD
+            result.__dataclass_fields__["label"] = label_field
+            result.label = label
+            return result
+
+        return second_wrapper
+
+    return first_wrapper
+
+
+@_legacy_with_label("ingredient")
+@dataclass
+class LegacyIngredient:
+    uid: str
+    name: str
+
+
+def _bytes_per_object(factory, count: int = 10_000) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory("_:ingredient_sugar", "sugar") for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del objects
+    return allocated / count
+
+
+def run() -> dict:
+    results = {}
+    for name, factory in (("legacy with_label", LegacyIngredient), ("class label + __slots__", Ingredient)):
+        seconds = min(timeit.repeat(lambda: factory("_:ingredient_sugar", "sugar"), number=NUMBER, repeat=3))
+        results[name] = {"ns_per_object": seconds / NUMBER * 1e9, "bytes_per_object": _bytes_per_object(factory)}
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(f"{name:<25} {result['ns_per_object']:8.1f} ns/object {result['bytes_per_object']:8.1f} bytes/object")
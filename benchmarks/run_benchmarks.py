@@ -0,0 +1,94 @@
+"""
+Times the ingest stages on synthetic USDA-shaped data and writes the results as JSON, so runs can be compared.
+
+    python -m benchmarks.run_benchmarks --scale 100k --output bench_100k.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks.fake_dgraph_client import FakeDataSource, FakeDgraphClient
+from benchmarks.synthetic_data import SCALES, generate
+from csv_parser.ingredient_tokenizer import tokenize_ingredients
+from csv_parser.merge_join import read_rows
+from csv_parser.product_parser import ProductParser
+from repository.mutation_serializer import MutationSerializer
+from repository.product_repository import ProductRepository
+from repository.uid_cache import UidCache
+
+
+def timed(name: str, rows: int, results: Dict[str, dict], function: Callable[[], object]) -> object:
+    started_wall, started_cpu = time.perf_counter(), time.process_time()
+    result = function()
+    wall, cpu = time.perf_counter() - started_wall, time.process_time() - started_cpu
+    results[name] = {"rows": rows, "wall_seconds": round(wall, 4), "cpu_seconds": round(cpu, 4),
+                     "rows_per_second": round(rows / wall, 1) if wall else None}
+    print(f"{name:<28} {wall:8.3f}s {results[name]['rows_per_second']:>12} rows/s")
+    return result
+
+
+def run(data_dir: Path, scale: str) -> dict:
+    products_count = sum(1 for _ in read_rows(data_dir.joinpath("Products.csv")))
+    nutrients_count = sum(1 for _ in read_rows(data_dir.joinpath("Nutrient.csv")))
+    memos = [row[7] for row in read_rows(data_dir.joinpath("Products.csv"))]
+    results: Dict[str, dict] = {}
+
+    nutrients = timed("get_nutrients", nutrients_count, results, ProductParser(data_dir).get_nutrients)
+    timed("get_products", products_count, results, lambda: ProductParser(data_dir).get_products(nutrients))
+    del nutrients
+
+    def process_memos():
+        tokenize_ingredients.cache_clear()
+        parser = ProductParser(data_dir)
+        return [parser._process_product_memo(memo) for memo in memos]
+
+    timed("_process_product_memo", len(memos), results, process_memos)
+    products: List = timed("parse_iter", products_count, results, lambda: list(ProductParser(data_dir).parse_iter()))
+    timed("serialize", len(products), results, lambda: MutationSerializer().serialize(products))
+
+    client = FakeDgraphClient()
+    timed("addProducts", len(products), results,
+          lambda: ProductRepository(FakeDataSource(client)).addProducts(products))
+    timed("bulkAddProducts", len(products), results,
+          lambda: ProductRepository(FakeDataSource(FakeDgraphClient()), UidCache()).bulkAddProducts(products))
+
+    return {
+        "scale": scale,
+        "products": products_count,
+        "nutrient_rows": nutrients_count,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--scale", choices=SCALES, default="10k")
+    arg_parser.add_argument("--data-dir", type=Path, help="reuse (or create) generated data in this directory")
+    arg_parser.add_argument("--output", type=Path, help="write the JSON results here instead of stdout")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="usda_bench_") as tmp_dir:
+        data_dir = args.data_dir or Path(tmp_dir)
+        if not data_dir.joinpath("Products.csv").exists():
+            generate(data_dir, SCALES[args.scale])
+        report = json.dumps(run(data_dir, args.scale), indent=2)
+    if args.output:
+        args.output.write_text(report)
+    else:
+        print(report)
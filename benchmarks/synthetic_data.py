@@ -0,0 +1,100 @@
+"""
+Deterministic generator of USDA-shaped Products.csv, Nutrient.csv and Serving_Size.csv.
+
+    python -m benchmarks.synthetic_data 100k /tmp/usda_100k
+"""
+import csv
+import random
+import sys
+from pathlib import Path
+from typing import List
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+PRODUCTS_HEADER = ["NDB_Number", "long_name", "data_source", "gtin_upc", "manufacturer", "date_modified",
+                   "date_available", "ingredients_english"]
+NUTRIENTS_HEADER = ["NDB_No", "Nutrient_Code", "Nutrient_name", "Derivation_Code", "Output_value", "Output_uom"]
+SERVING_SIZES_HEADER = ["NDB_No", "Serving_Size", "Serving_Size_UOM", "Household_Serving_Size",
+                        "Household_Serving_Size_UOM", "Preparation_State"]
+
+FIRST_NDB_NUMBER = 45001524
+DATA_SOURCES = ["LI", "GDSN"]
+DERIVATION_CODES = ["LCCS", "LCCD", "LCSL", "LCCS", "LCCS"]
+UNITS = {"g": 0.7, "mg": 0.2, "µg": 0.05, "IU": 0.03, "kcal": 0.02}
+WORDS = ["sugar", "salt", "water", "corn", "wheat", "flour", "oil", "soybean", "palm", "milk", "cream", "whey",
+         "cocoa", "butter", "syrup", "starch", "modified", "natural", "artificial", "flavor", "color", "citric",
+         "acid", "lecithin", "vitamin", "niacin", "iron", "riboflavin", "folic", "rice", "egg", "yeast", "garlic",
+         "onion", "tomato", "paste", "vinegar", "spices", "dextrose", "gum", "xanthan", "guar", "calcium",
+         "chloride", "sodium", "phosphate", "potassium", "sorbate", "enriched", "organic", "dried", "powder"]
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def generate(directory: Path, products: int, seed: int = 0) -> Path:
+    """Writes the three CSVs for `products` products into `directory`; the same arguments give the same bytes."""
+    rnd = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    ingredients = [_ingredient(rnd) for _ in range(max(200, products // 20))]
+    manufacturers = [f"{rnd.choice(WORDS).title()} {rnd.choice(['Foods', 'Inc.', 'LLC', 'Co.'])} {i}"
+                     for i in range(max(10, products // 25))]
+    nutrients = [(str(203 + i), f"Nutrient {203 + i}", _unit(rnd)) for i in range(120)]
+    shared_memos: List[str] = []
+
+    with open(directory.joinpath("Products.csv"), "w", newline="") as products_file, \
+            open(directory.joinpath("Nutrient.csv"), "w", newline="") as nutrients_file, \
+            open(directory.joinpath("Serving_Size.csv"), "w", newline="") as serving_sizes_file:
+        products_csv = csv.writer(products_file)
+        nutrients_csv = csv.writer(nutrients_file)
+        serving_sizes_csv = csv.writer(serving_sizes_file)
+        products_csv.writerow(PRODUCTS_HEADER)
+        nutrients_csv.writerow(NUTRIENTS_HEADER)
+        serving_sizes_csv.writerow(SERVING_SIZES_HEADER)
+
+        for i in range(products):
+            ndb_number = str(FIRST_NDB_NUMBER + i)
+            if shared_memos and rnd.random() < 0.3:  # private-label products repeat ingredient statements
+                memo = rnd.choice(shared_memos)
+            else:
+                memo = _memo(rnd, ingredients)
+                if len(shared_memos) < 5000:
+                    shared_memos.append(memo)
+            products_csv.writerow([
+                ndb_number, " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(2, 6))).upper(),
+                rnd.choice(DATA_SOURCES), f"{rnd.randrange(10 ** 12):012}", rnd.choice(manufacturers),
+                _date(rnd), _date(rnd), memo,
+            ])
+            for code, name, unit in sorted(rnd.sample(nutrients, rnd.randint(5, 25))):
+                nutrients_csv.writerow([ndb_number, code, name, rnd.choice(DERIVATION_CODES),
+                                        f"{rnd.uniform(0, 100):.2f}", unit])
+            serving_sizes_csv.writerow([ndb_number, f"{rnd.choice([15, 28, 30, 100, 240])}", "g",
+                                        f"{rnd.randint(1, 4)}", rnd.choice(["cup", "tbsp", "ONZ", "pieces"]), ""])
+    return directory
+
+
+def _ingredient(rnd: random.Random) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(rnd.choice([1, 1, 2, 2, 3]))).upper()
+
+
+def _memo(rnd: random.Random, ingredients: List[str]) -> str:
+    items = [rnd.choice(ingredients) for _ in range(int(rnd.lognormvariate(2.3, 0.6)) + 1)]
+    for _ in range(rnd.randint(0, 3)):
+        position = rnd.randrange(len(items))
+        items[position] += f" ({', '.join(rnd.choice(ingredients) for _ in range(rnd.randint(1, 4)))})"
+    if rnd.random() < 0.1:
+        items[0] = f"{rnd.choice(ingredients)}: {items[0]}"
+    if rnd.random() < 0.3:
+        items[-1] += f" AND {rnd.choice(ingredients)}"
+    return ", ".join(items) + rnd.choice([",", ".", ""])
+
+
+def _date(rnd: random.Random) -> str:
+    return f"{rnd.choice(DAYS)} {rnd.choice(MONTHS)} {rnd.randint(1, 28):02} {rnd.randint(0, 23):02}:" \
+           f"{rnd.randint(0, 59):02}:{rnd.randint(0, 59):02} GMT {rnd.randint(2015, 2019)}"
+
+
+def _unit(rnd: random.Random) -> str:
+    return rnd.choices(list(UNITS), weights=list(UNITS.values()))[0]
+
+
+if __name__ == "__main__":
+    generate(Path(sys.argv[2]), SCALES[sys.argv[1]])
@@ -0,0 +1,77 @@
+import gzip
+import io
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TextIO, Union
+
+READ_BUFFER_BYTES = 1 << 20  # decompressors are fed and drained in 1 MiB reads instead of io's 8 KiB default
+
+
+@dataclass(frozen=True)
+class ArchiveMember:
+    """A CSV file inside the zip the USDA distributes, read in place without extracting it."""
+    archive: Path
+    name: str
+
+    def stat(self):
+        return self.archive.stat()
+
+
+CsvPath = Union[Path, ArchiveMember]
+
+
+def resolve_csv(location: Path, file_name: str) -> CsvPath:
+    """
+    Finds `file_name` at `location`, which is either a directory of extracted CSVs, possibly gzipped individually, or
+    the downloaded zip. A zip next to a missing directory of the same name is used as well, so the download can be
+    parsed as it is.
+    """
+    location = Path(location)
+    if location.is_dir():
+        for candidate in (location.joinpath(file_name), location.joinpath(f"{file_name}.gz")):
+            if candidate.exists():
+                return candidate
+    archive = location if location.suffix == ".zip" else location.with_name(f"{location.name}.zip")
+    if archive.is_file():
+        with zipfile.ZipFile(archive) as zip_file:
+            for member in zip_file.namelist():
+                if member.rsplit("/", 1)[-1] == file_name:
+                    return ArchiveMember(archive, member)
+    if location.is_dir():
+        return location.joinpath(file_name)  # let open() report the missing file
+    raise FileNotFoundError(f"{file_name} not found in {location} or {archive}")
+
+
+def is_compressed(path: CsvPath) -> bool:
+    """Compressed sources are read front to back only; byte offsets into them mean nothing."""
+    return isinstance(path, ArchiveMember) or path.suffix == ".gz"
+
+
+def source_file(path: CsvPath) -> Path:
+    """The file on disk that holds `path`."""
+    return path.archive if isinstance(path, ArchiveMember) else path
+
+
+def csv_name(path: CsvPath) -> str:
+    """The plain CSV file name, e.g. Products.csv for a zip member or for Products.csv.gz."""
+    name = Path(path.name).name
+    return name[:-len(".gz")] if name.endswith(".gz") else name
+
+
+def open_csv(path: CsvPath) -> TextIO:
+    """Opens a plain, gzipped or zipped CSV as text for csv.reader, decompressing on the fly."""
+    if isinstance(path, ArchiveMember):
+        zip_file = zipfile.ZipFile(path.archive)
+        try:
+            member = zip_file.open(path.name)
+        finally:
+            zip_file.close()  # the member keeps its own reference to the archive file until it is closed
+        return _text(member)
+    if path.suffix == ".gz":
+        return _text(gzip.GzipFile(path, "rb"))
+    return open(path, newline="", buffering=READ_BUFFER_BYTES)
+
+
+def _text(binary) -> TextIO:
+    return io.TextIOWrapper(io.BufferedReader(binary, buffer_size=READ_BUFFER_BYTES), newline="")
@@ -0,0 +1,57 @@
+import functools
+from typing import Tuple
+
+MEMO_CACHE_SIZE = 1 << 16
+
+
+@functools.lru_cache(maxsize=MEMO_CACHE_SIZE)
+def tokenize_ingredients(text: str) -> Tuple[str, ...]:
+    """
+    Linear-time equivalent of the original preprocess -> split -> postprocess memo pipeline (kept in the tests as the
+    reference), producing the same ingredient names. Results are cached on the raw memo, since many private-label
+    products share their statement.
+    """
+    text = _remove_text_in_brackets(text.replace("*", "")).rstrip(",").lower()
+    items = [item.strip() for item in text.split(",")]
+
+    for separator in (" and ", " & "):
+        if separator in items[-1]:
+            items[-1:] = items[-1].split(separator)
+            break
+
+    ingredients = []
+    for item in items:
+        if ":" not in item:
+            ingredients.append(item)
+            continue
+        if item[-1] == ".":
+            item = item[:-1]
+        for part in item.split("."):
+            caption_end = part.find(": ")
+            ingredients.append(part[caption_end + 2:] if caption_end != -1 else part)
+
+    if not ingredients[-1]:
+        return ()  # the step-by-step pipeline fails on an empty last item and yields no ingredients at all
+    if ingredients[-1][-1] == ".":
+        ingredients[-1] = ingredients[-1][:-1]
+    return tuple(ingredient for ingredient in ingredients if ingredient)
+
+
+def _remove_text_in_brackets(text: str) -> str:
+    if "(" not in text:
+        return text
+    if text.count("(") != text.count(")"):
+        return text.replace("(", ",").replace(")", "")
+
+    kept = []
+    position = 0
+    while True:
+        bracket_open = text.find("(", position)
+        if bracket_open == -1:
+            kept.append(text[position:])
+            return "".join(kept)
+        kept.append(text[position:bracket_open])
+        bracket_close = text.find(")", bracket_open)
+        if bracket_close == -1:
+            return "".join(kept)  # only a stray ")" before it balanced the count, drop the unclosed remainder
+        position = bracket_close + 1
@@ -0,0 +1,162 @@
+import csv
+import heapq
+import json
+import logging
+import tempfile
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from csv_parser.csv_source import ArchiveMember, CsvPath, csv_name, open_csv
+
+Row = List[str]
+
+EXTERNAL_SORT_CHUNK_ROWS = 500_000
+
+SCAN_VERSION = 1
+SCAN_SUFFIX = ".scan.json"
+
+
+def ndb_key(row: Row) -> int:
+    """USDA files are keyed and ordered by the numeric NDB number in the first column."""
+    return int(row[0])
+
+
+def read_rows(path: CsvPath) -> Iterator[Row]:
+    with open_csv(path) as csvfile:
+        rows = csv.reader(csvfile, delimiter=',')
+        next(rows, None)  # header
+        yield from rows
+
+
+@dataclass(frozen=True)
+class CsvScan:
+    sorted: bool
+    multiline: bool  # some quoted field holds a line break, so rows cannot be found by splitting on newlines
+
+
+def scan_csv(path: CsvPath, key: Callable[[Row], int] = ndb_key) -> CsvScan:
+    """Reads `path` once to tell whether it is ordered by `key` and whether any row spans several lines."""
+    ordered, rows, previous = True, 0, None
+    with open_csv(path) as csvfile:
+        reader = csv.reader(csvfile, delimiter=',')
+        next(reader, None)  # header
+        for row in reader:
+            rows += 1
+            current = key(row)
+            if previous is not None and current < previous:
+                ordered = False
+            previous = current
+        return CsvScan(ordered, reader.line_num > rows + 1)
+
+
+def load_scan(path: CsvPath) -> CsvScan:
+    """
+    `scan_csv` by NDB number, saved in a sidecar next to the source file and reused until the file's size or
+    modification time changes, so only the first parse of a download reads (and decompresses) it an extra time.
+    """
+    sidecar = scan_sidecar_path(path)
+    stat = path.stat()
+    stamp = [SCAN_VERSION, stat.st_size, stat.st_mtime_ns]
+    try:
+        with open(sidecar) as f:
+            saved = json.load(f)
+        if saved["stamp"] == stamp:
+            return CsvScan(saved["sorted"], saved["multiline"])
+    except (OSError, ValueError, KeyError):
+        pass
+    scan = scan_csv(path)
+    tmp = sidecar.with_name(f"{sidecar.name}.tmp")
+    try:
+        with open(tmp, "w") as f:
+            json.dump({"stamp": stamp, "sorted": scan.sorted, "multiline": scan.multiline}, f)
+        tmp.replace(sidecar)
+    except OSError as e:
+        logging.warning("Could not save CSV scan %s: %s", sidecar, e)
+    return scan
+
+
+def scan_sidecar_path(path: CsvPath) -> Path:
+    if isinstance(path, ArchiveMember):
+        return path.archive.with_name(f"{path.archive.name}.{csv_name(path)}{SCAN_SUFFIX}")
+    return path.with_name(path.name + SCAN_SUFFIX)
+
+
+def is_sorted(path: CsvPath, key: Callable[[Row], int] = ndb_key) -> bool:
+    return scan_csv(path, key).sorted
+
+
+@contextmanager
+def sorted_csv(
+        path: CsvPath, key: Callable[[Row], int] = ndb_key, chunk_rows: int = EXTERNAL_SORT_CHUNK_ROWS,
+        scan: Optional[CsvScan] = None
+) -> Iterator[CsvPath]:
+    """
+    Yields a path to `path` ordered by `key`: the file itself when it is already sorted, otherwise a temporary copy
+    produced by an external merge sort that keeps at most `chunk_rows` rows in memory. A `scan` of `path` the caller
+    already has saves reading it to check the order.
+    """
+    if (scan or scan_csv(path, key)).sorted:
+        yield path
+        return
+
+    logging.warning(f"{path} is not sorted by key, falling back to external sort")
+    with tempfile.TemporaryDirectory(prefix="usda_sort_") as tmp_dir:
+        yield _external_sort(path, Path(tmp_dir), key, chunk_rows)
+
+
+def _external_sort(path: CsvPath, tmp_dir: Path, key: Callable[[Row], int], chunk_rows: int) -> Path:
+    with open_csv(path) as csvfile:
+        header = next(csv.reader(csvfile, delimiter=','), [])
+
+    chunk_paths = []
+    chunk = []
+    for row in read_rows(path):
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            chunk_paths.append(_spill_chunk(chunk, tmp_dir, len(chunk_paths), key))
+            chunk = []
+    if chunk:
+        chunk_paths.append(_spill_chunk(chunk, tmp_dir, len(chunk_paths), key))
+
+    sorted_path = tmp_dir.joinpath(csv_name(path))
+    with ExitStack() as stack, open(sorted_path, "w", newline="") as output:
+        runs = [csv.reader(stack.enter_context(open(chunk_path, newline=""))) for chunk_path in chunk_paths]
+        writer = csv.writer(output)
+        writer.writerow(header)
+        writer.writerows(heapq.merge(*runs, key=key))
+    for chunk_path in chunk_paths:
+        chunk_path.unlink()
+    return sorted_path
+
+
+def _spill_chunk(chunk: List[Row], tmp_dir: Path, index: int, key: Callable[[Row], int]) -> Path:
+    chunk.sort(key=key)  # stable, keeps the original row order within a key
+    chunk_path = tmp_dir.joinpath(f"chunk_{index}.csv")
+    with open(chunk_path, "w", newline="") as output:
+        csv.writer(output).writerows(chunk)
+    return chunk_path
+
+
+def merge_join(
+        left_rows: Iterable[Row], right_rows: Iterable[Row], key: Callable[[Row], int] = ndb_key
+) -> Iterator[Tuple[Row, List[Row]]]:
+    """
+    Joins two inputs sorted by `key`, yielding every left row with the (possibly empty) group of matching right rows.
+    Only the right rows of the current key are held in memory.
+    """
+    right = iter(right_rows)
+    pending = next(right, None)
+    previous_key, group = None, []
+    for left in left_rows:
+        left_key = key(left)
+        if left_key != previous_key:
+            group = []
+            while pending is not None and key(pending) < left_key:
+                pending = next(right, None)
+            while pending is not None and key(pending) == left_key:
+                group.append(pending)
+                pending = next(right, None)
+            previous_key = left_key
+        yield left, group
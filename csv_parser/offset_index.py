@@ -0,0 +1,121 @@
+import csv
+import locale
+import logging
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Tuple
+
+import numpy as np
+
+from csv_parser.merge_join import Row
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".offsets.npz"
+
+
+class CsvOffsetIndex:
+    """
+    Maps the NDB number in the first column of a USDA CSV file to the byte offset and row count of its rows, so they
+    can be read with one seek. Rows of a key that are not next to each other get one span each. Rows may contain
+    quoted line breaks.
+    """
+
+    def __init__(self, path: Path, keys: np.ndarray, offsets: np.ndarray, counts: np.ndarray, size: int,
+                 mtime_ns: int) -> None:
+        self.path = Path(path)
+        order = np.argsort(keys, kind="stable")
+        self.keys, self.offsets, self.counts = keys[order], offsets[order], counts[order]
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def build(cls, path: Path) -> "CsvOffsetIndex":
+        """Indexes `path` in one pass."""
+        path = Path(path)
+        stat = path.stat()
+        keys, offsets, counts = [], [], []
+        with open(path, "rb") as f:
+            _read_record(f)  # header
+            while True:
+                offset = f.tell()
+                record = _read_record(f)
+                if not record:
+                    break
+                key = int(record.split(b",", 1)[0].strip().strip(b'"'))
+                if keys and keys[-1] == key:
+                    counts[-1] += 1
+                else:
+                    keys.append(key)
+                    offsets.append(offset)
+                    counts.append(1)
+        return cls(path, np.array(keys, dtype=np.int64), np.array(offsets, dtype=np.int64),
+                   np.array(counts, dtype=np.int32), stat.st_size, stat.st_mtime_ns)
+
+    @classmethod
+    def load(cls, path: Path) -> "CsvOffsetIndex":
+        """
+        Reads the sidecar index of `path`, or builds and saves a new one when there is none or the file's size or
+        modification time changed since it was built.
+        """
+        path = Path(path)
+        sidecar = sidecar_path(path)
+        stat = path.stat()
+        if sidecar.exists():
+            with np.load(sidecar) as saved:
+                version, size, mtime_ns = saved["meta"].tolist()
+                if (version, size, mtime_ns) == (INDEX_VERSION, stat.st_size, stat.st_mtime_ns):
+                    return cls(path, saved["keys"], saved["offsets"], saved["counts"], size, mtime_ns)
+        index = cls.build(path)
+        try:
+            index.save()
+        except OSError as e:
+            logging.warning("Could not save offset index %s: %s", sidecar, e)
+        return index
+
+    def save(self) -> None:
+        sidecar = sidecar_path(self.path)
+        tmp = sidecar.with_name(f"{sidecar.name}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, keys=self.keys, offsets=self.offsets, counts=self.counts,
+                     meta=np.array([INDEX_VERSION, self.size, self.mtime_ns], dtype=np.int64))
+        tmp.replace(sidecar)
+
+    def spans(self, key: int) -> List[Tuple[int, int]]:
+        """(byte offset, row count) of every run of rows with `key`, in file order."""
+        start, stop = np.searchsorted(self.keys, [key, key + 1])
+        return list(zip(self.offsets[start:stop].tolist(), self.counts[start:stop].tolist()))
+
+    def __contains__(self, key: int) -> bool:
+        i = np.searchsorted(self.keys, key)
+        return i < len(self.keys) and self.keys[i] == key
+
+    def __len__(self) -> int:
+        return len(np.unique(self.keys))
+
+    def rows(self, key: int) -> List[Row]:
+        spans = self.spans(key)
+        if not spans:
+            return []
+        encoding = locale.getpreferredencoding(False)
+        with open(self.path, "rb") as f:
+            return [row for offset, count in spans for row in csv.reader(_records(f, offset, count, encoding))]
+
+
+def sidecar_path(path: Path) -> Path:
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def _records(f: BinaryIO, offset: int, count: int, encoding: str) -> Iterator[str]:
+    f.seek(offset)
+    for _ in range(count):
+        yield _read_record(f).decode(encoding)
+
+
+def _read_record(f: BinaryIO) -> bytes:
+    """Reads one CSV record, following line breaks inside quoted fields."""
+    record = f.readline()
+    while record.count(b'"') % 2:
+        line = f.readline()
+        if not line:
+            break
+        record += line
+    return record
@@ -1,74 +1,249 @@
 import csv
+import itertools
 import logging
+import multiprocessing
 import random
-import traceback
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
-
+from typing import Dict, Iterator, List, Mapping, Tuple, Optional
+
+from csv_parser.csv_source import CsvPath, is_compressed, open_csv, resolve_csv, source_file
+from csv_parser.ingredient_tokenizer import tokenize_ingredients
+from csv_parser.merge_join import Row, load_scan, merge_join, read_rows, sorted_csv
+from csv_parser.offset_index import CsvOffsetIndex
+from csv_parser.sharding import Shard, plan_shards, read_range_rows
+from csv_parser.snapshot import ProductSnapshot, SnapshotWriter, source_fingerprint
+from models.node_registry import NodeRegistry
+from models.nutrient_table import NutrientAmounts, NutrientTable, nutrient_uid
 from models.product_models import Nutrient, Amount, FoodProduct, Manufacturer, Ingredient, InformationSource
+from utils.metrics import METRICS
+from utils.utils import uid
 
 CSV_FILE_RELATIVE_LOCATION = Path(__file__).parent.joinpath("../csv_data/usda_food_composition_database_2019_03_20")
 
+SNAPSHOT_DIRECTORY = Path(__file__).parent.joinpath("../parsed_snapshots")
+
+SHARDS_PER_WORKER = 4
+
+# products per task when a compressed input is parsed in a process pool; it cannot be split into byte ranges
+STREAMED_CHUNK_PRODUCTS = 2000
+
 random.seed(0)
 
 
-def uid(identifier: str) -> str:
-    return f"_:{identifier}"
+# product row, its nutrient rows, ingredient names, date_modified, date_available
+ParsedRow = Tuple[Row, List[Row], List[str], datetime, datetime]
+
+
+def _parse_shard(task: Tuple[Path, Path, Shard]) -> List[ParsedRow]:
+    """
+    Process pool worker. Does the expensive string work for one shard and returns plain values, the parent process
+    builds the model objects so shared nodes are only ever created in one place.
+    """
+    products_path, nutrients_path, shard = task
+    return _parse_joined(list(merge_join(
+        read_range_rows(products_path, shard.products), read_range_rows(nutrients_path, shard.nutrients))))
+
+
+def _parse_joined(joined: List[Tuple[Row, List[Row]]]) -> List[ParsedRow]:
+    parser = ProductParser()
+    return [
+        (row, nutrient_rows, list(_tokenize_memo(row[7])),
+         parser._parse_datetime(row[5]), parser._parse_datetime(row[6]))
+        for row, nutrient_rows in joined
+    ]
+
+
+def _tokenize_memo(text: str) -> Tuple[str, ...]:
+    """A memo that cannot be tokenized costs its product the ingredients, not the whole parse."""
+    try:
+        return tokenize_ingredients(text)
+    except Exception:
+        logging.warning("Failed to parse ingredients %r", text, exc_info=True)
+        return ()
+
+
+def _csv_path(file_name: str, location: Optional[Path] = None) -> CsvPath:
+    return resolve_csv(location if location is not None else CSV_FILE_RELATIVE_LOCATION, file_name)
 
 
 class ProductParser:
 
-    def parse(self) -> [FoodProduct]:
-        nutrients = self.get_nutrients()
-        return self.get_products(nutrients).values()
+    def __init__(self, csv_location: Optional[Path] = None) -> None:
+        """`csv_location` is where the USDA CSVs are, CSV_FILE_RELATIVE_LOCATION by default."""
+        self.csv_location = csv_location
+        self.registry = NodeRegistry()
+        self.nutrient_table = NutrientTable(registry=self.registry)
+        self._offset_indexes: Dict[str, CsvOffsetIndex] = {}
+
+    def parse(self, workers: int = 1, snapshot_dir: Optional[Path] = None) -> [FoodProduct]:
+        return list(self.parse_iter(workers, snapshot_dir))
+
+    def parse_iter(self, workers: int = 1, snapshot_dir: Optional[Path] = None) -> Iterator[FoodProduct]:
+        """
+        Yields products one at a time instead of collecting the whole dataset first. Products.csv and Nutrient.csv are
+        merge-joined on NDB number, so only the nutrient rows of the current product are held in memory.
+        With more than one worker, Products.csv is split into row aligned byte ranges that are parsed in a process
+        pool; products are still yielded in file order.
+        With `snapshot_dir`, a complete parse is saved there as a binary snapshot keyed by the source files, and later
+        runs memory-map it instead of reading the CSVs.
+        """
+        if snapshot_dir is None:
+            yield from self._parse_csv(workers)
+            return
+        source_files = [source_file(_csv_path(name, self.csv_location)) for name in ("Products.csv", "Nutrient.csv")]
+        snapshot_path = Path(snapshot_dir).joinpath(source_fingerprint(source_files))
+        if ProductSnapshot.exists(snapshot_path):
+            logging.info("Reading parsed products from snapshot %s", snapshot_path)
+            yield from self._parse_snapshot(ProductSnapshot(snapshot_path, self.registry))
+            return
+        with SnapshotWriter(snapshot_path) as writer:
+            for product in self._parse_csv(workers):
+                with METRICS.stage("parse.snapshot_write"):
+                    writer.add(product)
+                yield product
+
+    def _parse_snapshot(self, snapshot: ProductSnapshot) -> Iterator[FoodProduct]:
+        for row, ingredient_names, date_modified, date_available, nutrient_amounts in METRICS.timed_iter(
+                "parse.snapshot_read", snapshot.rows()):
+            product = self._build_product(row, [self._ingredient(name) for name in ingredient_names], date_modified,
+                                          date_available, nutrient_amounts)
+            METRICS.count("parse.products")
+            yield product
+
+    def _parse_csv(self, workers: int) -> Iterator[FoodProduct]:
+        products_csv, nutrients_csv = (_csv_path(name, self.csv_location) for name in ("Products.csv", "Nutrient.csv"))
+        products_scan, nutrients_scan = load_scan(products_csv), load_scan(nutrients_csv)
+        with sorted_csv(products_csv, scan=products_scan) as products_path, \
+                sorted_csv(nutrients_csv, scan=nutrients_scan) as nutrients_path:
+            if workers > 1 and (products_scan.multiline or nutrients_scan.multiline):
+                logging.info("Rows with quoted line breaks cannot be split into byte ranges, parsing them streamed")
+                parsed_rows = self._parse_streamed(products_path, nutrients_path, workers)
+            elif workers > 1 and (is_compressed(products_path) or is_compressed(nutrients_path)):
+                parsed_rows = self._parse_streamed(products_path, nutrients_path, workers)
+            elif workers > 1:
+                parsed_rows = self._parse_sharded(products_path, nutrients_path, workers)
+            else:
+                joined = merge_join(read_rows(products_path), read_rows(nutrients_path))
+                parsed_rows = (self._parse_fields(row, nutrient_rows)
+                               for row, nutrient_rows in METRICS.timed_iter("parse.csv_read", joined))
+            for i, (row, nutrient_rows, ingredients, date_modified, date_available) in enumerate(parsed_rows, start=1):
+                logging.debug("###%s### Started processing product %s", i, row)
+                with METRICS.stage("parse.nutrients"):
+                    nutrient_amounts = self._store_nutrient_rows(row[0], nutrient_rows)
+                with METRICS.stage("parse.build"):
+                    product = self._build_product(row, ingredients, date_modified, date_available, nutrient_amounts)
+                METRICS.count("parse.products")
+                logging.debug("###%s### Finished processing product %s", i, product)
+                yield product
+
+    def _parse_fields(self, row: Row, nutrient_rows: List[Row]) -> ParsedRow:
+        with METRICS.stage("parse.memo"):
+            ingredients = self._process_product_memo(row[7])
+        with METRICS.stage("parse.datetime"):
+            date_modified, date_available = self._parse_datetime(row[5]), self._parse_datetime(row[6])
+        return row, nutrient_rows, ingredients, date_modified, date_available
+
+    def _parse_sharded(self, products_path: Path, nutrients_path: Path, workers: int) -> Iterator[ParsedRow]:
+        shards = plan_shards(products_path, nutrients_path, workers * SHARDS_PER_WORKER)
+        with multiprocessing.Pool(workers) as pool:
+            tasks = [(products_path, nutrients_path, shard) for shard in shards]
+            # imap keeps shard order
+            yield from self._pooled_rows(pool.imap(_parse_shard, tasks))
+
+    def _parse_streamed(self, products_path: CsvPath, nutrients_path: CsvPath, workers: int) -> Iterator[ParsedRow]:
+        """Decompresses and joins in this process and hands chunks of joined rows to the pool for the string work."""
+        joined = merge_join(read_rows(products_path), read_rows(nutrients_path))
+        chunks = iter(lambda: list(itertools.islice(joined, STREAMED_CHUNK_PRODUCTS)), [])
+        with multiprocessing.Pool(workers) as pool:
+            yield from self._pooled_rows(pool.imap(_parse_joined, chunks))
+
+    def _pooled_rows(self, results: Iterator[List[ParsedRow]]) -> Iterator[ParsedRow]:
+        for parsed_rows in METRICS.timed_iter("parse.shard_wait", results):
+            for row, nutrient_rows, ingredient_names, date_modified, date_available in parsed_rows:
+                yield row, nutrient_rows, [self._ingredient(name) for name in ingredient_names], \
+                      date_modified, date_available
+
+    def lookup_product(self, product_id: str) -> Optional[FoodProduct]:
+        """
+        Parses a single product, reading only its rows of Products.csv and Nutrient.csv through their offset indexes.
+        The indexes are built on first use and kept next to the CSV files.
+        """
+        product_rows = self.lookup_rows("Products.csv", product_id)
+        if not product_rows:
+            return None
+        row, nutrient_rows, ingredients, date_modified, date_available = self._parse_fields(
+            product_rows[0], self.lookup_rows("Nutrient.csv", product_id))
+        return self._build_product(row, ingredients, date_modified, date_available,
+                                   self._store_nutrient_rows(row[0], nutrient_rows))
+
+    def lookup_serving_sizes(self, product_id: str) -> List[Row]:
+        return self.lookup_rows("Serving_Size.csv", product_id)
+
+    def lookup_rows(self, csv_file_name: str, product_id: str) -> List[Row]:
+        """Rows of one of the USDA CSV files that belong to `product_id`, without scanning the file."""
+        index = self._offset_indexes.get(csv_file_name)
+        path = _csv_path(csv_file_name, self.csv_location)
+        if is_compressed(path):
+            raise ValueError(f"{path} is compressed, point lookups need the extracted {csv_file_name}")
+        if index is None or index.path != path:
+            index = self._offset_indexes[csv_file_name] = CsvOffsetIndex.load(path)
+        return index.rows(int(product_id))
+
+    def _store_nutrient_rows(self, product_id: str, nutrient_rows: List[Row]) -> NutrientAmounts:
+        if not nutrient_rows:
+            logging.warning("Product %s does not have any nutrient amounts listed", product_id)
+        if self.nutrient_table.is_full:
+            # products of a full table keep it alive through their views, the parser moves on to a fresh one
+            self.nutrient_table = NutrientTable(registry=self.registry)
+        measurements = ((row[1], row[2], row[3], row[4], row[5]) for row in nutrient_rows)
+        return self.nutrient_table.append(product_id, measurements)
 
     def get_products(
             self, nutrients: Tuple[List[Nutrient], Dict[str, List[Tuple[Nutrient, Amount]]]]
     ) -> Dict[str, FoodProduct]:
+        return {product.usda_food_db_id: product for product in self.iter_products(nutrients)}
+
+    def iter_products(
+            self, nutrients: Tuple[List[Nutrient], Dict[str, List[Tuple[Nutrient, Amount]]]]
+    ) -> Iterator[FoodProduct]:
         product_csv_file_name = "Products.csv"
 
         all_nutrients, products_nutrients = nutrients
-        products = {}
-        with open(CSV_FILE_RELATIVE_LOCATION.joinpath(product_csv_file_name)) as csvfile:
+        with open_csv(_csv_path(product_csv_file_name, self.csv_location)) as csvfile:
             rows = csv.reader(csvfile, delimiter=',')
-            for i, row in enumerate(rows):
-                if i < 0:
-                    continue
-                if i > 10245:
-                    break
-
-                logging.debug(f"###{i}### Started processing product {row}")
-
-                product_usda_food_db_id = row[0]
-                barcode = row[3]
-                nutrient_amounts = self._calculate_product_nutrient_amounts(product_usda_food_db_id, products_nutrients)
-                product_ingredients = self._process_product_memo(row[7])
-                manufacturer_name = row[4]
-                product = FoodProduct(
-                    uid(barcode),
-                    product_usda_food_db_id, row[1], InformationSource(uid(f"source_{row[2]}"), row[2]), barcode,
-                    Manufacturer(uid(f"manufacturer_{ manufacturer_name }"), manufacturer_name),
-                    self._parse_datetime(row[5]), self._parse_datetime(row[6]),
-                    product_ingredients, nutrient_amounts)
-                products[product_usda_food_db_id] = product
-                logging.debug(f"###{i}### Finished processing product {product}")
-
-        return products
+            next(rows, None)  # header
+            for i, row in enumerate(rows, start=1):
+                logging.debug("###%s### Started processing product %s", i, row)
+                product = self._build_product(
+                    row, self._process_product_memo(row[7]), self._parse_datetime(row[5]),
+                    self._parse_datetime(row[6]), self._calculate_product_nutrient_amounts(row[0], products_nutrients))
+                logging.debug("###%s### Finished processing product %s", i, product)
+                yield product
+
+    def _build_product(
+            self, row: Row, ingredients: List[Ingredient], date_modified: datetime, date_available: datetime,
+            nutrient_amounts: Mapping[Nutrient, Amount]
+    ) -> FoodProduct:
+        barcode = row[3]
+        manufacturer_name = row[4]
+        return FoodProduct(
+            uid(barcode),
+            row[0], row[1], self.registry.get(InformationSource, uid(f"source_{row[2]}"), row[2]), barcode,
+            self.registry.get(Manufacturer, uid(f"manufacturer_{ manufacturer_name }"), manufacturer_name),
+            date_modified, date_available,
+            ingredients, nutrient_amounts)
 
     def get_nutrients(self) -> Tuple[List[Nutrient], Dict[str, List[Tuple[Nutrient, Amount]]]]:
         nutrient_csv_file_name = "Nutrient.csv"
 
         nutrients = set()
         nutrient_amounts: Dict[str, List[Tuple[Nutrient, Amount]]] = {}
-        with open(CSV_FILE_RELATIVE_LOCATION.joinpath(nutrient_csv_file_name)) as csvfile:
+        with open_csv(_csv_path(nutrient_csv_file_name, self.csv_location)) as csvfile:
             rows = csv.reader(csvfile, delimiter=',')
-            for i, row in enumerate(rows):
-                if i > 00:
-                    break
-                name = row[2]
-                nutrient = Nutrient(uid(f"nutrient_{name}"), name, row[1], row[3])
-                amount = Amount(uid(f"amount_{row[4]}_{row[5]}"), row[4], row[5])
+            next(rows, None)  # header
+            for row in rows:
+                nutrient, amount = self._parse_nutrient_row(row)
 
                 nutrients.add(nutrient)
                 if nutrient_amounts.get(row[0], None) is None:
@@ -78,11 +253,17 @@ class ProductParser:
 
         return list(nutrients), nutrient_amounts
 
+    def _parse_nutrient_row(self, row: List[str]) -> Tuple[Nutrient, Amount]:
+        name = row[2]
+        nutrient = self.registry.get(Nutrient, nutrient_uid(name, row[1], row[3]), name, row[1], row[3])
+        amount = Amount(uid(f"amount_{row[4]}_{row[5]}"), row[4], row[5])
+        return nutrient, amount
+
     def get_serving_sizes(self) -> Dict[str, List[str]]:
         serving_size_csv_file_name = "Serving_Size.csv"
 
         serving_sizes = {}
-        with open(CSV_FILE_RELATIVE_LOCATION.joinpath(serving_size_csv_file_name)) as csvfile:
+        with open_csv(_csv_path(serving_size_csv_file_name, self.csv_location)) as csvfile:
             rows = csv.reader(csvfile, delimiter=',')
             for i, row in enumerate(rows):
                 if i > 50:
@@ -95,46 +276,7 @@ class ProductParser:
         return serving_sizes
 
     def _process_product_memo(self, text: str) -> [Ingredient]:
-        try:
-            preprocessed = self._preprocess_product_memo(text)
-            items = self._split_product_memo_to_items(preprocessed)
-            return self._postprocess_product_memo(items)
-        except Exception as e:
-            logging.error(f"Failed to parse ingredients '{text}'", e)
-            logging.debug(traceback.format_exc())
-            return []
-
-    def _preprocess_product_memo(self, text):
-
-        def remove_stars(text):
-            return text.replace("*", "")
-
-        def remove_text_in_brackets(text):
-            if text.find("(") == -1:
-                return text
-
-            def handle_unclosed_brackets(text):
-                if text.count("(") != text.count(")"):
-                    return text.replace("(", ",").replace(")", "")
-                return text
-
-            text = handle_unclosed_brackets(text)
-
-            modified_memo = ""
-            while text.find("(") != -1:
-                next_bracket_open = text.find("(")
-                modified_memo += text[0:next_bracket_open]
-                text = text[text.find(")", next_bracket_open) + 1:]
-            modified_memo += text
-            return modified_memo
-
-        text = remove_stars(text)
-        text = remove_text_in_brackets(text)
-        text = text.rstrip(",")
-        return text.lower()
-
-    def _split_product_memo_to_items(self, text):
-        return [self._format_ingredient(item) for item in text.split(",")]
+        return [self._ingredient(name) for name in _tokenize_memo(text)]
 
     def _parse_datetime(self, text: str) -> Optional[datetime]:
         "Wed Nov 15 19:19:38 GMT 2017"
@@ -146,7 +288,7 @@ class ProductParser:
             all_product_nutrient_amount: Dict[str, List[Tuple[Nutrient, Amount]]]
     ) -> Dict[Nutrient, Amount]:
         if product_id not in all_product_nutrient_amount.keys():
-            logging.warning(f"Product {product_id} does not have any nutrient amounts listed")
+            logging.warning("Product %s does not have any nutrient amounts listed", product_id)
             return {}
 
         nutrient_amounts = all_product_nutrient_amount[product_id]
@@ -157,64 +299,12 @@ class ProductParser:
 
         return product_nutrient_amounts
 
-    def _postprocess_product_memo(self, items: List[str]) -> List[Ingredient]:
-        items = self._ingredient_split_last_items_ending_with_keyword_other_than_comma(items)
-        items = self._ingredient_remove_middle_captions(items)
-        items = self._ingredient_remove_last_item_trailing_dot(items)
-        items = self._ingredient_remove_invalid(items)
-        items = self._ingredient_remove_empty_strings(items)
-        return list(map(lambda item: Ingredient(uid(f"ingredient_{item}"), item), items))
-
-    def _ingredient_split_last_items_ending_with_keyword_other_than_comma(self, items: List[str]) -> List[str]:
-        for separator in [" and ", " & "]:
-            if separator in items[-1]:
-                last_item = items.pop()
-                split_last_item = last_item.split(separator)
-                items += split_last_item
-                return items
-
-        return items
-
-    def _ingredient_remove_last_item_trailing_dot(self, items: List[str]) -> List[str]:
-        if items[-1][-1] == ".":
-            last_item = items.pop()
-            items.append(last_item[:-1])
-            return items
-
-        return items
-
-    def _ingredient_remove_middle_captions(self, items: List[str]) -> List[str]:
-        captions_indices = []
-
-        for i, item in enumerate(items):
-            if ":" in item:
-                captions_indices.append(i)
-
-        for captions_index in captions_indices[::-1]:  # reverse to be able to insert in right order
-            item = items.pop(captions_index)
-            if item[-1] == ".":  # remove trailing dot, eg for captions that have last element
-                item = item[:-1]
-            for item in item.split(".")[::-1]:  # reverse to be able to insert in right order
-                if item.find(": ") != -1:
-                    new_item = item[item.index(": ") + 2:]
-                else:
-                    new_item = item
-
-                items.insert(captions_index, new_item)
-
-        return items
-
-    def _ingredient_remove_invalid(self, items):
-        return filter(lambda item: len(item) != 0, items)
-
-    def _format_ingredient(self, item):
-        return item.strip()
-
-    def _ingredient_remove_empty_strings(self, items):
-        return list(filter(lambda x: x != "", items))
+    def _ingredient(self, name: str) -> Ingredient:
+        return self.registry.get(Ingredient, uid(f"ingredient_{name}"), name)
 
 
 if __name__ == "__main__":
     logging.basicConfig(level="DEBUG")
-    products = ProductParser().parse()
-    print(len(products))  # with nutrients: "45002000"
+    product_count = sum(1 for _ in ProductParser().parse_iter(snapshot_dir=SNAPSHOT_DIRECTORY))
+    print(product_count)  # with nutrients: "45002000"
+
@@ -0,0 +1,110 @@
+import csv
+import locale
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, List
+
+from csv_parser.merge_join import Row, ndb_key
+
+
+@dataclass
+class ByteRange:
+    start: int
+    end: int
+
+
+@dataclass
+class Shard:
+    products: ByteRange
+    nutrients: ByteRange
+
+
+def plan_shards(
+        products_path: Path, nutrients_path: Path, count: int, key: Callable[[Row], int] = ndb_key
+) -> List[Shard]:
+    """
+    Splits Products.csv into `count` row aligned byte ranges and pairs each one with the byte range of Nutrient.csv
+    holding the same keys. Both files must be sorted by `key`, and rows must not contain quoted line breaks; the parser
+    checks that with `scan_csv` and streams files that have them instead.
+    """
+    product_ranges = row_aligned_ranges(products_path, count)
+    with open(nutrients_path, "rb") as nutrients:
+        nutrients.readline()  # header
+        data_start = nutrients.tell()
+        size = nutrients_path.stat().st_size
+        nutrient_starts = [
+            find_key_offset(nutrients, key(_read_row_at(products_path, product_range.start)), data_start, size, key)
+            for product_range in product_ranges
+        ]
+    if nutrient_starts:
+        nutrient_starts[0] = data_start
+    nutrient_ends = nutrient_starts[1:] + [size]
+    return [
+        Shard(product_range, ByteRange(start, end))
+        for product_range, start, end in zip(product_ranges, nutrient_starts, nutrient_ends)
+    ]
+
+
+def row_aligned_ranges(path: Path, count: int) -> List[ByteRange]:
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        f.readline()  # header
+        boundaries = [f.tell()]
+        for i in range(1, count):
+            f.seek(boundaries[0] + (size - boundaries[0]) * i // count)
+            f.readline()  # move to the start of the next row
+            if boundaries[-1] < f.tell() < size:
+                boundaries.append(f.tell())
+    boundaries.append(size)
+    return [ByteRange(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def read_range_rows(path: Path, byte_range: ByteRange) -> Iterator[Row]:
+    encoding = locale.getpreferredencoding(False)
+
+    def lines():
+        with open(path, "rb") as f:
+            f.seek(byte_range.start)
+            while f.tell() < byte_range.end:
+                line = f.readline()
+                if not line:
+                    break
+                yield line.decode(encoding)
+
+    yield from csv.reader(lines(), delimiter=',')
+
+
+def find_key_offset(f: BinaryIO, key_value: int, start: int, end: int, key: Callable[[Row], int] = ndb_key) -> int:
+    """Binary searches a sorted file for the offset of the first row in [start, end) whose key is >= key_value."""
+    lo, hi = start, end
+    while lo < hi:
+        mid = (lo + hi) // 2
+        row_start = _row_start_at_or_after(f, mid, start)
+        if row_start >= hi:
+            hi = mid
+            continue
+        f.seek(row_start)
+        line = f.readline()
+        if key(_parse_line(line)) < key_value:
+            lo = row_start + len(line)
+        else:
+            hi = row_start
+    return lo
+
+
+def _row_start_at_or_after(f: BinaryIO, offset: int, start: int) -> int:
+    if offset <= start:
+        return start
+    f.seek(offset - 1)
+    f.readline()
+    return f.tell()
+
+
+def _read_row_at(path: Path, offset: int) -> Row:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return _parse_line(f.readline())
+
+
+def _parse_line(line: bytes) -> Row:
+    return next(csv.reader([line.decode(locale.getpreferredencoding(False))], delimiter=','))
@@ -0,0 +1,268 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from csv_parser.merge_join import Row
+from models.node_registry import NodeRegistry
+from models.nutrient_table import CODE_DTYPE, COLUMNS, NutrientAmounts, NutrientTable, _Dictionary
+from models.product_models import FoodProduct
+
+SNAPSHOT_VERSION = 2
+
+# product id, name, source abbreviation, barcode, manufacturer name: the leading Products.csv columns
+PRODUCT_STRINGS = 5
+
+EPOCH = datetime(1970, 1, 1)
+NO_DATE = np.iinfo(np.int64).min
+
+# product row, ingredient names, date_modified, date_available, nutrient amounts
+SnapshotRow = Tuple[Row, List[str], Optional[datetime], Optional[datetime], NutrientAmounts]
+
+# <fingerprint> for a finished snapshot, <fingerprint>.tmp-<pid> while a writer is filling it
+SNAPSHOT_NAME = re.compile(r"(?P<fingerprint>[0-9a-f]{16})(?:\.tmp-(?P<pid>\d+))?")
+
+
+def source_fingerprint(paths: Iterable[Path]) -> str:
+    """
+    Snapshot key of the source files: their names, sizes and modification times, plus the snapshot format. The
+    contents are not read, so a file that is downloaded again gets a new mtime and is parsed again even when it is
+    byte for byte the same.
+    """
+    digest = hashlib.sha256(f"snapshot-v{SNAPSHOT_VERSION}".encode("utf8"))
+    for path in paths:
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf8"))
+    return digest.hexdigest()[:16]
+
+
+class SnapshotWriter:
+    """
+    Writes parsed products as raw, fixed-width binary columns that `ProductSnapshot` memory-maps back. Strings are
+    stored once in a UTF-8 blob and referenced by index. Columns are appended to files while products come in, the
+    snapshot only appears at `path` once the writer exits without an error. Older snapshots next to it, and temporary
+    directories left behind by writers that died, are removed then; nothing else in the directory is touched.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._tmp = self.path.with_name(f"{self.path.name}.tmp-{os.getpid()}")
+        self._strings: Dict[str, int] = {}
+        self._string_offsets = array("q", [0])
+        self._product_strings = array("i")
+        self._product_dates = array("q")
+        self._ingredient_ids = array("i")
+        self._ingredient_offsets = array("q", [0])
+        self._nutrient_offsets = array("q", [0])
+        self._nutrient_names: Dict[int, str] = {}
+        self._derivation_codes = _Dictionary()
+        self._units = _Dictionary()
+        self._code_map_table: Optional[NutrientTable] = None
+        self._code_map_sizes = (0, 0, 0)
+        self._derivation_map = self._unit_map = np.empty(0, dtype=CODE_DTYPE)
+        self._files = {}
+
+    def __enter__(self) -> "SnapshotWriter":
+        shutil.rmtree(self._tmp, ignore_errors=True)
+        self._tmp.mkdir(parents=True)
+        for name in ["strings"] + [column for column, _ in COLUMNS]:
+            self._files[name] = open(self._tmp.joinpath(f"{name}.bin"), "wb")
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        for f in self._files.values():
+            f.close()
+        if exc_type is None:
+            self._finish()
+        else:
+            shutil.rmtree(self._tmp, ignore_errors=True)
+        return False
+
+    def add(self, product: FoodProduct) -> None:
+        self._product_strings.extend(self._string(value) for value in (
+            product.usda_food_db_id, product.name, product.source.abbreviation, product.barcode,
+            product.manufactured_by.name))
+        self._product_dates.extend((_to_microseconds(product.date_modified), _to_microseconds(product.date_available)))
+        self._ingredient_ids.extend(self._string(ingredient.name) for ingredient in product.ingredients)
+        self._ingredient_offsets.append(len(self._ingredient_ids))
+        self._add_nutrients(product.nutrients)
+
+    def _add_nutrients(self, amounts: NutrientAmounts) -> None:
+        table, start, stop = amounts.table, amounts.start, amounts.stop
+        derivation_map, unit_map = self._code_map(table)
+        columns = {
+            "product_index": np.full(stop - start, len(self._nutrient_offsets) - 1, dtype=np.int32),
+            "nutrient_code": table.nutrient_code[start:stop],
+            "derivation_code": derivation_map[table.derivation_code[start:stop]],
+            "value": table.value[start:stop],
+            "unit": unit_map[table.unit[start:stop]],
+        }
+        for column, dtype in COLUMNS:
+            columns[column].astype(dtype, copy=False).tofile(self._files[column])
+        self._nutrient_offsets.append(self._nutrient_offsets[-1] + stop - start)
+
+    def _code_map(self, table: NutrientTable) -> Tuple[np.ndarray, np.ndarray]:
+        """Translates the table's own derivation code and unit dictionaries into the snapshot's."""
+        sizes = (len(table.derivation_codes.values), len(table.units.values), len(table.nutrient_names))
+        if self._code_map_table is not table or self._code_map_sizes != sizes:
+            self._nutrient_names.update(table.nutrient_names)
+            self._derivation_map = np.array(
+                [self._derivation_codes.encode(value) for value in table.derivation_codes.values], dtype=CODE_DTYPE)
+            self._unit_map = np.array([self._units.encode(value) for value in table.units.values], dtype=CODE_DTYPE)
+            self._code_map_table, self._code_map_sizes = table, sizes
+        return self._derivation_map, self._unit_map
+
+    def _string(self, value: str) -> int:
+        index = self._strings.get(value)
+        if index is None:
+            index = self._strings[value] = len(self._strings)
+            encoded = value.encode("utf8")
+            self._files["strings"].write(encoded)
+            self._string_offsets.append(self._string_offsets[-1] + len(encoded))
+        return index
+
+    def _finish(self) -> None:
+        arrays = {
+            "string_offsets": self._string_offsets,
+            "product_strings": self._product_strings,
+            "product_dates": self._product_dates,
+            "ingredient_ids": self._ingredient_ids,
+            "ingredient_offsets": self._ingredient_offsets,
+            "nutrient_offsets": self._nutrient_offsets,
+        }
+        for name, values in arrays.items():
+            with open(self._tmp.joinpath(f"{name}.bin"), "wb") as f:
+                values.tofile(f)
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "products": len(self._nutrient_offsets) - 1,
+            "nutrient_names": {str(code): name for code, name in self._nutrient_names.items()},
+            "derivation_codes": self._derivation_codes.values,
+            "units": self._units.values,
+        }
+        with open(self._tmp.joinpath("meta.json"), "w") as f:
+            json.dump(meta, f)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self._tmp, self.path)
+        self._remove_stale_siblings()
+
+    def _remove_stale_siblings(self) -> None:
+        finished = self.path.joinpath("meta.json").stat().st_mtime_ns
+        for sibling in self.path.parent.iterdir():
+            match = SNAPSHOT_NAME.fullmatch(sibling.name)
+            if sibling == self.path or match is None or not sibling.is_dir():
+                continue
+            if match.group("pid") is not None:
+                stale = not _process_alive(int(match.group("pid")))
+            else:
+                meta = sibling.joinpath("meta.json")
+                stale = meta.exists() and meta.stat().st_mtime_ns < finished
+            if stale:
+                shutil.rmtree(sibling, ignore_errors=True)
+
+
+class ProductSnapshot:
+    """
+    Read side of a snapshot. Every column is memory-mapped, nutrient amounts are views over a `NutrientTable` that
+    wraps the mapped arrays, so nothing is copied or read before it is used.
+    """
+
+    def __init__(self, path: Path, registry: Optional[NodeRegistry] = None) -> None:
+        self.path = Path(path)
+        with open(self.path.joinpath("meta.json")) as f:
+            meta = json.load(f)
+        if meta["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot {self.path} has format version {meta['version']}, expected {SNAPSHOT_VERSION}")
+        self.size = meta["products"]
+        self._blob = _map_bytes(self.path.joinpath("strings.bin"))
+        self._string_offsets = self._column("string_offsets", np.int64)
+        self._decoded: Dict[int, str] = {}
+        self._product_strings = self._column("product_strings", np.int32).reshape(self.size, PRODUCT_STRINGS)
+        self._product_dates = self._column("product_dates", np.int64).reshape(self.size, 2)
+        self._ingredient_ids = self._column("ingredient_ids", np.int32)
+        self._ingredient_offsets = self._column("ingredient_offsets", np.int64)
+        self._nutrient_offsets = self._column("nutrient_offsets", np.int64)
+        self.nutrient_table = NutrientTable.from_columns(
+            {column: self._column(column, dtype) for column, dtype in COLUMNS},
+            _ProductIds(self), {int(code): name for code, name in meta["nutrient_names"].items()},
+            meta["derivation_codes"], meta["units"], registry)
+
+    @classmethod
+    def exists(cls, path: Path) -> bool:
+        return Path(path).joinpath("meta.json").exists()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def rows(self) -> Iterator[SnapshotRow]:
+        for i in range(self.size):
+            row = [self.string(index) for index in self._product_strings[i].tolist()]
+            ingredient_ids = self._ingredient_ids[self._ingredient_offsets[i]:self._ingredient_offsets[i + 1]]
+            date_modified, date_available = self._product_dates[i].tolist()
+            yield (row, [self.string(index) for index in ingredient_ids.tolist()],
+                   _from_microseconds(date_modified), _from_microseconds(date_available),
+                   NutrientAmounts(self.nutrient_table, int(self._nutrient_offsets[i]),
+                                   int(self._nutrient_offsets[i + 1])))
+
+    def string(self, index: int) -> str:
+        value = self._decoded.get(index)
+        if value is None:
+            start, stop = self._string_offsets[index:index + 2].tolist()
+            value = self._decoded[index] = str(self._blob[start:stop], "utf8")
+        return value
+
+    def _column(self, name: str, dtype) -> np.ndarray:
+        path = self.path.joinpath(f"{name}.bin")
+        if path.stat().st_size == 0:  # empty files cannot be mapped
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+
+
+class _ProductIds(Sequence[str]):
+    """`NutrientTable.product_ids` of a snapshot, decoded on access."""
+
+    def __init__(self, snapshot: ProductSnapshot) -> None:
+        self.snapshot = snapshot
+
+    def __len__(self) -> int:
+        return len(self.snapshot)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self.snapshot.string(int(self.snapshot._product_strings[i, 0]))
+
+
+def _map_bytes(path: Path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _to_microseconds(value: Optional[datetime]) -> int:
+    return NO_DATE if value is None else (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_microseconds(value: int) -> Optional[datetime]:
+    return None if value == NO_DATE else EPOCH + timedelta(microseconds=value)
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's process
+    return True
@@ -0,0 +1,20 @@
+import argparse
+import logging
+
+from csv_parser.product_parser import SNAPSHOT_DIRECTORY, ProductParser
+from repository.bulk_export import FORMATS, SHARD_BYTES, export_bulk
+
+EXPORT_DIRECTORY = "bulk_load"
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Write the USDA food composition CSVs as dgraph bulk loader input")
+    arg_parser.add_argument("--format", choices=FORMATS, default="rdf", help="bulk loader input format")
+    arg_parser.add_argument("--output", default=EXPORT_DIRECTORY, help=f"output directory (default: {EXPORT_DIRECTORY})")
+    arg_parser.add_argument("--shard-mb", type=int, default=SHARD_BYTES >> 20,
+                            help="uncompressed megabytes per output file")
+    arg_parser.add_argument("--workers", type=int, default=1, help="parser processes")
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level="INFO")
+    products = ProductParser().parse_iter(args.workers, snapshot_dir=SNAPSHOT_DIRECTORY)
+    export_bulk(products, args.output, args.format, args.shard_mb << 20)
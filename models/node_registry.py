@@ -0,0 +1,53 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, TypeVar
+
+Node = TypeVar("Node")
+
+MAX_NODES = 100_000
+
+
+class NodeRegistry:
+    """
+    Interns shared graph nodes by their blank-node uid, so every distinct manufacturer, ingredient, source and
+    nutrient is built once and the same instance is handed out for every later reference. Holds at most `max_nodes`
+    nodes and evicts the least recently used beyond that, so a long parse stays bounded; a node that comes back after
+    being evicted is built again with the same uid, which is all the serializer relies on.
+    """
+
+    def __init__(self, max_nodes: int = MAX_NODES) -> None:
+        self.max_nodes = max_nodes
+        self._nodes: "OrderedDict[str, object]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, factory: Callable[..., Node], node_uid: str, *args) -> Node:
+        node = self._nodes.get(node_uid)
+        if node is None:
+            self.misses += 1
+            node = self._nodes[node_uid] = factory(node_uid, *args)
+            if len(self._nodes) > self.max_nodes:
+                self._nodes.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.hits += 1
+            self._nodes.move_to_end(node_uid)
+        return node
+
+    def __contains__(self, node_uid: str) -> bool:
+        return node_uid in self._nodes
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def nodes(self) -> Iterator[object]:
+        return iter(self._nodes.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {"nodes": len(self._nodes), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def clear(self) -> None:
+        self._nodes.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
@@ -0,0 +1,184 @@
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.node_registry import NodeRegistry
+from models.product_models import Amount, Nutrient
+from utils.utils import uid
+
+# nutrient code, nutrient name, derivation code, value, unit
+NutrientMeasurement = Tuple[str, str, str, str, str]
+
+INITIAL_CAPACITY = 1024
+MAX_CAPACITY = 1 << 22
+CODE_DTYPE = np.uint16  # dictionary codes of derivation codes and units
+
+COLUMNS = (
+    ("product_index", np.int32),
+    ("nutrient_code", np.uint16),
+    ("derivation_code", CODE_DTYPE),
+    ("value", np.float32),
+    ("unit", CODE_DTYPE),
+)
+
+
+def nutrient_uid(name: str, code: str, derivation_code: str) -> str:
+    """Nutrients are shared per name, code and derivation code; the same name is measured in several ways."""
+    return uid(f"nutrient_{name}_{code}_{derivation_code}")
+
+
+class _Dictionary:
+    """Maps repeated strings to small integer codes, as many as fit in `dtype`."""
+
+    def __init__(self, dtype=CODE_DTYPE) -> None:
+        self.max_codes = int(np.iinfo(dtype).max) + 1
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            if len(self.values) >= self.max_codes:
+                raise OverflowError(f"More than {self.max_codes} distinct values, {value!r} does not fit")
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class NutrientTable:
+    """
+    Columnar store of nutrient measurements, one row per measurement and one typed array per column.
+    Rows are appended a product at a time, products get a `NutrientAmounts` view over their slice.
+    """
+
+    def __init__(
+            self, capacity: int = INITIAL_CAPACITY, max_capacity: int = MAX_CAPACITY,
+            registry: Optional[NodeRegistry] = None
+    ) -> None:
+        self.max_capacity = max_capacity
+        self.registry = registry if registry is not None else NodeRegistry()
+        self.size = 0
+        self.product_ids: Sequence[str] = []
+        self.nutrient_names: Dict[int, str] = {}
+        self.derivation_codes = _Dictionary()
+        self.units = _Dictionary()
+        for column, dtype in COLUMNS:
+            setattr(self, column, np.empty(capacity, dtype=dtype))
+
+    @classmethod
+    def from_columns(
+            cls, columns: Mapping[str, np.ndarray], product_ids: Sequence[str], nutrient_names: Mapping[int, str],
+            derivation_codes: Iterable[str], units: Iterable[str], registry: Optional[NodeRegistry] = None
+    ) -> "NutrientTable":
+        """Wraps existing column arrays, e.g. memory-mapped ones, without copying them. The table is full."""
+        table = cls(capacity=0, max_capacity=0, registry=registry)
+        for column, dtype in COLUMNS:
+            setattr(table, column, columns[column])
+        table.size = len(table.value)
+        table.product_ids = product_ids
+        table.nutrient_names = dict(nutrient_names)
+        for derivation_code in derivation_codes:
+            table.derivation_codes.encode(derivation_code)
+        for unit in units:
+            table.units.encode(unit)
+        return table
+
+    @property
+    def is_full(self) -> bool:
+        return self.size >= self.max_capacity
+
+    def append(self, product_id: str, measurements: Iterable[NutrientMeasurement]) -> "NutrientAmounts":
+        product_index = len(self.product_ids)
+        self.product_ids.append(product_id)
+        start = self.size
+        for code, name, derivation_code, value, unit in measurements:
+            if self.size == len(self.value):
+                self._grow()
+            i = self.size
+            nutrient_code = int(code)
+            self.nutrient_names.setdefault(nutrient_code, name)
+            self.product_index[i] = product_index
+            self.nutrient_code[i] = nutrient_code
+            self.derivation_code[i] = self.derivation_codes.encode(derivation_code)
+            self.value[i] = _to_float(value)
+            self.unit[i] = self.units.encode(unit)
+            self.size += 1
+        return NutrientAmounts(self, start, self.size)
+
+    def product_ids_where(
+            self, nutrient_code: int, min_value: Optional[float] = None, max_value: Optional[float] = None
+    ) -> List[str]:
+        """Ids of the products that have a measurement of `nutrient_code` within [min_value, max_value]."""
+        mask = self.nutrient_code[:self.size] == nutrient_code
+        values = self.value[:self.size]
+        if min_value is not None:
+            mask &= values >= min_value
+        if max_value is not None:
+            mask &= values <= max_value
+        return [self.product_ids[i] for i in np.unique(self.product_index[:self.size][mask])]
+
+    def _grow(self) -> None:
+        capacity = max(len(self.value) * 2, 1)
+        for column, _ in COLUMNS:
+            old = getattr(self, column)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, column, new)
+
+
+class NutrientAmounts(Mapping[Nutrient, Amount]):
+    """Read-only `Dict[Nutrient, Amount]` view over one product's rows of a `NutrientTable`."""
+
+    __slots__ = ("table", "start", "stop")
+
+    def __init__(self, table: NutrientTable, start: int, stop: int) -> None:
+        self.table = table
+        self.start = start
+        self.stop = stop
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __iter__(self) -> Iterator[Nutrient]:
+        return (self._nutrient(i) for i in range(self.start, self.stop))
+
+    def __getitem__(self, nutrient: Nutrient) -> Amount:
+        for i in range(self.start, self.stop):
+            if self._nutrient(i) == nutrient:
+                return self._amount(i)
+        raise KeyError(nutrient)
+
+    def items(self) -> Iterator[Tuple[Nutrient, Amount]]:
+        return ((self._nutrient(i), self._amount(i)) for i in range(self.start, self.stop))
+
+    def values_array(self) -> np.ndarray:
+        return self.table.value[self.start:self.stop]
+
+    def codes_array(self) -> np.ndarray:
+        return self.table.nutrient_code[self.start:self.stop]
+
+    def units(self) -> List[str]:
+        return [self.table.units.values[unit] for unit in self.table.unit[self.start:self.stop]]
+
+    def __repr__(self) -> str:
+        return f"NutrientAmounts({dict(self.items())})"
+
+    def _nutrient(self, i: int) -> Nutrient:
+        code = int(self.table.nutrient_code[i])
+        name = self.table.nutrient_names[code]
+        derivation_code = self.table.derivation_codes.values[self.table.derivation_code[i]]
+        return self.table.registry.get(Nutrient, nutrient_uid(name, str(code), derivation_code), name, str(code),
+                                       derivation_code)
+
+    def _amount(self, i: int) -> Amount:
+        scalar = str(self.table.value[i])
+        unit = self.table.units.values[self.table.unit[i]]
+        # one amount per scalar and unit is far too many distinct values to intern
+        return Amount(uid(f"amount_{scalar}_{unit}"), scalar, unit)
+
+
+def _to_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")
@@ -1,36 +1,48 @@
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Mapping
 
 from utils.json_encoder import JSONEncoderEnhancedWithDateSerialization
 from utils.utils import with_label
 
 
+class _Slotted:
+    """Models declare __slots__, so pickling and copying rebuild them through the constructor."""
+    __slots__ = ()
+
+    def __reduce__(self):
+        return self.__class__, tuple(getattr(self, field.name) for field in fields(self))
+
+
 @with_label("source")
-@dataclass
-class InformationSource:
+@dataclass(frozen=True)
+class InformationSource(_Slotted):
+    __slots__ = ("uid", "abbreviation")
     uid: str
     abbreviation: str
 
 
 @with_label("company")
-@dataclass
-class Manufacturer:
+@dataclass(frozen=True)
+class Manufacturer(_Slotted):
+    __slots__ = ("uid", "name")
     uid: str
     name: str
 
 
 @with_label("ingredient")
-@dataclass
-class Ingredient:
+@dataclass(frozen=True)
+class Ingredient(_Slotted):
+    __slots__ = ("uid", "name")
     uid: str
     name: str
 
 
 @with_label("nutrient")
-@dataclass(eq=True)
-class Nutrient:
+@dataclass(eq=True, frozen=True)
+class Nutrient(_Slotted):
+    __slots__ = ("uid", "name", "code", "derivation_code")
     uid: str
     name: str
     code: str
@@ -41,8 +53,9 @@ class Nutrient:
 
 
 @with_label("amount")
-@dataclass
-class Amount:
+@dataclass(frozen=True)
+class Amount(_Slotted):
+    __slots__ = ("uid", "scalar", "unit")
     uid: str
     scalar: str
     unit: str
@@ -50,7 +63,9 @@ class Amount:
 
 @with_label("product")
 @dataclass
-class FoodProduct:
+class FoodProduct(_Slotted):
+    __slots__ = ("uid", "usda_food_db_id", "name", "source", "barcode", "manufactured_by", "date_modified",
+                 "date_available", "ingredients", "nutrients")
     uid: str
     usda_food_db_id: str
     name: str
@@ -60,7 +75,7 @@ class FoodProduct:
     date_modified: datetime
     date_available: datetime
     ingredients: List[Ingredient]
-    nutrients: Dict[Nutrient, Amount]
+    nutrients: Mapping[Nutrient, Amount]
 
 
 if __name__ == "__main__":
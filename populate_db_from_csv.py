@@ -1,12 +1,61 @@
+import argparse
 import logging
+import sys
+from contextlib import nullcontext
 
-from csv_parser.product_parser import ProductParser
-from repository.product_repository import DataSource, ProductRepository
+from csv_parser.product_parser import SNAPSHOT_DIRECTORY, ProductParser
+from repository.ingest_checkpoint import IngestCheckpoint
+from repository.ingest_pipeline import IngestPipeline
+from repository.product_repository import ALPHA_ENDPOINTS, DataSource, ProductRepository
+from repository.uid_cache import UidCache
+from utils.metrics import METRICS
+
+UID_CACHE_FILE = "uid_cache.sqlite3"
+CHECKPOINT_FILE = "ingest_checkpoint.sqlite3"
 
 if __name__ == "__main__":
-    products = ProductParser().parse()
-    repo = ProductRepository(DataSource())
+    arg_parser = argparse.ArgumentParser(description="Load the USDA food composition CSVs into Dgraph")
+    # the pipeline does not skip unchanged products or remove deleted ones like the incremental sync does
+    load_mode = arg_parser.add_mutually_exclusive_group()
+    load_mode.add_argument("--incremental", action="store_true",
+                           help=f"only send products that are new or changed since the last run ({CHECKPOINT_FILE})")
+    arg_parser.add_argument("--alpha", action="append", dest="alphas", metavar="HOST:PORT",
+                            help=f"Dgraph Alpha endpoint, repeat for a cluster (default: {', '.join(ALPHA_ENDPOINTS)})")
+    arg_parser.add_argument("--metrics", choices=("json", "prometheus"),
+                            help="collect per-stage timings, counters and peak RSS and dump them in this format")
+    arg_parser.add_argument("--metrics-output", default="-", help="file to write the metrics to (default: stdout)")
+    arg_parser.add_argument("--no-snapshot", action="store_true",
+                            help="always parse the CSVs instead of reusing the parsed snapshot "
+                                 f"in {SNAPSHOT_DIRECTORY}")
+    load_mode.add_argument("--pipelined", action="store_true",
+                           help="parse, serialize and load in overlapping stages and report each stage's utilization")
+    arg_parser.add_argument("--defer-indexes", action="store_true",
+                            help="drop the indexes while loading and rebuild them in one pass afterwards")
+    args = arg_parser.parse_args()
+
+    if args.metrics:
+        METRICS.enable()
+
+    products = ProductParser().parse_iter(snapshot_dir=None if args.no_snapshot else SNAPSHOT_DIRECTORY)
+    repo = ProductRepository(DataSource(args.alphas or ALPHA_ENDPOINTS), UidCache(UID_CACHE_FILE))
     # repo._dropAll()
-    # repo._createSchema()
-    repo.addProducts(products)
-    logging.info(f"Finished adding #{len(products)} products")
+    repo.schema.apply()
+    repo.warmUidCache()
+    with repo.schema.deferredIndexes() if args.defer_indexes else nullcontext():
+        if args.incremental:
+            report = repo.syncProducts(products, IngestCheckpoint(CHECKPOINT_FILE))
+        elif args.pipelined:
+            pipeline_report = IngestPipeline(repo).run(products)
+            print(f"Pipeline {pipeline_report.summary()}", file=sys.stderr)  # stdout may carry the metrics dump
+            report = pipeline_report.load
+        else:
+            report = repo.bulkAddProducts(products)
+    logging.info(f"Finished adding #{report.products} products")
+
+    if args.metrics:
+        dump = METRICS.to_json() if args.metrics == "json" else METRICS.to_prometheus()
+        if args.metrics_output == "-":
+            print(dump)
+        else:
+            with open(args.metrics_output, "w") as f:
+                f.write(dump)
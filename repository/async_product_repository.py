@@ -0,0 +1,197 @@
+import asyncio
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, TypeVar
+
+import pydgraph
+from pydgraph import Mutation
+
+from models.product_models import FoodProduct
+from repository.mutation_serializer import MutationSerializer, payload_bytes
+from repository.product_repository import ALPHA_ENDPOINTS, LoadReport, missing_shared_nodes
+from repository.uid_cache import UidCache
+from utils.metrics import METRICS
+
+T = TypeVar("T")
+
+
+class AlphaPool:
+    """
+    `stubs_per_endpoint` gRPC channels to every Alpha endpoint. `client()` hands out their clients round robin, so
+    consecutive transactions land on different Alphas.
+    """
+
+    def __init__(self, endpoints: Sequence[str] = ALPHA_ENDPOINTS, stubs_per_endpoint: int = 1) -> None:
+        if not endpoints:
+            raise ValueError("AlphaPool needs at least one endpoint")
+        self.endpoints = list(endpoints)
+        self.stubs = [pydgraph.DgraphClientStub(endpoint) for _ in range(stubs_per_endpoint)
+                      for endpoint in self.endpoints]
+        self.clients = [pydgraph.DgraphClient(stub) for stub in self.stubs]
+        self._next = itertools.cycle(self.clients)
+        self._lock = threading.Lock()
+
+    def client(self) -> pydgraph.DgraphClient:
+        with self._lock:
+            return next(self._next)
+
+    def close(self) -> None:
+        for stub in self.stubs:
+            stub.channel.close()
+
+
+@dataclass
+class _LoopLimits:
+    loop: asyncio.AbstractEventLoop
+    mutations: asyncio.Semaphore
+    queries: asyncio.Semaphore
+    sharedNodesLock: asyncio.Lock
+
+
+class AsyncProductRepository:
+    """
+    asyncio variant of `ProductRepository` over an `AlphaPool`. pydgraph only has a blocking API, so every
+    transaction runs on a worker thread; semaphores cap the mutations and queries in flight, and retry backoff
+    waits on the event loop instead of holding a thread.
+    """
+
+    def __init__(
+            self, pool: AlphaPool, max_in_flight_mutations: int = 8, max_in_flight_queries: int = 32,
+            uid_cache: Optional[UidCache] = None
+    ) -> None:
+        self.pool = pool
+        self.max_in_flight_mutations = max_in_flight_mutations
+        self.max_in_flight_queries = max_in_flight_queries
+        self.uid_cache = uid_cache
+        self.serializer = MutationSerializer(uid_cache)
+        self._limits: Optional[_LoopLimits] = None
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight_mutations + max_in_flight_queries,
+                                            thread_name_prefix="dgraph")
+
+    async def __aenter__(self) -> "AsyncProductRepository":
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+    async def addProducts(
+            self, products: Iterable[FoodProduct], max_retries: int = 5, backoff_seconds: float = 0.1
+    ) -> List[Dict[str, Any]]:
+        products = list(products)
+        await self._addMissingSharedNodes(products, max_retries, backoff_seconds)
+        product_dicts = self.serializer.serialize(products)
+        await self._mutateWithRetry(payload_bytes(product_dicts), max_retries, backoff_seconds)
+        return product_dicts
+
+    async def bulkAddProducts(
+            self, products: Iterable[FoodProduct], batch_size: int = 1000, max_retries: int = 5,
+            backoff_seconds: float = 0.1
+    ) -> LoadReport:
+        """
+        Loads products in transactions of `batch_size` products spread over the pool. A new batch is only read from
+        `products` once a mutation slot is free, so at most `max_in_flight_mutations` batches are held in memory.
+        """
+        report = LoadReport()
+        started = time.perf_counter()
+        products = iter(products)
+        free_slots = asyncio.Semaphore(self.max_in_flight_mutations)
+
+        async def commit(batch: List[FoodProduct]):
+            try:
+                batch_started = time.perf_counter()
+                retries = await self._addMissingSharedNodes(batch, max_retries, backoff_seconds)
+                with METRICS.stage("load.serialize"):
+                    payload = payload_bytes(self.serializer.serialize(batch))
+                _, attempts = await self._mutateWithRetry(payload, max_retries, backoff_seconds)
+                METRICS.observe("load.batch_latency_seconds", time.perf_counter() - batch_started)
+                METRICS.count("load.products", len(batch))
+                report.products += len(batch)
+                report.batches += 1
+                report.retries += retries + attempts
+            finally:
+                free_slots.release()
+
+        pending = set()
+        try:
+            for batch in iter(lambda: list(itertools.islice(products, batch_size)), []):
+                await free_slots.acquire()
+                done = {task for task in pending if task.done()}
+                pending -= done
+                for task in done:
+                    task.result()  # stop at the first failed batch
+                pending.add(asyncio.ensure_future(commit(batch)))
+            await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+        report.seconds = time.perf_counter() - started
+        logging.info("Loaded %s products in %s batches (%s retries) across %s endpoints in %.1fs, %.0f products/s",
+                     report.products, report.batches, report.retries, len(self.pool.endpoints), report.seconds,
+                     report.products_per_second)
+        return report
+
+    async def query(self, query: str, variables: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        client = self.pool.client()
+        async with self._loopLimits().queries:
+            res = await self._run(client.query, query, variables)
+        return json.loads(res.json)
+
+    async def _addMissingSharedNodes(
+            self, products: List[FoodProduct], max_retries: int, backoff_seconds: float
+    ) -> int:
+        if self.uid_cache is None:
+            return 0
+        async with self._loopLimits().sharedNodesLock:
+            missing = missing_shared_nodes(products, self.uid_cache)
+            if not missing:
+                return 0
+            payload = payload_bytes(self.serializer.serialize_nodes(missing.values()))
+            assigned, attempts = await self._mutateWithRetry(payload, max_retries, backoff_seconds)
+            self.uid_cache.update({xid: assigned.uids[xid] for xid in missing})
+            return attempts
+
+    async def _mutateWithRetry(self, payload: bytes, max_retries: int, backoff_seconds: float):
+        for attempt in range(max_retries + 1):
+            try:
+                async with self._loopLimits().mutations:
+                    assigned = await self._run(_mutate_and_commit, self.pool.client(), payload)
+                return assigned, attempt
+            except pydgraph.AbortedError:
+                if attempt == max_retries:
+                    raise
+                delay = backoff_seconds * 2 ** attempt
+                logging.warning("Mutation aborted, retrying in %.2fs", delay)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+    def _loopLimits(self) -> _LoopLimits:
+        """The semaphores and lock, created inside the running loop on first use and again if a new loop uses them."""
+        loop = asyncio.get_running_loop()
+        if self._limits is None or self._limits.loop is not loop:
+            self._limits = _LoopLimits(loop, asyncio.Semaphore(self.max_in_flight_mutations),
+                                       asyncio.Semaphore(self.max_in_flight_queries), asyncio.Lock())
+        return self._limits
+
+    async def _run(self, function: Callable[..., T], *args) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+
+def _mutate_and_commit(client: pydgraph.DgraphClient, payload: bytes):
+    txn = client.txn()
+    try:
+        assigned = txn.mutate(mutation=Mutation(set_json=payload))
+        txn.commit()
+        return assigned
+    finally:
+        txn.discard()
@@ -0,0 +1,150 @@
+import gzip
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from models.product_models import FoodProduct
+from repository.mutation_serializer import MutationSerializer
+from repository.product_repository import SCHEMA
+from utils.metrics import METRICS
+
+FORMATS = ("rdf", "json")
+SHARD_BYTES = 64 << 20  # uncompressed bytes per file
+SCHEMA_FILE_NAME = "products.schema"
+
+_BLANK_NODE_UNSAFE = re.compile(r"[^A-Za-z0-9_]")
+
+
+@dataclass
+class ExportReport:
+    products: int = 0
+    schema: Optional[Path] = None
+    files: List[Path] = field(default_factory=list)
+
+
+class _ShardedGzipWriter:
+    """Writes records to numbered gzip files, starting a new file once `shard_bytes` uncompressed bytes are written."""
+
+    def __init__(self, directory: Path, suffix: str, shard_bytes: int, header: bytes = b"", separator: bytes = b"",
+                 footer: bytes = b"") -> None:
+        self.directory = directory
+        self.suffix = suffix
+        self.shard_bytes = shard_bytes
+        self.header, self.separator, self.footer = header, separator, footer
+        self.files: List[Path] = []
+        self._out = None
+        self._written = 0
+
+    def write(self, record: bytes) -> None:
+        if self._out is None or self._written >= self.shard_bytes:
+            self._next_file()
+        else:
+            self._out.write(self.separator)
+        self._out.write(record)
+        self._written += len(record)
+
+    def close(self) -> None:
+        if self._out is not None:
+            self._out.write(self.footer)
+            self._out.close()
+            self._out = None
+
+    def _next_file(self) -> None:
+        self.close()
+        path = self.directory.joinpath(f"products-{len(self.files):05}.{self.suffix}")
+        self.files.append(path)
+        self._out = gzip.open(path, "wb", compresslevel=6)
+        self._out.write(self.header)
+        self._written = 0
+
+
+def export_bulk(
+        products: Iterable[FoodProduct], output_dir: Path, data_format: str = "rdf", shard_bytes: int = SHARD_BYTES
+) -> ExportReport:
+    """
+    Streams products into gzipped RDF N-Quad or JSON files for `dgraph bulk`, plus the schema file to pass with `-s`.
+    Blank node names come from `uid()`, so every reference to a shared node resolves to one node across all files;
+    shared nodes are written in full only the first time they appear.
+    """
+    if data_format not in FORMATS:
+        raise ValueError(f"Unknown bulk load format {data_format}, expected one of {FORMATS}")
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for stale in output_dir.glob("products-*.*.gz"):  # the bulk loader would load leftovers of a bigger export
+        stale.unlink()
+    report = ExportReport(schema=output_dir.joinpath(SCHEMA_FILE_NAME))
+    report.schema.write_text(SCHEMA.lstrip())
+
+    if data_format == "rdf":
+        writer, encode = _ShardedGzipWriter(output_dir, "rdf.gz", shard_bytes), _rdf_record
+    else:
+        writer = _ShardedGzipWriter(output_dir, "json.gz", shard_bytes, b"[\n", b",\n", b"\n]\n")
+        encode = _json_record
+    try:
+        for node in MutationSerializer().serialize_stream(products):
+            with METRICS.stage("export.write"):
+                writer.write(encode(node))
+            report.products += 1
+            METRICS.count("export.products")
+    finally:
+        writer.close()
+    report.files = writer.files
+    logging.info("Exported %s products to %s files in %s, load them with: dgraph bulk -f %s -s %s",
+                 report.products, len(report.files), output_dir, output_dir, report.schema)
+    return report
+
+
+def _rdf_record(node: Dict[str, Any]) -> bytes:
+    return "".join(nquads(node)).encode("utf8")
+
+
+def _json_record(node: Dict[str, Any]) -> bytes:
+    return json.dumps(node, separators=(",", ":"), ensure_ascii=False).encode("utf8")
+
+
+def nquads(node: Dict[str, Any]) -> Iterator[str]:
+    """N-Quads of a serialized mutation object and the nested nodes it writes in full."""
+    subject = _rdf_node(node["uid"])
+    for predicate, value in node.items():
+        if predicate == "uid" or "|" in predicate:  # facets belong to the edge pointing at this node
+            continue
+        if isinstance(value, list):
+            for child in value:
+                yield from _edge(subject, predicate, child)
+        elif isinstance(value, dict):
+            yield from _edge(subject, predicate, value)
+        else:
+            yield f"{subject} <{predicate}> {_literal(value)} .\n"
+
+
+def _edge(subject: str, predicate: str, child: Dict[str, Any]) -> Iterator[str]:
+    prefix = f"{predicate}|"
+    facets = ", ".join(f"{key[len(prefix):]}={_facet_value(value)}"
+                       for key, value in child.items() if key.startswith(prefix))
+    facets = f" ({facets})" if facets else ""
+    yield f"{subject} <{predicate}> {_rdf_node(child['uid'])}{facets} .\n"
+    yield from nquads(child)
+
+
+def _rdf_node(uid: str) -> str:
+    """Blank node labels may not contain spaces and most punctuation, those characters are hex escaped."""
+    if uid.startswith("_:"):
+        return "_:" + _BLANK_NODE_UNSAFE.sub(_hex_escape, uid[2:])
+    return f"<{uid}>"
+
+
+def _hex_escape(match) -> str:
+    return "".join(f"-{byte:02X}" for byte in match.group().encode("utf8"))
+
+
+def _literal(value: Any) -> str:
+    if isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False)
+    return f'"{value}"^^<xs:{"int" if isinstance(value, int) else "float"}>'
+
+
+def _facet_value(value: Any) -> str:
+    return repr(value) if isinstance(value, (int, float)) else json.dumps(value, ensure_ascii=False)
@@ -0,0 +1,75 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+from models.product_models import FoodProduct
+
+
+def product_hash(product: FoodProduct) -> str:
+    """Content hash of everything we load for a product, independent of uids."""
+    content = (
+        product.name, product.source.abbreviation, product.barcode, product.manufactured_by.name,
+        product.date_modified.isoformat(), product.date_available.isoformat(),
+        [ingredient.name for ingredient in product.ingredients],
+        sorted((nutrient.name, nutrient.code, nutrient.derivation_code, amount.scalar, amount.unit)
+               for nutrient, amount in product.nutrients.items()),
+    )
+    return hashlib.sha1(repr(content).encode("utf8")).hexdigest()
+
+
+class IngestCheckpoint:
+    """
+    Persistent record of every product committed to Dgraph: content hash, date_modified and the uid it was stored
+    under. Rows are written per committed batch, so a crashed load resumes by skipping what is already current.
+    """
+
+    def __init__(self, path: Union[str, Path] = ":memory:") -> None:
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS products "
+            "(usda_food_db_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL, date_modified TEXT NOT NULL, "
+            "uid TEXT NOT NULL)")
+        self._lock = threading.Lock()
+        self._products: Dict[str, Tuple[str, str, str]] = {
+            row[0]: row[1:] for row in self._connection.execute(
+                "SELECT usda_food_db_id, content_hash, date_modified, uid FROM products")
+        }
+
+    def is_current(self, product: FoodProduct) -> bool:
+        stored = self._products.get(product.usda_food_db_id)
+        return stored is not None and stored[1] == product.date_modified.isoformat() \
+            and stored[0] == product_hash(product)
+
+    def uid(self, usda_food_db_id: str) -> Optional[str]:
+        stored = self._products.get(usda_food_db_id)
+        return stored[2] if stored is not None else None
+
+    def record(self, products: Iterable[FoodProduct], assigned_uids: Mapping[str, str]) -> None:
+        """Stores committed products; `assigned_uids` resolves the blank-node uids of newly created ones."""
+        rows = []
+        for product in products:
+            uid = assigned_uids.get(product.uid[2:], product.uid) if product.uid.startswith("_:") else product.uid
+            rows.append((product.usda_food_db_id, product_hash(product), product.date_modified.isoformat(), uid))
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)", rows)
+            self._products.update((row[0], row[1:]) for row in rows)
+
+    def missing(self, seen_ids: Set[str]) -> List[Tuple[str, str]]:
+        """(usda_food_db_id, uid) of recorded products that were not part of a run."""
+        return [(product_id, stored[2]) for product_id, stored in self._products.items() if product_id not in seen_ids]
+
+    def forget(self, product_ids: Iterable[str]) -> None:
+        product_ids = list(product_ids)
+        with self._lock, self._connection:
+            self._connection.executemany("DELETE FROM products WHERE usda_food_db_id = ?",
+                                         [(product_id,) for product_id in product_ids])
+            for product_id in product_ids:
+                self._products.pop(product_id, None)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __len__(self) -> int:
+        return len(self._products)
@@ -0,0 +1,203 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional
+
+from models.product_models import FoodProduct
+from repository.product_repository import LoadReport, PreparedBatch, ProductRepository
+from utils.metrics import METRICS
+
+_END = object()
+_POLL_SECONDS = 0.1
+
+
+@dataclass
+class StageReport:
+    name: str
+    workers: int
+    items: int = 0
+    busy_seconds: float = 0.0  # doing the stage's own work
+    starved_seconds: float = 0.0  # waiting for input
+    blocked_seconds: float = 0.0  # waiting for room in the output queue
+
+    def utilization(self, seconds: float) -> float:
+        return self.busy_seconds / (seconds * self.workers) if seconds else 0.0
+
+
+@dataclass
+class QueueReport:
+    name: str
+    capacity: int
+    samples: int = 0
+    depth_sum: int = 0
+    max_depth: int = 0
+
+    @property
+    def mean_depth(self) -> float:
+        return self.depth_sum / self.samples if self.samples else 0.0
+
+
+@dataclass
+class PipelineReport:
+    load: LoadReport
+    stages: List[StageReport] = field(default_factory=list)
+    queues: List[QueueReport] = field(default_factory=list)
+
+    @property
+    def bottleneck(self) -> str:
+        """The busiest stage; the others spend their spare time starved or blocked on it."""
+        return max(self.stages, key=lambda stage: stage.utilization(self.load.seconds)).name
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{stage.name} {stage.utilization(self.load.seconds):.0%}" for stage in self.stages)
+        queues = ", ".join(f"{q.name} {q.mean_depth:.1f}/{q.capacity} (max {q.max_depth})" for q in self.queues)
+        return f"utilization: {stages}; queue depth: {queues}; bottleneck: {self.bottleneck}"
+
+    def record(self) -> None:
+        """Sets the stage and queue figures as `pipeline.*` gauges, so the --metrics dump carries them too."""
+        for stage in self.stages:
+            METRICS.gauge(f"pipeline.{stage.name}.utilization", stage.utilization(self.load.seconds))
+            METRICS.gauge(f"pipeline.{stage.name}.starved_seconds", stage.starved_seconds)
+            METRICS.gauge(f"pipeline.{stage.name}.blocked_seconds", stage.blocked_seconds)
+        for q in self.queues:
+            METRICS.gauge(f"pipeline.{q.name}.mean_depth", q.mean_depth)
+            METRICS.gauge(f"pipeline.{q.name}.max_depth", q.max_depth)
+
+
+class _BoundedQueue:
+    """queue.Queue that samples its depth on every put and gives up waiting once the pipeline is stopped."""
+
+    def __init__(self, name: str, capacity: int, stopped: threading.Event) -> None:
+        self.queue = queue.Queue(maxsize=capacity)
+        self.report = QueueReport(name, capacity)
+        self.stopped = stopped
+        self._lock = threading.Lock()
+
+    def put(self, item) -> None:
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=_POLL_SECONDS)
+            except queue.Full:
+                continue
+            depth = self.queue.qsize()
+            with self._lock:
+                self.report.samples += 1
+                self.report.depth_sum += depth
+                self.report.max_depth = max(self.report.max_depth, depth)
+            return
+
+    def get(self):
+        while not self.stopped.is_set():
+            try:
+                return self.queue.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _END
+
+
+class IngestPipeline:
+    """
+    Runs parsing, serialization and loading as concurrent stages connected by bounded queues, so the CPU parses and
+    serializes the next batches while Dgraph commits the previous ones. A full queue blocks the stage feeding it, which
+    keeps at most `queue_depth` batches buffered between two stages however far parsing runs ahead. The report says how
+    busy each stage was and how full the queues ran; the busiest stage is the one to speed up.
+    """
+
+    def __init__(self, repository: ProductRepository, batch_size: int = 1000, loaders: int = 4, queue_depth: int = 4,
+                 max_retries: int = 5, backoff_seconds: float = 0.1) -> None:
+        self.repository = repository
+        self.batch_size = batch_size
+        self.loaders = loaders
+        self.queue_depth = queue_depth
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+    def run(self, products: Iterable[FoodProduct]) -> PipelineReport:
+        stopped = threading.Event()
+        batches = _BoundedQueue("batches", self.queue_depth, stopped)
+        payloads = _BoundedQueue("payloads", self.queue_depth, stopped)
+        report = PipelineReport(LoadReport(), [StageReport("parse", 1), StageReport("serialize", 1),
+                                               StageReport("load", self.loaders)], [batches.report, payloads.report])
+        parse, serialize, load = report.stages
+        errors: List[BaseException] = []
+        report_lock = threading.Lock()
+
+        def parse_stage():
+            iterator = iter(products)
+            while True:
+                started = time.perf_counter()
+                batch = list(itertools.islice(iterator, self.batch_size))
+                parse.busy_seconds += time.perf_counter() - started
+                if not batch or stopped.is_set():
+                    break
+                parse.items += 1
+                _timed(parse, "blocked_seconds", lambda: batches.put(batch))
+            batches.put(_END)
+
+        def serialize_stage():
+            while True:
+                batch = _timed(serialize, "starved_seconds", batches.get)
+                if batch is _END:
+                    break
+                started = time.perf_counter()
+                prepared = self.repository._prepareBatch(batch, self.max_retries, self.backoff_seconds)
+                serialize.busy_seconds += time.perf_counter() - started
+                serialize.items += 1
+                _timed(serialize, "blocked_seconds", lambda: payloads.put(prepared))
+            for _ in range(self.loaders):
+                payloads.put(_END)
+
+        def load_stage():
+            while True:
+                prepared: PreparedBatch = _timed(load, "starved_seconds", payloads.get, report_lock)
+                if prepared is _END:
+                    break
+                started = time.perf_counter()
+                attempts = self.repository._loadBatch(prepared, self.max_retries, self.backoff_seconds)
+                with report_lock:
+                    load.busy_seconds += time.perf_counter() - started
+                    load.items += 1
+                    report.load.products += len(prepared.products)
+                    report.load.batches += 1
+                    report.load.retries += prepared.retries + attempts
+
+        def guarded(stage: Callable[[], None]):
+            def run_stage():
+                try:
+                    stage()
+                except BaseException as e:
+                    errors.append(e)
+                    stopped.set()
+            return run_stage
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=guarded(parse_stage), name="ingest-parse"),
+                   threading.Thread(target=guarded(serialize_stage), name="ingest-serialize")]
+        threads += [threading.Thread(target=guarded(load_stage), name=f"ingest-load-{i}") for i in range(self.loaders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report.load.seconds = time.perf_counter() - started
+        if errors:
+            raise errors[0]
+        logging.info("Loaded %s products in %s batches (%s retries) in %.1fs, %.0f products/s", report.load.products,
+                     report.load.batches, report.load.retries, report.load.seconds, report.load.products_per_second)
+        logging.info("Pipeline %s", report.summary())
+        report.record()
+        return report
+
+
+def _timed(stage: StageReport, attribute: str, wait: Callable, lock: Optional[threading.Lock] = None):
+    started = time.perf_counter()
+    result = wait()
+    elapsed = time.perf_counter() - started
+    if lock is None:
+        setattr(stage, attribute, getattr(stage, attribute) + elapsed)
+    else:
+        with lock:
+            setattr(stage, attribute, getattr(stage, attribute) + elapsed)
+    return result
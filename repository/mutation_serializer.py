@@ -0,0 +1,119 @@
+import collections.abc
+import dataclasses
+import json
+import math
+import typing
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set
+
+from models.product_models import FoodProduct
+from repository.uid_cache import UidCache
+
+Encoder = Callable[[Any, Set[str]], Dict[str, Any]]
+
+
+class MutationSerializer:
+    """
+    Turns models into Dgraph JSON mutation objects in a single pass. An encoder is generated once per model class from
+    its field types; shared nodes (everything below a product) are written in full the first time they appear in a
+    payload and as a bare uid reference afterwards, or straight away as a reference to the real uid when `uid_cache`
+    already knows it. Shared nodes carry their blank-node name as `xid`. Nutrient amounts become `amount`/`unit`
+    facets on the `nutrients` edge instead of separate Amount nodes.
+    """
+
+    def __init__(self, uid_cache: Optional[UidCache] = None) -> None:
+        self.uid_cache = uid_cache
+        self._encoders: Dict[type, Encoder] = {}
+
+    def serialize(self, products: Iterable[FoodProduct]) -> List[Dict[str, Any]]:
+        emitted: Set[str] = set()
+        return [self._encoder(type(product))(product, emitted) for product in products]
+
+    def serialize_stream(self, products: Iterable[FoodProduct]) -> Iterator[Dict[str, Any]]:
+        """Lazy `serialize`; shared nodes are written in full once per stream rather than once per payload."""
+        emitted: Set[str] = set()
+        for product in products:
+            yield self._encoder(type(product))(product, emitted)
+
+    def serialize_nodes(self, nodes: Iterable[Any]) -> List[Dict[str, Any]]:
+        emitted: Set[str] = set()
+        return [self._shared_node(node, emitted) for node in nodes]
+
+    def serialize_bytes(self, products: Iterable[FoodProduct]) -> bytes:
+        return payload_bytes(self.serialize(products))
+
+    def _encoder(self, cls: type) -> Encoder:
+        encoder = self._encoders.get(cls)
+        if encoder is None:
+            encoder = self._encoders[cls] = self._compile(cls)
+        return encoder
+
+    def _compile(self, cls: type) -> Encoder:
+        hints = typing.get_type_hints(cls)
+        field_encoders = [(field.name, self._field_encoder(field.name, hints[field.name]))
+                          for field in dataclasses.fields(cls)]
+        label = getattr(cls, "label", cls.__name__.lower())
+
+        def encode(obj, emitted: Set[str]) -> Dict[str, Any]:
+            node = {"uid": obj.uid}
+            for name, field_encoder in field_encoders:
+                value = getattr(obj, name)
+                if value is not None:
+                    node[name] = field_encoder(value, emitted) if field_encoder is not None else value
+            node["label"] = label
+            return node
+
+        return encode
+
+    def _field_encoder(self, name: str, field_type) -> Optional[Callable[[Any, Set[str]], Any]]:
+        origin = getattr(field_type, "__origin__", None)
+        if dataclasses.is_dataclass(field_type):
+            return self._shared_node
+        if origin is list:
+            return lambda values, emitted: [self._shared_node(value, emitted) for value in values]
+        if isinstance(origin, type) and issubclass(origin, collections.abc.Mapping):
+            return lambda amounts, emitted: self._faceted_edges(name, amounts, emitted)
+        if isinstance(field_type, type) and issubclass(field_type, date):
+            return lambda value, emitted: value.isoformat()
+        return None
+
+    def _shared_node(self, node, emitted: Set[str]) -> Dict[str, Any]:
+        xid = blank_node_xid(node.uid)
+        if xid is not None and self.uid_cache is not None:
+            known_uid = self.uid_cache.get(xid)
+            if known_uid is not None:
+                return {"uid": known_uid}
+        if node.uid in emitted:
+            return {"uid": node.uid}
+        emitted.add(node.uid)
+        encoded = self._encoder(type(node))(node, emitted)
+        if xid is not None:
+            encoded["xid"] = xid
+        return encoded
+
+    def _faceted_edges(self, predicate: str, amounts: Mapping, emitted: Set[str]) -> List[Dict[str, Any]]:
+        edges = []
+        for nutrient, amount in amounts.items():
+            edge = self._shared_node(nutrient, emitted)
+            scalar = _to_float(amount.scalar)
+            if scalar is not None:
+                edge[f"{predicate}|amount"] = scalar
+            edge[f"{predicate}|unit"] = amount.unit
+            edges.append(edge)
+        return edges
+
+
+def blank_node_xid(uid: str) -> Optional[str]:
+    return uid[2:] if uid.startswith("_:") else None
+
+
+def payload_bytes(payload: List[Dict[str, Any]]) -> bytes:
+    return json.dumps(payload, separators=(",", ":")).encode("utf8")
+
+
+def _to_float(scalar: str) -> Optional[float]:
+    try:
+        value = float(scalar)
+    except ValueError:
+        return None
+    return None if math.isnan(value) else value
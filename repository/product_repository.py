@@ -1,67 +1,326 @@
+import itertools
 import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
 
 import pydgraph
-from pydgraph import Operation
+from pydgraph import Mutation, Operation
 
 from models.product_models import FoodProduct
-from utils.json_encoder import JSONEncoderEnhancedWithDateSerialization
+from repository.ingest_checkpoint import IngestCheckpoint
+from repository.mutation_serializer import MutationSerializer, blank_node_xid, payload_bytes
+from repository.query_cache import QueryCache, TouchedNodes
+from repository.schema_manager import SCHEMA, SchemaManager
+from repository.uid_cache import UidCache
+from utils.metrics import METRICS
+
+ALPHA_ENDPOINTS = ("localhost:9080",)
+
+LOOKUP_BATCH_SIZE = 1000
+WARM_PAGE_SIZE = 10_000  # xids per query, far below gRPC's 4 MiB default message limit
+
+PRODUCT_FIELDS = """uid
+    usda_food_db_id
+    name
+    barcode
+    date_available
+    date_modified
+    source { uid abbreviation }
+    manufactured_by { uid name }
+    ingredients { uid name }
+    nutrients @facets(amount, unit) { uid name code derivation_code }"""
 
 
 class DataSource:
-    def __init__(self) -> None:
+    def __init__(self, endpoints: Sequence[str] = ALPHA_ENDPOINTS) -> None:
         super().__init__()
-        client_stub = pydgraph.DgraphClientStub('localhost:9080')
-        self.client = pydgraph.DgraphClient(client_stub)
+        self.stubs = [pydgraph.DgraphClientStub(endpoint) for endpoint in endpoints]
+        # pydgraph picks one of the stubs at random for every transaction
+        self.client = pydgraph.DgraphClient(*self.stubs)
+
+
+@dataclass
+class LoadReport:
+    products: int = 0
+    batches: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+    skipped: int = 0
+    removed: int = 0
+
+    @property
+    def products_per_second(self) -> float:
+        return self.products / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class PreparedBatch:
+    products: List[FoodProduct]
+    payload: bytes
+    delete_payload: Optional[bytes]
+    retries: int  # aborted attempts while creating the batch's shared nodes
+
+    def touched(self) -> TouchedNodes:
+        """Decodes the payload again, so only batches that have cached queries to invalidate pay for it."""
+        return TouchedNodes.of(json.loads(self.payload))
 
 
 # TODO: highly experimental
 class ProductRepository:
 
-    def __init__(self, data_source: DataSource) -> None:
+    def __init__(
+            self, data_source: DataSource, uid_cache: Optional[UidCache] = None,
+            query_cache: Optional[QueryCache] = None
+    ) -> None:
         self.db = data_source.client
+        self.uid_cache = uid_cache
+        self.query_cache = query_cache if query_cache is not None else QueryCache()
+        self.serializer = MutationSerializer(uid_cache)
+        self.schema = SchemaManager(self.db)
+        self._sharedNodesLock = threading.Lock()
 
-    def addProducts(self, products: [FoodProduct]):
-        txn = self.db.txn()
-        try:
+    def addProducts(self, products: Iterable[FoodProduct], **load_options) -> LoadReport:
+        """Loads a stream of products in bounded batches; see `bulkAddProducts` for the options."""
+        return self.bulkAddProducts(products, **load_options)
 
-            product_dicts = []
+    def bulkAddProducts(
+            self, products: Iterable[FoodProduct], batch_size: int = 1000, concurrency: int = 4,
+            max_retries: int = 5, backoff_seconds: float = 0.1, checkpoint: Optional[IngestCheckpoint] = None
+    ) -> LoadReport:
+        """
+        Loads products in transactions of `batch_size` products, `concurrency` of them in flight at once. Aborted
+        transactions are retried with exponential backoff; at most two batches per thread are buffered.
+        Committed batches are recorded in `checkpoint` when one is given.
+        """
+        report = LoadReport()
+        started = time.perf_counter()
+        products = iter(products)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = set()
+            for batch in iter(lambda: list(itertools.islice(products, batch_size)), []):
+                if len(pending) >= concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collectBatches(done, report)
+                pending.add(executor.submit(self._commitBatch, batch, max_retries, backoff_seconds, checkpoint))
+            self._collectBatches(pending, report)
+        report.seconds = time.perf_counter() - started
+        logging.info(f"Loaded {report.products} products in {report.batches} batches ({report.retries} retries) "
+                     f"in {report.seconds:.1f}s, {report.products_per_second:.0f} products/s")
+        return report
+
+    def syncProducts(
+            self, products: Iterable[FoodProduct], checkpoint: IngestCheckpoint, **load_options
+    ) -> LoadReport:
+        """
+        Incremental load: only products that are new or changed since `checkpoint` are sent, changed ones update their
+        existing node. After a complete run, products that are no longer in the input are deleted. Rerunning after a
+        crash skips everything already committed.
+        """
+        seen_ids = set()
+        skipped = 0
 
+        def changed_products():
+            nonlocal skipped
             for product in products:
-                product_dict = json.loads(json.dumps(product, cls=JSONEncoderEnhancedWithDateSerialization))
-                product_dicts.append(product_dict)
+                seen_ids.add(product.usda_food_db_id)
+                if checkpoint.is_current(product):
+                    skipped += 1
+                else:
+                    yield product
+
+        report = self.bulkAddProducts(changed_products(), checkpoint=checkpoint, **load_options)
+        report.skipped = skipped
+        removed = checkpoint.missing(seen_ids)
+        if removed:
+            self._deleteNodes([uid for _, uid in removed], load_options.get("max_retries", 5),
+                              load_options.get("backoff_seconds", 0.1))
+            checkpoint.forget(product_id for product_id, _ in removed)
+        report.removed = len(removed)
+        logging.info(f"Skipped {report.skipped} unchanged products, removed {report.removed} products")
+        return report
+
+    def _deleteNodes(self, uids: List[str], max_retries: int, backoff_seconds: float):
+        for i in range(0, len(uids), 1000):
+            payload = payload_bytes([{"uid": uid} for uid in uids[i:i + 1000]])
+            self._mutateWithRetry(None, max_retries, backoff_seconds, delete_payload=payload)
+            # only products are deleted, listings of them may have left out the uid
+            self.query_cache.invalidate(TouchedNodes(set(uids[i:i + 1000]), {FoodProduct.label}))
+
+    def _collectBatches(self, futures, report: LoadReport):
+        for future in futures:
+            products, retries = future.result()
+            report.products += products
+            report.batches += 1
+            report.retries += retries
+
+    def _commitBatch(
+            self, batch: List[FoodProduct], max_retries: int, backoff_seconds: float,
+            checkpoint: Optional[IngestCheckpoint] = None
+    ):
+        started = time.perf_counter()
+        prepared = self._prepareBatch(batch, max_retries, backoff_seconds, checkpoint)
+        attempts = self._loadBatch(prepared, max_retries, backoff_seconds, checkpoint)
+        METRICS.observe("load.batch_latency_seconds", time.perf_counter() - started)
+        return len(prepared.products), prepared.retries + attempts
 
-            txn.mutate(set_obj=product_dicts)
-            txn.commit()
-            return product_dicts
-        finally:
-            txn.discard()
+    def _prepareBatch(
+            self, batch: List[FoodProduct], max_retries: int, backoff_seconds: float,
+            checkpoint: Optional[IngestCheckpoint] = None
+    ) -> "PreparedBatch":
+        """Creates the batch's missing shared nodes and serializes it; the CPU half of committing a batch."""
+        retries = self._addMissingSharedNodes(batch, max_retries, backoff_seconds)
+        delete_payload = None
+        if checkpoint is not None:
+            batch = [self._withStoredUid(product, checkpoint) for product in batch]
+            stale_edges = [{"uid": product.uid, "ingredients": None, "nutrients": None}
+                           for product in batch if not product.uid.startswith("_:")]
+            delete_payload = payload_bytes(stale_edges) if stale_edges else None
+        with METRICS.stage("load.serialize"):
+            product_dicts = self.serializer.serialize(batch)
+            payload = payload_bytes(product_dicts)
+        return PreparedBatch(batch, payload, delete_payload, retries)
 
-    def _addMissingInformationSources(self, txn, information_source):
-        pass
+    def _loadBatch(
+            self, prepared: "PreparedBatch", max_retries: int, backoff_seconds: float,
+            checkpoint: Optional[IngestCheckpoint] = None
+    ) -> int:
+        """Commits a prepared batch and returns the number of aborted attempts; the network half."""
+        with METRICS.stage("load.commit"):
+            assigned, attempts = self._mutateWithRetry(prepared.payload, max_retries, backoff_seconds,
+                                                       prepared.delete_payload)
+        self.query_cache.invalidate(prepared.touched)
+        if checkpoint is not None:
+            checkpoint.record(prepared.products, assigned.uids)
+        METRICS.count("load.products", len(prepared.products))
+        METRICS.count("load.retries", prepared.retries + attempts)
+        return attempts
 
-    def _addMissingManufacturers(self, txn, manufacturer):
-        pass
+    def _withStoredUid(self, product: FoodProduct, checkpoint: IngestCheckpoint) -> FoodProduct:
+        stored_uid = checkpoint.uid(product.usda_food_db_id)
+        return replace(product, uid=stored_uid) if stored_uid is not None else product
 
-    def _addMissingIngredients(self, txn, ingredients):
-        pass
+    def _mutateWithRetry(
+            self, payload: Optional[bytes], max_retries: int, backoff_seconds: float,
+            delete_payload: Optional[bytes] = None
+    ):
+        for attempt in range(max_retries + 1):
+            txn = self.db.txn()
+            try:
+                if delete_payload:
+                    # its own request, so the old edges are gone before the set below writes the new ones
+                    txn.mutate(mutation=Mutation(delete_json=delete_payload))
+                assigned = txn.mutate(mutation=Mutation(set_json=payload)) if payload else pydgraph.Assigned()
+                txn.commit()
+                return assigned, attempt
+            except pydgraph.AbortedError:
+                if attempt == max_retries:
+                    raise
+                delay = backoff_seconds * 2 ** attempt
+                logging.warning(f"Mutation aborted, retrying in {delay:.2f}s")
+                time.sleep(delay * random.uniform(0.5, 1.5))
+            finally:
+                txn.discard()
+
+    def warmUidCache(self) -> int:
+        """
+        Replaces the uid cache contents with the shared nodes Dgraph actually has, read in pages of WARM_PAGE_SIZE.
+        Entries for nodes Dgraph no longer has, e.g. after its data was wiped, are dropped rather than reused.
+        """
+        if self.uid_cache is None:
+            return 0
+        uids: Dict[str, str] = {}
+        after = ""
+        while True:
+            res = self.db.query(f"{{ nodes(func: has(xid), first: {WARM_PAGE_SIZE}{after}) {{ uid xid }} }}")
+            nodes = json.loads(res.json).get("nodes", [])
+            uids.update((node["xid"], node["uid"]) for node in nodes)
+            if len(nodes) < WARM_PAGE_SIZE:
+                break
+            after = f", after: {nodes[-1]['uid']}"
+        self.uid_cache.replace(uids)
+        return len(uids)
+
+    def _addMissingSharedNodes(self, products: List[FoodProduct], max_retries: int, backoff_seconds: float) -> int:
+        """
+        Creates the sources, manufacturers, ingredients and nutrients the uid cache does not know yet in their own
+        transaction and records their uids, so product mutations only reference existing nodes. Serialised with a
+        lock, so concurrent batches never create the same node twice.
+        """
+        if self.uid_cache is None:
+            return 0
+        with self._sharedNodesLock:
+            missing = missing_shared_nodes(products, self.uid_cache)
+            if not missing:
+                return 0
+            node_dicts = self.serializer.serialize_nodes(missing.values())
+            assigned, attempts = self._mutateWithRetry(payload_bytes(node_dicts), max_retries, backoff_seconds)
+            self.query_cache.invalidate(TouchedNodes.of(node_dicts))
+            self.uid_cache.update({xid: assigned.uids[xid] for xid in missing})
+            return attempts
+
+    def query(self, query: str, variables: Optional[Dict[str, str]] = None) -> dict:
+        """Runs a read-only query through the query cache; ingesting through this repository invalidates it."""
+        return self.query_cache.get_or_load(query, variables, lambda: self.db.query(query, variables=variables).json)
+
+    def getProductsByBarcodes(self, barcodes: Iterable[str]) -> Dict[str, dict]:
+        """Products by barcode, looked up through the barcode hash index; unknown barcodes are left out."""
+        return self._getProductsBy("barcode", barcodes)
+
+    def getProductsByUsdaIds(self, product_ids: Iterable[str]) -> Dict[str, dict]:
+        """Products by USDA food database id, looked up through the usda_food_db_id hash index."""
+        return self._getProductsBy("usda_food_db_id", product_ids)
+
+    def _getProductsBy(self, predicate: str, values: Iterable[str]) -> Dict[str, dict]:
+        """
+        One `eq` query per LOOKUP_BATCH_SIZE values: eq over a list of values is a single index seek per value, so a
+        batch costs one round trip instead of one query per product.
+        """
+        if predicate in self.schema.deferred:
+            raise RuntimeError(f"The {predicate} index is dropped for the bulk load, look products up once it is rebuilt")
+        values = list(dict.fromkeys(values))
+        products = {}
+        for i in range(0, len(values), LOOKUP_BATCH_SIZE):
+            batch = values[i:i + LOOKUP_BATCH_SIZE]
+            query = (f"{{ products(func: eq({predicate}, {json.dumps(batch)})) @filter(eq(label, \"product\")) {{\n"
+                     f"    {PRODUCT_FIELDS}\n}} }}")
+            with METRICS.stage("lookup.query"):
+                result = self.query(query)
+            for product in result.get("products", []):
+                products[product[predicate]] = product
+        METRICS.count("lookup.products", len(products))
+        return products
 
     def _dropAll(self):
+        if self.uid_cache is not None:
+            self.uid_cache.clear()
+        self.query_cache.clear()
         return self.db.alter(Operation(drop_all=True))
 
     def _createSchema(self):
-        schema = """
-            <abbreviation>: string .
-            <barcode>: string .
-            <date_available>: string .
-            <date_modified>: string .
-            <ingredients>: uid @count @reverse .
-            <label>: string @index(exact) .
-            <manufactured_by>: uid @count @reverse .
-            <name>: string .
-            <source>: uid .
-            <usda_food_db_id>: string .
-        """
-        return self.db.alter(Operation(schema=schema))
+        return self.db.alter(Operation(schema=SCHEMA))
+
+
+def shared_nodes(products: Iterable[FoodProduct]) -> Iterator[object]:
+    for product in products:
+        yield product.source
+        yield product.manufactured_by
+        yield from product.ingredients
+        yield from product.nutrients
+
+
+def missing_shared_nodes(products: Iterable[FoodProduct], uid_cache: UidCache) -> Dict[str, object]:
+    """Shared nodes of `products` that `uid_cache` has no uid for yet, by xid."""
+    missing = {}
+    for node in shared_nodes(products):
+        xid = blank_node_xid(node.uid)
+        if xid is not None and xid not in uid_cache:
+            missing.setdefault(xid, node)
+    return missing
 
 
 if __name__ == "__main__":
@@ -79,11 +338,7 @@ if __name__ == "__main__":
 }"""
     variables = {'$findItemRegex': 'product'}
 
-    res = repo.db.query(query, variables=variables)
-    # If not doing a mutation in the same transaction, simply use:
-    # res = client.query(query, variables=variables)
-
-    ppl = json.loads(res.json)
+    ppl = repo.query(query, variables=variables)
 
     # Print results.
     print('Number of people named "Alice": {}'.format(len(ppl['someItems'])))
@@ -0,0 +1,203 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+from utils.metrics import METRICS
+
+ANY_NODE = "*"  # dependency of results the cache cannot attribute to labels, invalidated by every write
+
+_LABEL_FILTER = re.compile(r"""eq\(\s*label\s*,\s*(?:"([^"]*)"|(\$\w+))\s*\)""")
+
+CacheKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0  # dropped for the entry or memory limit
+    expirations: int = 0  # dropped for being older than the ttl
+    invalidations: int = 0  # dropped because a write touched what they read
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass
+class _Entry:
+    result: bytes
+    size: int
+    expires: float
+    dependencies: FrozenSet[str]
+
+
+@dataclass
+class TouchedNodes:
+    """What a write changed: uids of existing nodes and labels of every node it wrote."""
+    uids: Set[str] = field(default_factory=set)
+    labels: Set[str] = field(default_factory=set)
+
+    @classmethod
+    def of(cls, objects: Iterable[Mapping[str, Any]]) -> "TouchedNodes":
+        touched = cls()
+        for obj in _objects(list(objects)):
+            uid = obj.get("uid")
+            if uid is not None and not uid.startswith("_:"):
+                touched.uids.add(uid)
+            if "label" in obj:
+                touched.labels.add(obj["label"])
+        return touched
+
+    def update(self, other: "TouchedNodes") -> None:
+        self.uids |= other.uids
+        self.labels |= other.labels
+
+
+class QueryCache:
+    """
+    Read-through cache of query results keyed by query text and variables, evicting least recently used entries
+    beyond `max_entries` or `max_bytes` and dropping entries older than `ttl_seconds`. Results are kept as the JSON
+    bytes Dgraph returned, which is what the memory limit counts, and decoded on every hit so callers never share
+    objects. An entry depends on the uids in its result and on the labels its query filters on (or returned); a write
+    invalidates every entry depending on a uid or label it touched, and entries without a label on every write.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 << 20, ttl_seconds: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._dependents: Dict[str, Set[CacheKey]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, query: str, variables: Optional[Mapping[str, str]], load: Callable[[], bytes]) -> Any:
+        """The decoded result of `query`, from the cache or from `load()`, which returns Dgraph's JSON bytes."""
+        key = _key(query, variables)
+        with self._lock:
+            result = self._get(key)
+            generation = self._generation
+        if result is not None:
+            METRICS.count("query_cache.hits")
+            return json.loads(result)
+        METRICS.count("query_cache.misses")
+        result = load()
+        decoded = json.loads(result)
+        with self._lock:
+            # a write that committed while the query ran may not be in its result
+            if generation == self._generation:
+                self._put(key, result, _dependencies(query, variables, decoded))
+        return decoded
+
+    def invalidate(self, touched: Union[TouchedNodes, Callable[[], TouchedNodes]]) -> int:
+        """
+        Drops the entries `touched` may have changed and returns how many. `touched` may be a function computing it,
+        which is only called when the cache holds entries, so writes to an unused cache cost nothing per object.
+        """
+        with self._lock:
+            self._generation += 1
+            if not self._entries:
+                return 0
+        if callable(touched):
+            touched = touched()
+        with self._lock:  # entries stored meanwhile were loaded after the write and are current
+            keys = set(self._dependents.get(ANY_NODE, ()))
+            for dependency in touched.uids | {f"label:{label}" for label in touched.labels}:
+                keys |= self._dependents.get(dependency, set())
+            for key in keys:
+                self._remove(key)
+            self.stats.invalidations += len(keys)
+        METRICS.count("query_cache.invalidations", len(keys))
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._dependents.clear()
+            self.stats.entries = self.stats.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: CacheKey) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        if entry.expires <= self.clock():
+            self._remove(key)
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry.result
+
+    def _put(self, key: CacheKey, result: bytes, dependencies: FrozenSet[str]) -> None:
+        size = len(result) + len(key[0])
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(result, size, self.clock() + self.ttl_seconds, dependencies)
+        for dependency in dependencies:
+            self._dependents.setdefault(dependency, set()).add(key)
+        self.stats.entries += 1
+        self.stats.bytes += size
+        while len(self._entries) > self.max_entries or self.stats.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.stats.evictions += 1
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for dependency in entry.dependencies:
+            dependents = self._dependents[dependency]
+            dependents.discard(key)
+            if not dependents:
+                del self._dependents[dependency]
+        self.stats.entries -= 1
+        self.stats.bytes -= entry.size
+
+
+def _key(query: str, variables: Optional[Mapping[str, str]]) -> CacheKey:
+    return query, tuple(sorted((variables or {}).items()))
+
+
+def _dependencies(query: str, variables: Optional[Mapping[str, str]], result: Any) -> FrozenSet[str]:
+    labels: Set[str] = set()
+    for literal, variable in _LABEL_FILTER.findall(query):
+        value = literal if not variable else (variables or {}).get(variable)
+        if value is None:
+            return frozenset([ANY_NODE])
+        labels.add(value)
+    touched = TouchedNodes.of([result])
+    labels |= touched.labels
+    if not labels:
+        return frozenset([ANY_NODE])
+    return frozenset(touched.uids | {f"label:{label}" for label in labels})
+
+
+def _objects(value) -> List[Mapping[str, Any]]:
+    objects, stack = [], [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, dict):
+            objects.append(value)
+            stack.extend(value.values())
+    return objects
@@ -0,0 +1,115 @@
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Tuple
+
+from pydgraph import Operation
+
+
+@dataclass(frozen=True)
+class PredicateSchema:
+    name: str
+    type: str
+    indexes: Tuple[str, ...] = ()  # tokenizers, e.g. ("hash",) or ("exact", "term")
+    count: bool = False
+    reverse: bool = False
+    upsert: bool = False
+    deferrable: bool = True  # its index may be dropped during bulk loads and rebuilt afterwards
+
+    def render(self) -> str:
+        directives = []
+        if self.indexes:
+            directives.append(f"@index({', '.join(self.indexes)})")
+        if self.count:
+            directives.append("@count")
+        if self.reverse:
+            directives.append("@reverse")
+        if self.upsert:
+            directives.append("@upsert")
+        return " ".join([f"<{self.name}>: {self.type}"] + directives + ["."])
+
+    def without_indexes(self) -> "PredicateSchema":
+        return replace(self, indexes=(), count=False, reverse=False) if self.deferrable else self
+
+
+PREDICATES = (
+    PredicateSchema("abbreviation", "string"),
+    PredicateSchema("barcode", "string", indexes=("hash",)),
+    PredicateSchema("date_available", "string"),
+    PredicateSchema("date_modified", "string"),
+    PredicateSchema("ingredients", "uid", count=True, reverse=True),
+    # every read filters on eq(label, ...), so its index stays up during bulk loads as well
+    PredicateSchema("label", "string", indexes=("exact",), deferrable=False),
+    PredicateSchema("manufactured_by", "uid", count=True, reverse=True),
+    PredicateSchema("name", "string", indexes=("exact", "term")),
+    PredicateSchema("source", "uid"),
+    PredicateSchema("usda_food_db_id", "string", indexes=("hash",)),
+    # shared nodes are matched on xid while loading, so its index is never deferred
+    PredicateSchema("xid", "string", indexes=("exact",), deferrable=False),
+)
+
+
+def render_schema(predicates: Iterable[PredicateSchema]) -> str:
+    return "".join(f"{predicate.render()}\n" for predicate in predicates)
+
+
+SCHEMA = render_schema(PREDICATES)
+
+
+class SchemaManager:
+    """
+    Applies the declared schema to Dgraph as a diff: only predicates whose type or indexes differ from the live
+    schema are altered, so reapplying an unchanged schema never triggers an index rebuild.
+    """
+
+    def __init__(self, client, predicates: Iterable[PredicateSchema] = PREDICATES) -> None:
+        self.client = client
+        self.predicates = {predicate.name: predicate for predicate in predicates}
+        self.deferred: FrozenSet[str] = frozenset()  # predicates whose indexes are dropped right now
+
+    def current(self) -> Dict[str, PredicateSchema]:
+        res = self.client.query("schema {}")
+        return {node.predicate: _from_schema_node(node) for node in res.schema}
+
+    def diff(self, with_indexes: bool = True) -> List[PredicateSchema]:
+        """Declared predicates that the live schema is missing or declares differently."""
+        current = self.current()
+        wanted = [predicate if with_indexes else predicate.without_indexes() for predicate in self.predicates.values()]
+        return [predicate for predicate in wanted if _comparable(current.get(predicate.name)) != _comparable(predicate)]
+
+    def apply(self, with_indexes: bool = True) -> List[PredicateSchema]:
+        """Alters the predicates `diff` reports, all in one operation, and returns them."""
+        changes = self.diff(with_indexes)
+        if changes:
+            logging.info("Altering schema of %s", ", ".join(predicate.name for predicate in changes))
+            self.client.alter(Operation(schema=render_schema(changes)))
+        return changes
+
+    @contextmanager
+    def deferredIndexes(self) -> Iterator[None]:
+        """
+        Drops the deferrable indexes for the duration of a bulk load, so mutations do not update them row by row,
+        then declares them all again in a single alter and Dgraph builds them in one pass. `label` and `xid` stay
+        indexed; eq lookups on the other indexed predicates, reverse edges and counts are unavailable until the block
+        exits, and the predicates concerned are listed in `deferred` meanwhile.
+        """
+        self.apply(with_indexes=False)
+        self.deferred = frozenset(predicate.name for predicate in self.predicates.values()
+                                  if predicate.without_indexes() != predicate)
+        try:
+            yield
+        finally:
+            self.deferred = frozenset()
+            rebuilt = self.apply(with_indexes=True)
+            logging.info("Rebuilt indexes of %s predicates after the bulk load", len(rebuilt))
+
+
+def _from_schema_node(node) -> PredicateSchema:
+    return PredicateSchema(node.predicate, node.type, tuple(node.tokenizer) if node.index else (), node.count,
+                           node.reverse, node.upsert)
+
+
+def _comparable(predicate) -> tuple:
+    if predicate is None:
+        return ()
+    return predicate.type, tuple(sorted(predicate.indexes)), predicate.count, predicate.reverse, predicate.upsert
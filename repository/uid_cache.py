@@ -0,0 +1,46 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Union
+
+
+class UidCache:
+    """
+    Persistent map from a shared node's external id (its blank-node name without the `_:` prefix) to the uid Dgraph
+    assigned to it. Backed by SQLite and mirrored in a dict, so lookups never hit the disk.
+    """
+
+    def __init__(self, path: Union[str, Path] = ":memory:") -> None:
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS uids (xid TEXT PRIMARY KEY, uid TEXT NOT NULL)")
+        self._lock = threading.Lock()
+        self._uids: Dict[str, str] = dict(self._connection.execute("SELECT xid, uid FROM uids"))
+
+    def get(self, xid: str) -> Optional[str]:
+        return self._uids.get(xid)
+
+    def update(self, uids: Mapping[str, str]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO uids (xid, uid) VALUES (?, ?)", uids.items())
+            self._uids.update(uids)
+
+    def replace(self, uids: Mapping[str, str]) -> None:
+        """Makes `uids` the whole content of the cache, in one transaction."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM uids")
+            self._connection.executemany("INSERT INTO uids (xid, uid) VALUES (?, ?)", uids.items())
+            self._uids = dict(uids)
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM uids")
+            self._uids.clear()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __contains__(self, xid: str) -> bool:
+        return xid in self._uids
+
+    def __len__(self) -> int:
+        return len(self._uids)
@@ -0,0 +1,206 @@
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Iterator, Union
+
+import numpy as np
+
+ARRAY_LIMIT = 4096  # values a container keeps as a sorted array, beyond that it switches to a bitmap
+BITMAP_BYTES = 1 << 13  # 65536 bits
+
+# sorted uint16 values, or a 65536-bit bitmap (bit 7 - v % 8 of byte v // 8 is set for value v)
+Container = Union[array, np.ndarray]
+
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.int64)
+
+
+class CompressedBitmap:
+    """
+    Roaring-style set of 32-bit unsigned integers. Values are grouped by their high 16 bits; a group holds its low
+    bits as a sorted uint16 array while it has at most ARRAY_LIMIT values and as an 8 KiB bitmap beyond that, so
+    sparse and dense postings both stay small. `&`, `|` and `-` work a container at a time.
+    """
+
+    __slots__ = ("_containers",)
+
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        self._containers: Dict[int, Container] = {}
+        for value in values:
+            self.add(value)
+
+    @classmethod
+    def from_array(cls, values: np.ndarray) -> "CompressedBitmap":
+        bitmap = cls()
+        values = np.unique(np.asarray(values, dtype=np.uint32))
+        highs = values >> 16
+        bounds = np.flatnonzero(np.diff(highs)) + 1
+        for chunk in np.split(values, bounds):
+            if len(chunk):
+                bitmap._containers[int(chunk[0] >> 16)] = _from_values((chunk & 0xFFFF).astype(np.uint16))
+        return bitmap
+
+    def add(self, value: int) -> None:
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            self._containers[high] = array("H", [low])
+        elif isinstance(container, array):
+            if not container or container[-1] < low:  # appends in increasing order are the common case
+                container.append(low)
+            else:
+                i = bisect_left(container, low)
+                if i < len(container) and container[i] == low:
+                    return
+                container.insert(i, low)
+            if len(container) > ARRAY_LIMIT:
+                self._containers[high] = _to_bitmap(container)
+        else:
+            container[low >> 3] |= 0x80 >> (low & 7)
+
+    def discard(self, value: int) -> None:
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            return
+        if isinstance(container, array):
+            i = bisect_left(container, low)
+            if i < len(container) and container[i] == low:
+                del container[i]
+        else:
+            container[low >> 3] &= ~np.uint8(0x80 >> (low & 7))
+        self._set(high, container)
+
+    def __contains__(self, value: int) -> bool:
+        container = self._containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, array):
+            i = bisect_left(container, low)
+            return i < len(container) and container[i] == low
+        return bool(container[low >> 3] & (0x80 >> (low & 7)))
+
+    def __len__(self) -> int:
+        return sum(_cardinality(container) for container in self._containers.values())
+
+    def __bool__(self) -> bool:
+        return bool(self._containers)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.to_array().tolist())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CompressedBitmap):
+            return NotImplemented
+        return np.array_equal(self.to_array(), other.to_array())
+
+    def __repr__(self) -> str:
+        return f"CompressedBitmap({len(self)} values, {self.size_in_bytes()} bytes)"
+
+    def to_array(self) -> np.ndarray:
+        """All values, sorted, as uint32."""
+        if not self._containers:
+            return np.empty(0, dtype=np.uint32)
+        return np.concatenate([(np.uint32(high) << 16) | _values(self._containers[high]).astype(np.uint32)
+                               for high in sorted(self._containers)])
+
+    def size_in_bytes(self) -> int:
+        return sum(len(container) * 2 if isinstance(container, array) else BITMAP_BYTES
+                   for container in self._containers.values())
+
+    def copy(self) -> "CompressedBitmap":
+        result = CompressedBitmap()
+        result._containers = {high: _copy(container) for high, container in self._containers.items()}
+        return result
+
+    def __and__(self, other: "CompressedBitmap") -> "CompressedBitmap":
+        result = CompressedBitmap()
+        for high in self._containers.keys() & other._containers.keys():
+            result._set(high, _intersect(self._containers[high], other._containers[high]))
+        return result
+
+    def __or__(self, other: "CompressedBitmap") -> "CompressedBitmap":
+        result = CompressedBitmap()
+        for high in self._containers.keys() | other._containers.keys():
+            mine, theirs = self._containers.get(high), other._containers.get(high)
+            if mine is None or theirs is None:
+                result._containers[high] = _copy(mine if theirs is None else theirs)
+            else:
+                result._set(high, _combine(mine, theirs, np.union1d, np.bitwise_or))
+        return result
+
+    def __sub__(self, other: "CompressedBitmap") -> "CompressedBitmap":
+        result = CompressedBitmap()
+        for high, mine in self._containers.items():
+            theirs = other._containers.get(high)
+            if theirs is None:
+                result._containers[high] = _copy(mine)
+            else:
+                result._set(high, _difference(mine, theirs))
+        return result
+
+    def _set(self, high: int, container: Container) -> None:
+        """Stores `container` in its smallest form, or drops the group when it is empty."""
+        if isinstance(container, np.ndarray) and _cardinality(container) <= ARRAY_LIMIT:
+            container = array("H", _values(container).tolist())
+        if len(container) == 0:
+            self._containers.pop(high, None)
+        else:
+            self._containers[high] = container
+
+
+def _values(container: Container) -> np.ndarray:
+    if isinstance(container, array):
+        # a copy, a view would keep the array from growing
+        return np.frombuffer(container, dtype=np.uint16).copy() if container else np.empty(0, dtype=np.uint16)
+    return np.flatnonzero(np.unpackbits(container)).astype(np.uint16)
+
+
+def _to_bitmap(container: Container) -> np.ndarray:
+    if isinstance(container, np.ndarray):
+        return container
+    bits = np.zeros(1 << 16, dtype=bool)
+    bits[_values(container)] = True
+    return np.packbits(bits)
+
+
+def _from_values(values: np.ndarray) -> Container:
+    if len(values) <= ARRAY_LIMIT:
+        return array("H", values.tolist())
+    bits = np.zeros(1 << 16, dtype=bool)
+    bits[values] = True
+    return np.packbits(bits)
+
+
+def _cardinality(container: Container) -> int:
+    return len(container) if isinstance(container, array) else int(_POPCOUNT[container].sum())
+
+
+def _copy(container: Container) -> Container:
+    return array("H", container) if isinstance(container, array) else container.copy()
+
+
+def _contained_in_bitmap(values: np.ndarray, bits: np.ndarray) -> np.ndarray:
+    return (bits[values >> 3] & (0x80 >> (values & 7)).astype(np.uint8)) != 0
+
+
+def _intersect(a: Container, b: Container) -> Container:
+    if isinstance(a, array) and isinstance(b, np.ndarray):
+        values = _values(a)
+        return _from_values(values[_contained_in_bitmap(values, b)])
+    if isinstance(a, np.ndarray) and isinstance(b, array):
+        return _intersect(b, a)
+    return _combine(a, b, lambda x, y: np.intersect1d(x, y, assume_unique=True), np.bitwise_and)
+
+
+def _difference(a: Container, b: Container) -> Container:
+    if isinstance(a, array) and isinstance(b, np.ndarray):
+        values = _values(a)
+        return _from_values(values[~_contained_in_bitmap(values, b)])
+    return _combine(a, b, lambda x, y: np.setdiff1d(x, y, assume_unique=True),
+                    lambda x, y: np.bitwise_and(x, np.invert(y)))
+
+
+def _combine(a: Container, b: Container, array_op: Callable, bitmap_op: Callable) -> Container:
+    if isinstance(a, array) and isinstance(b, array):
+        return _from_values(array_op(_values(a), _values(b)).astype(np.uint16))
+    return bitmap_op(_to_bitmap(a), _to_bitmap(b))
@@ -0,0 +1,114 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models.product_models import FoodProduct
+from search.compressed_bitmap import CompressedBitmap
+
+
+class IngredientIndex:
+    """
+    Inverted index from ingredient name, as the tokenizer normalizes it, to the products that list it. Products are
+    numbered in the order they are added, and postings are compressed bitmaps of those numbers. Adding a product
+    again replaces its previous ingredients.
+    """
+
+    def __init__(self) -> None:
+        self.product_ids: List[Optional[str]] = []
+        self._documents: Dict[str, int] = {}
+        self._document_terms: List[Tuple[str, ...]] = []
+        self._postings: Dict[str, CompressedBitmap] = {}
+        self._live = CompressedBitmap()
+
+    def add(self, product: FoodProduct) -> None:
+        terms = tuple(dict.fromkeys(ingredient.name for ingredient in product.ingredients))
+        document = self._documents.get(product.usda_food_db_id)
+        if document is None:
+            document = self._documents[product.usda_food_db_id] = len(self.product_ids)
+            self.product_ids.append(product.usda_food_db_id)
+            self._document_terms.append(())
+        else:
+            self._unpost(document)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = CompressedBitmap()
+            postings.add(document)
+        self._document_terms[document] = terms
+        self._live.add(document)
+
+    def add_all(self, products: Iterable[FoodProduct]) -> None:
+        for product in products:
+            self.add(product)
+
+    def indexing(self, products: Iterable[FoodProduct]) -> Iterator[FoodProduct]:
+        """Passes `products` through while indexing them, e.g. between the parser and the loader."""
+        for product in products:
+            self.add(product)
+            yield product
+
+    def remove(self, product_id: str) -> None:
+        document = self._documents.pop(product_id, None)
+        if document is None:
+            return
+        self._unpost(document)
+        self._document_terms[document] = ()
+        self.product_ids[document] = None
+        self._live.discard(document)
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._documents
+
+    def ingredients(self) -> List[str]:
+        return sorted(self._postings)
+
+    def postings(self, ingredient: str) -> CompressedBitmap:
+        return self._postings.get(normalize_ingredient(ingredient), CompressedBitmap())
+
+    def document_frequency(self, ingredient: str) -> int:
+        return len(self.postings(ingredient))
+
+    def query(self, all_of: Iterable[str] = (), any_of: Iterable[str] = (), none_of: Iterable[str] = ()) -> List[str]:
+        """
+        Ids of the products that contain every ingredient of `all_of`, at least one of `any_of` (if given) and none
+        of `none_of`, e.g. `query(all_of=["sugar"], none_of=["palm oil"])`. Ids come in the order products were added.
+        """
+        return self.product_ids_of(self.match(all_of, any_of, none_of))
+
+    def match(self, all_of: Iterable[str] = (), any_of: Iterable[str] = (),
+              none_of: Iterable[str] = ()) -> CompressedBitmap:
+        result = self._live
+        for ingredient in sorted(all_of, key=self.document_frequency):  # rarest first keeps intermediates small
+            result = result & self.postings(ingredient)
+        any_of = list(any_of)
+        if any_of:
+            result = result & self._union(any_of)
+        none_of = list(none_of)
+        if none_of:
+            result = result - self._union(none_of)
+        return result.copy() if result is self._live else result
+
+    def product_ids_of(self, documents: CompressedBitmap) -> List[str]:
+        return [self.product_ids[document] for document in documents]
+
+    def size_in_bytes(self) -> int:
+        return sum(postings.size_in_bytes() for postings in self._postings.values())
+
+    def _union(self, ingredients: List[str]) -> CompressedBitmap:
+        result = CompressedBitmap()
+        for ingredient in ingredients:
+            result = result | self.postings(ingredient)
+        return result
+
+    def _unpost(self, document: int) -> None:
+        for term in self._document_terms[document]:
+            postings = self._postings[term]
+            postings.discard(document)
+            if not postings:
+                del self._postings[term]
+
+
+def normalize_ingredient(name: str) -> str:
+    """Query terms are matched the way the tokenizer writes ingredient names: trimmed and lower case."""
+    return name.strip().lower()
@@ -0,0 +1,251 @@
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.nutrient_table import NutrientAmounts
+from models.product_models import FoodProduct
+
+METRICS = ("cosine", "l2")
+BLOCK_ROWS = 1 << 16  # products scored at once, bounds the size of the score matrix
+
+# Amounts are converted to one unit per dimension: masses to grams, energy to kcal. Other units are kept as is.
+UNIT_CONVERSIONS = {
+    "g": ("g", 1.0),
+    "mg": ("g", 1e-3),
+    "µg": ("g", 1e-6),
+    "ug": ("g", 1e-6),
+    "mcg": ("g", 1e-6),
+    "kcal": ("kcal", 1.0),
+    "kj": ("kcal", 1 / 4.184),
+}
+
+# product id, score
+Hit = Tuple[str, float]
+
+
+@dataclass(frozen=True)
+class NutrientColumn:
+    code: str
+    name: str
+    unit: str
+
+
+def normalize_unit(unit: str) -> Tuple[str, float]:
+    """Canonical unit of `unit` and the factor that converts amounts into it."""
+    return UNIT_CONVERSIONS.get(unit.strip().lower(), (unit, 1.0))
+
+
+def normalize_amount(scalar: str, unit: str) -> Tuple[float, str]:
+    canonical_unit, factor = normalize_unit(unit)
+    try:
+        value = float(scalar)
+    except ValueError:
+        value = math.nan
+    return value * factor, canonical_unit
+
+
+class NutrientSearch:
+    """
+    Nutrient profiles of many products as one dense float32 matrix, a row per product and a column per
+    (nutrient code, canonical unit). USDA amounts are per 100 g, so a column ranks products per 100 g directly.
+    Similarity queries compare profiles with every column scaled by its standard deviation, so energy in kcal
+    does not drown out vitamins in grams. Missing nutrients count as 0.
+    """
+
+    def __init__(self, product_ids: Sequence[str], columns: Sequence[NutrientColumn], matrix: np.ndarray) -> None:
+        self.product_ids = list(product_ids)
+        self.columns = list(columns)
+        self.matrix = matrix
+        self._rows = {product_id: i for i, product_id in enumerate(self.product_ids)}
+        self._column_index = {(column.code, column.unit): i for i, column in enumerate(self.columns)}
+        self._scale = matrix.std(axis=0) if len(matrix) else np.ones(len(self.columns), dtype=np.float32)
+        self._scale[self._scale == 0] = 1
+        self._features = (matrix / self._scale).astype(np.float32)
+        self._norms = np.linalg.norm(self._features, axis=1)
+        self._squared_norms = self._norms ** 2
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+
+    @classmethod
+    def from_products(cls, products: Iterable[FoodProduct]) -> "NutrientSearch":
+        product_ids: List[str] = []
+        columns: Dict[Tuple[str, str], int] = {}
+        column_names: Dict[Tuple[str, str], str] = {}
+        rows, cols, values = [], [], []
+        table_units = {}
+        for row, product in enumerate(products):
+            product_ids.append(product.usda_food_db_id)
+            amounts = product.nutrients
+            if isinstance(amounts, NutrientAmounts):
+                codes, product_values, units = _table_amounts(amounts, table_units)
+                names = [amounts.table.nutrient_names[code] for code in codes.tolist()]
+                codes = [str(code) for code in codes.tolist()]
+            else:
+                codes, names, product_values, units = [], [], [], []
+                for nutrient, amount in amounts.items():
+                    value, unit = normalize_amount(amount.scalar, amount.unit)
+                    codes.append(nutrient.code)
+                    names.append(nutrient.name)
+                    product_values.append(value)
+                    units.append(unit)
+            for code, name, unit in zip(codes, names, units):
+                key = (code, unit)
+                if key not in columns:
+                    columns[key] = len(columns)
+                    column_names[key] = name
+                cols.append(columns[key])
+            rows.extend([row] * len(codes))
+            values.append(np.asarray(product_values, dtype=np.float32))
+        matrix = np.zeros((len(product_ids), len(columns)), dtype=np.float32)
+        if rows:
+            matrix[np.array(rows), np.array(cols)] = np.nan_to_num(np.concatenate(values))
+        return cls(product_ids, [NutrientColumn(code, column_names[code, unit], unit) for code, unit in columns],
+                   matrix)
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def vector(self, product_id: str) -> np.ndarray:
+        return self.matrix[self._rows[product_id]]
+
+    def column(self, nutrient_code: str, unit: Optional[str] = None) -> int:
+        if unit is not None:
+            return self._column_index[(nutrient_code, normalize_unit(unit)[0])]
+        for i, column in enumerate(self.columns):
+            if column.code == nutrient_code:
+                return i
+        raise KeyError(nutrient_code)
+
+    def top_by(self, nutrient_code: str, k: int = 10, unit: Optional[str] = None, largest: bool = True) -> List[Hit]:
+        """The `k` products with the most (or least) of a nutrient per 100 g, e.g. `top_by("203")` for protein."""
+        values = self.matrix[:, self.column(nutrient_code, unit)]
+        keys = -values if largest else values
+        top = _smallest(keys, k)
+        return [(self.product_ids[i], float(values[i])) for i in top]
+
+    def nearest(self, product_ids: Sequence[str], k: int = 10, metric: str = "cosine",
+                approximate: bool = False, probes: int = 8) -> List[List[Hit]]:
+        """Batched top-k: the products closest to each of `product_ids`, not counting the product itself."""
+        rows = np.array([self._rows[product_id] for product_id in product_ids], dtype=np.int64)
+        hits = self._search(self._features[rows], k + 1, metric, approximate, probes)
+        return [[hit for hit in product_hits if hit[0] != product_id][:k]
+                for product_id, product_hits in zip(product_ids, hits)]
+
+    def nearest_to_profiles(self, profiles: np.ndarray, k: int = 10, metric: str = "cosine",
+                            approximate: bool = False, probes: int = 8) -> List[List[Hit]]:
+        """Batched top-k for raw profiles laid out like `matrix` rows, e.g. a target diet."""
+        queries = np.atleast_2d(profiles).astype(np.float32) / self._scale
+        return self._search(queries, k, metric, approximate, probes)
+
+    def build_approximate_index(self, lists: Optional[int] = None, iterations: int = 10, seed: int = 0) -> None:
+        """
+        Clusters the profiles with spherical k-means into `lists` inverted lists (default: sqrt of the product count).
+        Approximate queries then only score the products of the `probes` lists closest to the query.
+        """
+        if not len(self):
+            self._centroids, self._lists = np.empty((0, len(self.columns)), dtype=np.float32), []
+            return
+        unit_features = self._unit_features(np.arange(len(self)))
+        lists = max(1, min(len(self), lists or int(math.sqrt(len(self)))))
+        rng = np.random.default_rng(seed)
+        centroids = unit_features[rng.choice(len(self), lists, replace=False)]
+        for _ in range(iterations):
+            order, bounds = _group(self._assign(unit_features, centroids), lists)
+            sizes = np.diff(bounds)
+            sums = np.zeros_like(centroids)
+            sums[sizes > 0] = np.add.reduceat(unit_features[order], bounds[:-1][sizes > 0])
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = np.where(norms > 0, sums / np.where(norms > 0, norms, 1), centroids)
+        order, bounds = _group(self._assign(unit_features, centroids), lists)
+        self._centroids = centroids.astype(np.float32)
+        self._lists = [order[start:stop] for start, stop in zip(bounds, bounds[1:])]
+
+    def _search(self, queries: np.ndarray, k: int, metric: str, approximate: bool, probes: int) -> List[List[Hit]]:
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric}, expected one of {METRICS}")
+        if not approximate:
+            scores, indexes = self._exact(queries, k, metric, None)
+            return [self._hits(query_scores, query_indexes, metric)
+                    for query_scores, query_indexes in zip(scores, indexes)]
+        if self._centroids is None:
+            raise ValueError("Call build_approximate_index() before running approximate queries")
+        query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        centroid_scores = (queries / np.where(query_norms > 0, query_norms, 1)) @ self._centroids.T
+        results = []
+        for query, query_centroid_scores in zip(queries, centroid_scores):
+            probed = _smallest(-query_centroid_scores, probes)
+            candidates = np.concatenate([self._lists[i] for i in probed])
+            scores, indexes = self._exact(query[None, :], k, metric, candidates)
+            results.append(self._hits(scores[0], indexes[0], metric))
+        return results
+
+    def _exact(self, queries: np.ndarray, k: int, metric: str,
+               candidates: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Scores (higher is closer) and row indexes of the best `k` rows for every query, best first."""
+        rows = np.arange(len(self)) if candidates is None else candidates
+        query_norms = np.linalg.norm(queries, axis=1)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_indexes = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            dots = queries @ self._features[block].T
+            if metric == "cosine":
+                scores = dots / np.maximum(np.outer(query_norms, self._norms[block]), 1e-12)
+            else:  # negative squared distance
+                scores = 2 * dots - query_norms[:, None] ** 2 - self._squared_norms[block]
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_indexes = np.concatenate([best_indexes, np.broadcast_to(block, scores.shape)], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_indexes = np.take_along_axis(best_indexes, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_indexes, order, axis=1)
+
+    def _hits(self, scores: np.ndarray, indexes: np.ndarray, metric: str) -> List[Hit]:
+        if metric == "l2":
+            scores = np.sqrt(np.maximum(-scores, 0))
+        return [(self.product_ids[i], float(score)) for i, score in zip(indexes.tolist(), scores.tolist())]
+
+    def _unit_features(self, rows: np.ndarray) -> np.ndarray:
+        norms = self._norms[rows]
+        return self._features[rows] / np.where(norms > 0, norms, 1)[:, None]
+
+    def _assign(self, unit_features: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(unit_features[start:start + BLOCK_ROWS] @ centroids.T, axis=1)
+            for start in range(0, len(unit_features), BLOCK_ROWS)
+        ]) if len(unit_features) else np.empty(0, dtype=np.int64)
+
+
+def _group(assignment: np.ndarray, groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row order that sorts rows by group, and the start of every group in it plus the end."""
+    order = np.argsort(assignment, kind="stable")
+    return order, np.searchsorted(assignment[order], np.arange(groups + 1))
+
+
+def _smallest(keys: np.ndarray, k: int) -> np.ndarray:
+    """Indexes of the `k` smallest keys, smallest first."""
+    k = min(k, len(keys))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(keys, k - 1)[:k]
+    return part[np.argsort(keys[part], kind="stable")]
+
+
+def _table_amounts(
+        amounts: NutrientAmounts, table_units: Dict[int, Tuple[object, np.ndarray, List[str]]]
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """Codes, unit-normalized values and canonical units of a product's rows, straight from the table columns."""
+    table = amounts.table
+    cached = table_units.get(id(table))
+    if cached is None or cached[0] is not table or len(cached[2]) != len(table.units.values):
+        conversions = [normalize_unit(unit) for unit in table.units.values]
+        cached = table_units[id(table)] = (table, np.array([factor for _, factor in conversions], dtype=np.float32),
+                                           [unit for unit, _ in conversions])
+    _, factors, canonical_units = cached
+    unit_codes = table.unit[amounts.start:amounts.stop]
+    values = amounts.values_array() * factors[unit_codes]
+    return amounts.codes_array(), values, [canonical_units[code] for code in unit_codes.tolist()]
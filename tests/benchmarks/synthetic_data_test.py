@@ -0,0 +1,24 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from benchmarks.synthetic_data import generate
+from csv_parser.product_parser import ProductParser
+
+
+class SyntheticDataTest(unittest.TestCase):
+
+    def test_generated_data_is_deterministic_and_parseable(self):
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            generate(Path(first), 50)
+            generate(Path(second), 50)
+
+            for name in ("Products.csv", "Nutrient.csv", "Serving_Size.csv"):
+                self.assertEqual(Path(first, name).read_bytes(), Path(second, name).read_bytes(), name)
+
+            with mock.patch("csv_parser.product_parser.CSV_FILE_RELATIVE_LOCATION", Path(first)):
+                products = ProductParser().parse()
+
+        self.assertEqual(50, len(products))
+        self.assertTrue(all(product.ingredients and product.nutrients for product in products))
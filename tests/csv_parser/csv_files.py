@@ -0,0 +1,19 @@
+import csv
+from pathlib import Path
+
+PRODUCTS_HEADER = ["NDB_Number", "long_name", "data_source", "gtin_upc", "manufacturer", "date_modified",
+                   "date_available", "ingredients_english"]
+NUTRIENTS_HEADER = ["NDB_No", "Nutrient_Code", "Nutrient_name", "Derivation_Code", "Output_value", "Output_uom"]
+
+
+def write_csv(path: Path, header, rows):
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def product_row(product_id: int):
+    return [str(product_id), f"PRODUCT {product_id}", "LI", f"{product_id:012}", f"Maker {product_id % 3}",
+            "Wed Nov 15 19:19:38 GMT 2017", "Wed Nov 15 19:19:38 GMT 2017",
+            f"SUGAR, WATER (FILTERED), SALT AND PEPPER {product_id}."]
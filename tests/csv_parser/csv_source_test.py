@@ -0,0 +1,83 @@
+import gzip
+import shutil
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+from csv_parser.csv_source import ArchiveMember, is_compressed, open_csv, resolve_csv
+from csv_parser.product_parser import ProductParser
+from tests.csv_parser.csv_files import NUTRIENTS_HEADER, PRODUCTS_HEADER, write_csv
+
+FILE_NAMES = ("Products.csv", "Nutrient.csv", "Serving_Size.csv")
+
+
+class CompressedSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        self.extracted = self.root.joinpath("extracted")
+        self.extracted.mkdir()
+        write_csv(self.extracted.joinpath("Products.csv"), PRODUCTS_HEADER, [
+            [str(100 + i), f"PRODUCT {i}", "LI", f"{i:012}", f"Maker {i % 3}", "Wed Nov 15 19:19:38 GMT 2017",
+             "Wed Nov 15 19:19:38 GMT 2017", "SUGAR, SALT" if i % 2 else "WATER"]
+            for i in range(30)
+        ])
+        # out of order, so the compressed input also goes through the external sort
+        write_csv(self.extracted.joinpath("Nutrient.csv"), NUTRIENTS_HEADER, [
+            [str(100 + i), "203", "Protein", "LCCS", str(i), "g"] for i in reversed(range(30))
+        ])
+        write_csv(self.extracted.joinpath("Serving_Size.csv"), ["NDB_No", "Serving_Size"], [["100", "30"]])
+        with mock.patch("csv_parser.product_parser.CSV_FILE_RELATIVE_LOCATION", self.extracted):
+            self.expected = ProductParser().parse()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def parse(self, location: Path, workers: int = 1):
+        with mock.patch("csv_parser.product_parser.CSV_FILE_RELATIVE_LOCATION", location):
+            return ProductParser().parse(workers=workers)
+
+    def zip_download(self, archive: Path) -> Path:
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for name in FILE_NAMES:
+                zip_file.write(self.extracted.joinpath(name), f"usda_2019/{name}")
+        return archive
+
+    def test_products_are_read_from_the_zip(self):
+        archive = self.zip_download(self.root.joinpath("usda.zip"))
+
+        self.assertEqual(ArchiveMember(archive, "usda_2019/Products.csv"), resolve_csv(archive, "Products.csv"))
+        self.assertEqual(self.expected, self.parse(archive))
+        self.assertEqual(self.expected, self.parse(archive, workers=2))
+
+    def test_zip_next_to_a_missing_directory_is_used(self):
+        self.zip_download(self.root.joinpath("download.zip"))
+
+        self.assertEqual(self.expected, self.parse(self.root.joinpath("download")))
+
+    def test_products_are_read_from_gzipped_files(self):
+        gzipped = self.root.joinpath("gzipped")
+        gzipped.mkdir()
+        for name in FILE_NAMES:
+            with open(self.extracted.joinpath(name), "rb") as source, \
+                    gzip.open(gzipped.joinpath(f"{name}.gz"), "wb") as gz:
+                shutil.copyfileobj(source, gz)
+
+        self.assertTrue(is_compressed(resolve_csv(gzipped, "Nutrient.csv")))
+        self.assertEqual(self.expected, self.parse(gzipped))
+        with open_csv(resolve_csv(gzipped, "Serving_Size.csv")) as csvfile:
+            self.assertEqual("NDB_No,Serving_Size\r\n100,30\r\n", csvfile.read())
+
+    def test_point_lookups_need_extracted_files(self):
+        archive = self.zip_download(self.root.joinpath("usda.zip"))
+
+        with mock.patch("csv_parser.product_parser.CSV_FILE_RELATIVE_LOCATION", archive):
+            with self.assertRaises(ValueError):
+                ProductParser().lookup_product("100")
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            resolve_csv(self.root.joinpath("nowhere"), "Products.csv")
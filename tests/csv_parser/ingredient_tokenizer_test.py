@@ -0,0 +1,69 @@
+import logging
+import random
+import unittest
+
+from csv_parser.ingredient_tokenizer import tokenize_ingredients
+from tests.csv_parser.stepwise_memo import process_product_memo_stepwise
+
+MEMOS = [
+    "ICE CREAM INGREDIENTS: MILK, CREAM, SUGAR, STRAWBERRIES (STRAWBERRIES, SUGAR), MONO & DIGLYCERIDES, BEET JUICE AND "
+    "BEET POWDER (FOR COLOR), CELLULOSE GUM, LOCUST BEAN GUM, CARRAGEENAN. COATING INGREDIENTS: SUGAR, WATER, RICE "
+    "FLOUR, TREHALOSE, EGG WHITES, BEET JUICE AND BEET POWDER (FOR COLOR), DUSTED WITH CORN & POTATO STARCH",
+    "item 1 (some text, item 2",
+    "item 1 ,, item 2",
+    "NIACIN,",
+    "DRIED CRANBERRIES ,(SUGAR ,GLYCERIN ,,)CINNAMON ,GROUND FLAX ,SALT ,,",
+    "CORN FLOUR, VEGETABLE OIL, SEA SALT, (IT MAY CONTAIN ONE OF THE FOLLOWING: CORN OIL, PALMOLEIN, SOY)",
+    "GREEN PIGEON PEAS, WATER AND SALT,",
+    "CRUST: (WHEAT FLOUR, WATER, CORN OIL, YEAST, SALT), LOW MOISTURE PART SKIM MOZZARELLA CHEESE: (PASTEURIZED PART "
+    "SKIM MILK, CHEESE CULTURES, SALT, ENZYMES), SAUCE: (TOMATO PUREE, WATER, OREGANO, SALT, BLACK PEPPER).",
+    "*BROWN RICE, WILD CAUGHT** ALASKAN SALMON, *BROCCOLI, WATER",
+    "ORGANIC NATURAL SPICE FLAVORS. XANTHAN GUM,",
+    "PEANUTS, SALT, ",
+    "SUGAR: ",
+    "",
+]
+
+
+def would_hang_stepwise(memo: str) -> bool:
+    """The step-by-step pipeline loops forever when an unmatched "(" follows the last ")" with balanced counts."""
+    text = memo.replace("*", "")
+    return "(" in text and text.count("(") == text.count(")") and text.rfind("(") > text.rfind(")")
+
+
+class IngredientTokenizerTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def assertSameAsStepwise(self, memo):
+        self.assertEqual(process_product_memo_stepwise(memo), list(tokenize_ingredients(memo)), memo)
+
+    def test_known_memos(self):
+        for memo in MEMOS:
+            self.assertSameAsStepwise(memo)
+
+    def test_random_memos(self):
+        rnd = random.Random(0)
+        alphabet = ["a", "b", " ", " ", ",", ".", ":", ": ", "(", ")", "*", " and ", " & ", "X"]
+        checked = 0
+        while checked < 3000:
+            memo = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 25)))
+            if would_hang_stepwise(memo):
+                continue
+            self.assertSameAsStepwise(memo)
+            checked += 1
+
+    def test_unmatched_bracket_after_balancing_close_does_not_hang(self):
+        self.assertEqual((") b",), tokenize_ingredients(") b (c"))
+
+    def test_results_are_cached_on_raw_memo(self):
+        tokenize_ingredients.cache_clear()
+
+        tokenize_ingredients("SUGAR, SALT")
+        tokenize_ingredients("SUGAR, SALT")
+
+        self.assertEqual(1, tokenize_ingredients.cache_info().hits)
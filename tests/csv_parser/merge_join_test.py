@@ -0,0 +1,70 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from csv_parser.merge_join import CsvScan, is_sorted, load_scan, merge_join, read_rows, scan_csv, sorted_csv
+from tests.csv_parser.csv_files import NUTRIENTS_HEADER, write_csv
+
+
+class MergeJoinTest(unittest.TestCase):
+
+    def test_groups_right_rows_by_left_key(self):
+        left = [["1", "a"], ["2", "b"], ["4", "c"]]
+        right = [["0", "x"], ["1", "y"], ["1", "z"], ["3", "w"], ["4", "v"]]
+
+        result = list(merge_join(left, right))
+
+        self.assertEqual([
+            (["1", "a"], [["1", "y"], ["1", "z"]]),
+            (["2", "b"], []),
+            (["4", "c"], [["4", "v"]]),
+        ], result)
+
+    def test_duplicate_left_keys_share_the_group(self):
+        result = list(merge_join([["1", "a"], ["1", "b"]], [["1", "y"]]))
+
+        self.assertEqual([(["1", "a"], [["1", "y"]]), (["1", "b"], [["1", "y"]])], result)
+
+
+class SortedCsvTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).joinpath("Nutrient.csv")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_sorted_file_is_used_in_place(self):
+        write_csv(self.path, NUTRIENTS_HEADER, [["1", "203"], ["2", "203"]])
+
+        with sorted_csv(self.path) as path:
+            self.assertEqual(self.path, path)
+
+    def test_unsorted_file_is_externally_sorted_keeping_row_order_within_key(self):
+        rows = [["30", "a"], ["4", "b"], ["100", "c"], ["4", "d"], ["2", "e"], ["30", "f"], ["1", "g"]]
+        write_csv(self.path, NUTRIENTS_HEADER, rows)
+
+        with sorted_csv(self.path, chunk_rows=2) as path:
+            self.assertNotEqual(self.path, path)
+            self.assertTrue(is_sorted(path))
+            self.assertEqual([["1", "g"], ["2", "e"], ["4", "b"], ["4", "d"], ["30", "a"], ["30", "f"], ["100", "c"]],
+                             list(read_rows(path)))
+
+    def test_scan_finds_rows_spanning_several_lines(self):
+        write_csv(self.path, NUTRIENTS_HEADER, [["1", "203"], ["2", "a\nb"]])
+        self.assertEqual(CsvScan(sorted=True, multiline=True), scan_csv(self.path))
+
+        write_csv(self.path, NUTRIENTS_HEADER, [["2", "203"], ["1", "204"]])
+        self.assertEqual(CsvScan(sorted=False, multiline=False), scan_csv(self.path))
+
+    def test_scan_is_saved_and_reused_until_the_file_changes(self):
+        write_csv(self.path, NUTRIENTS_HEADER, [["1", "203"], ["2", "203"]])
+        self.assertEqual(CsvScan(sorted=True, multiline=False), load_scan(self.path))
+
+        with mock.patch("csv_parser.merge_join.scan_csv", side_effect=AssertionError("file was scanned")):
+            self.assertEqual(CsvScan(sorted=True, multiline=False), load_scan(self.path))
+
+        write_csv(self.path, NUTRIENTS_HEADER, [["2", "203"], ["1", "2040"]])
+        self.assertEqual(CsvScan(sorted=False, multiline=False), load_scan(self.path))
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from csv_parser.merge_join import read_rows
+from csv_parser.offset_index import CsvOffsetIndex, sidecar_path
+from csv_parser.product_parser import ProductParser
+from tests.csv_parser.csv_files import NUTRIENTS_HEADER, PRODUCTS_HEADER, product_row, write_csv
+
+SERVING_SIZES_HEADER = ["NDB_No", "Serving_Size", "Serving_Size_UOM", "Household_Serving_Size",
+                        "Household_Serving_Size_UOM", "Preparation_State"]
+
+
+class CsvOffsetIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.csv_dir = tempfile.TemporaryDirectory()
+        csv_dir = Path(self.csv_dir.name)
+        self.nutrients_path = csv_dir.joinpath("Nutrient.csv")
+        write_csv(self.nutrients_path, NUTRIENTS_HEADER, [
+            ["101", "203", "Protein", "LCCS", "1.5", "g"],
+            ["101", "204", "Total lipid (fat)", "LCCS", "2.5", "g"],
+            ["102", "203", "Protein", "LCCS", "3.5", "g"],
+            ["101", "205", "Carbohydrate, by\ndifference", "LCCS", "4.5", "g"],
+        ])
+        write_csv(csv_dir.joinpath("Products.csv"), PRODUCTS_HEADER,
+                  [product_row(product_id) for product_id in range(100, 110)])
+        write_csv(csv_dir.joinpath("Serving_Size.csv"), SERVING_SIZES_HEADER, [
+            ["101", "28", "g", "1", "ONZ", "LC"],
+            ["102", "30", "g", "2", "PIECES", "LC"],
+        ])
+        self.location = mock.patch("csv_parser.product_parser.CSV_FILE_RELATIVE_LOCATION", csv_dir)
+        self.location.start()
+
+    def tearDown(self):
+        self.location.stop()
+        self.csv_dir.cleanup()
+
+    def test_rows_of_a_key(self):
+        index = CsvOffsetIndex.build(self.nutrients_path)
+
+        self.assertEqual([row for row in read_rows(self.nutrients_path) if row[0] == "101"], index.rows(101))
+        self.assertEqual([["102", "203", "Protein", "LCCS", "3.5", "g"]], index.rows(102))
+        self.assertEqual([], index.rows(103))
+        self.assertEqual(2, len(index))
+        self.assertIn(102, index)
+        self.assertNotIn(103, index)
+
+    def test_sidecar_is_reused_until_the_file_changes(self):
+        CsvOffsetIndex.load(self.nutrients_path)
+        self.assertTrue(sidecar_path(self.nutrients_path).exists())
+
+        with mock.patch.object(CsvOffsetIndex, "build", side_effect=AssertionError("index was rebuilt")):
+            self.assertEqual(3, len(CsvOffsetIndex.load(self.nutrients_path).rows(101)))
+
+        with open(self.nutrients_path, "a") as f:
+            f.write("103,203,Protein,LCCS,5.5,g\n")
+        os.utime(self.nutrients_path, ns=(0, 0))
+        self.assertEqual([["103", "203", "Protein", "LCCS", "5.5", "g"]],
+                         CsvOffsetIndex.load(self.nutrients_path).rows(103))
+
+    def test_lookup_product_matches_full_parse(self):
+        expected = {product.usda_food_db_id: product for product in ProductParser().parse()}
+
+        parser = ProductParser()
+        with mock.patch("csv_parser.product_parser.merge_join", side_effect=AssertionError("files were scanned")):
+            product = parser.lookup_product("101")
+
+        self.assertEqual(expected["101"], product)
+        self.assertEqual(3, len(product.nutrients))
+        self.assertIsNone(parser.lookup_product("999"))
+
+    def test_lookup_serving_sizes(self):
+        self.assertEqual([["102", "30", "g", "2", "PIECES", "LC"]], ProductParser().lookup_serving_sizes("102"))
@@ -1,11 +1,16 @@
+import tempfile
 import unittest
 from datetime import datetime
+from pathlib import Path
+from unittest import mock
 
 from parameterized import parameterized
 from timeout_decorator import timeout_decorator
 
 from csv_parser.product_parser import ProductParser
 from models.product_models import Nutrient, Amount
+from tests.csv_parser.csv_files import NUTRIENTS_HEADER, PRODUCTS_HEADER, write_csv
+from utils.metrics import Metrics
 
 
 class ProductParserTest(unittest.TestCase):
@@ -36,6 +41,82 @@ class ProductParserTest(unittest.TestCase):
         self.assertEqual(Amount("5", scalar='8.3', unit='g'), result[nutrient_2])
         self.assertEqual(Amount("6", scalar='24.6', unit='g'), result[nutrient_3])
 
+    def test_nutrient_rows_differing_in_derivation_code_get_separate_nodes(self):
+        parser = ProductParser()
+
+        calculated, _ = parser._parse_nutrient_row(["1", "203", "Protein", "LCCS", "5.0", "g"])
+        analysed, _ = parser._parse_nutrient_row(["2", "203", "Protein", "LCCD", "5.0", "g"])
+
+        self.assertEqual(("LCCS", "LCCD"), (calculated.derivation_code, analysed.derivation_code))
+        self.assertNotEqual(calculated.uid, analysed.uid)
+
+
+class ProductParserStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.csv_dir = tempfile.TemporaryDirectory()
+        csv_dir = Path(self.csv_dir.name)
+        write_csv(csv_dir.joinpath("Products.csv"), PRODUCTS_HEADER, [
+            ["45001524", "CHOCOLATE BAR", "LI", "000000016872", "Hershey",
+             "Wed Nov 15 19:19:38 GMT 2017", "Wed Nov 15 19:19:38 GMT 2017", "SUGAR, COCOA BUTTER"],
+            ["45001525", "PEANUTS", "GDSN", "000000016873", "Planters",
+             "Thu Nov 16 19:19:38 GMT 2017", "Thu Nov 16 19:19:38 GMT 2017", "PEANUTS, SALT,"],
+        ])
+        write_csv(csv_dir.joinpath("Nutrient.csv"), NUTRIENTS_HEADER, [
+            ["45001525", "203", "Protein", "LCCS", "25.8", "g"],
+            ["45001524", "203", "Protein", "LCCS", "7.5", "g"],
+            ["45001524", "204", "Total lipid (fat)", "LCCS", "30.0", "g"],
+        ])
+        self.location = mock.patch("csv_parser.product_parser.CSV_FILE_RELATIVE_LOCATION", csv_dir)
+        self.location.start()
+
+    def tearDown(self):
+        self.location.stop()
+        self.csv_dir.cleanup()
+
+    def test_parse_iter_yields_products_lazily(self):
+        products = ProductParser().parse_iter()
+
+        first = next(products)
+
+        self.assertEqual("45001524", first.usda_food_db_id)
+        self.assertEqual(["sugar", "cocoa butter"], [ingredient.name for ingredient in first.ingredients])
+        self.assertEqual(["45001525"], [product.usda_food_db_id for product in products])
+
+    def test_nutrients_are_joined_by_product_id(self):
+        products = {product.usda_food_db_id: product for product in ProductParser().parse_iter()}
+
+        self.assertEqual({"Protein": "7.5", "Total lipid (fat)": "30.0"},
+                         {nutrient.name: amount.scalar for nutrient, amount in products["45001524"].nutrients.items()})
+        self.assertEqual({"Protein": "25.8"},
+                         {nutrient.name: amount.scalar for nutrient, amount in products["45001525"].nutrients.items()})
+
+    def test_shared_nodes_are_interned(self):
+        parser = ProductParser()
+        chocolate, peanuts = parser.parse()
+
+        self.assertIs(chocolate.nutrients.table.registry, parser.registry)
+        self.assertIs(next(iter(chocolate.nutrients)), next(iter(peanuts.nutrients)))
+        self.assertIs(parser._process_product_memo("SALT")[0], parser._process_product_memo("SUGAR, SALT")[1])
+
+    def test_csv_location_overrides_the_default(self):
+        with mock.patch("csv_parser.product_parser.CSV_FILE_RELATIVE_LOCATION", Path(self.csv_dir.name, "missing")):
+            products = list(ProductParser(Path(self.csv_dir.name)).parse_iter())
+
+        self.assertEqual(["45001524", "45001525"], [product.usda_food_db_id for product in products])
+
+    def test_parse_matches_parse_iter(self):
+        self.assertEqual(list(ProductParser().parse_iter()), list(ProductParser().parse()))
+
+    def test_stages_are_recorded_when_metrics_are_enabled(self):
+        metrics = Metrics(enabled=True)
+        with mock.patch("csv_parser.product_parser.METRICS", metrics):
+            ProductParser().parse()
+
+        self.assertEqual(2, metrics.counters["parse.products"])
+        self.assertEqual({"parse.build", "parse.csv_read", "parse.datetime", "parse.memo", "parse.nutrients"},
+                         set(metrics.stages))
+
 
 class ProductMemoTest(unittest.TestCase):
 
@@ -47,67 +128,45 @@ class ProductMemoTest(unittest.TestCase):
                           "trehalose", "egg whites", "beet juice and beet powder", "dusted with corn", "potato starch"],
                          list(map(lambda ingredient: ingredient.name, result)))
 
-    def test_trailing_comma_removed(self):
-        result = ProductParser()._preprocess_product_memo(
-            "PEANUTS, SALT,")
+    def ingredient_names(self, memo):
+        return [ingredient.name for ingredient in ProductParser()._process_product_memo(memo)]
 
-        self.assertEqual("peanuts, salt", result)
+    def test_trailing_comma_removed(self):
+        self.assertEqual(["peanuts", "salt"], self.ingredient_names("PEANUTS, SALT,"))
 
     def test_all_brackets_data_is_removed(self):
-        result = ProductParser()._preprocess_product_memo(
-            "item 1 (some), (anti) item 2, item 3 (hope, beauty, honor), item 4.")
+        result = self.ingredient_names("item 1 (some), (anti) item 2, item 3 (hope, beauty, honor), item 4.")
 
-        self.assertRegex(result, "item 1( ?)*,( ?)*item 2, item 3( ?)*, item 4.")
+        self.assertEqual(["item 1", "item 2", "item 3", "item 4"], result)
 
     def test_stars_removed(self):
-        result = ProductParser()._preprocess_product_memo("*item 1**, **item 2****, item 3***")
-
-        self.assertEqual("item 1, item 2, item 3", result)
+        self.assertEqual(["item 1", "item 2", "item 3"], self.ingredient_names("*item 1**, **item 2****, item 3***"))
 
     def test_last_item_is_split_to_two_for_and_keyword(self):
-        result = ProductParser()._ingredient_split_last_items_ending_with_keyword_other_than_comma(
-            ["item 0", "item 1 and item 2"])
-
-        self.assertEqual(["item 0", "item 1", "item 2"], result)
+        self.assertEqual(["item 0", "item 1", "item 2"], self.ingredient_names("item 0, item 1 and item 2"))
 
     def test_last_item_is_split_to_two_for_ampersand_keyword(self):
-        result = ProductParser()._ingredient_split_last_items_ending_with_keyword_other_than_comma(
-            ["item 0", "item 1 & item 2"])
-
-        self.assertEqual(["item 0", "item 1", "item 2"], result)
+        self.assertEqual(["item 0", "item 1", "item 2"], self.ingredient_names("item 0, item 1 & item 2"))
 
     def test_remove_middle_level_captions(self):
-        result = ProductParser()._ingredient_remove_middle_captions(
-            ["Caption 1: item 0", "item 1", "item 2. Caption 2: item 3", "item 4"])
+        result = self.ingredient_names("Caption 1: item 0, item 1, item 2. Caption 2: item 3, item 4")
 
         self.assertEqual(["item 0", "item 1", "item 2", "item 3", "item 4"], result)
 
     def test_remove_middle_level_captions_only_one_element_after_caption(self):
-        result = ProductParser()._ingredient_remove_middle_captions(
-            ["Caption 1: item 0."])
-
-        self.assertEqual(["item 0"], result)
+        self.assertEqual(["item 0"], self.ingredient_names("Caption 1: item 0."))
 
     def test_remove_trailing_dots(self):
-        result = ProductParser()._ingredient_remove_last_item_trailing_dot(
-            ["item 1", "item 2."])
-
-        self.assertEqual(["item 1", "item 2"], result)
+        self.assertEqual(["item 1", "item 2"], self.ingredient_names("item 1, item 2."))
 
     def test_lowercase(self):
-        result = ProductParser()._preprocess_product_memo("ITEM 1")
-
-        self.assertEqual("item 1", result)
+        self.assertEqual(["item 1"], self.ingredient_names("ITEM 1"))
 
     def test_split_items(self):
-        result = ProductParser()._split_product_memo_to_items("item 1, item 2, item 3")
-
-        self.assertEqual(["item 1", "item 2", "item 3"], result)
+        self.assertEqual(["item 1", "item 2", "item 3"], self.ingredient_names("item 1, item 2, item 3"))
 
     def test_empty_items_get_removed(self):
-        result = ProductParser()._ingredient_remove_empty_strings(["item 1", "", "item 3"])
-
-        self.assertEqual(["item 1", "item 3"], result)
+        self.assertEqual(["item 1", "item 3"], self.ingredient_names("item 1, , item 3"))
 
 
 # failure cases atm:
@@ -145,6 +204,17 @@ class ProductMemoTest(unittest.TestCase):
 # "RICE NOODLES (RICE FLOUR, WATER), SEASONING PACKET: (SUGAR, SALT, MALTODEXTRIN, SOY SAUCE POWDER [SOYBEAN, SALT, WHEAT], GARLIC POWDER, MUSHROOM POWDER, SPRING ONION FLAKES, ARTIFICIAL MUSHROOM FLAVOR, WHITE PEPPER, YEAST EXTRACT, CARAMEL COLOR), OIL PACKET: (RICE BRAN OIL), VEGETABLE PACKET: (DRIED MUSHROOM FLAKE)."
 
 
+class ProductMemoGuardTest(unittest.TestCase):
+
+    def test_malformed_memo_costs_only_its_ingredients(self):
+        with mock.patch("csv_parser.product_parser.tokenize_ingredients", side_effect=ValueError("bad memo")), \
+                self.assertLogs(level="WARNING") as logs:
+            result = ProductParser()._process_product_memo("SUGAR (")
+
+        self.assertEqual([], result)
+        self.assertIn("Failed to parse ingredients", logs.output[0])
+
+
 class ProductMemoDataDrivenTest(unittest.TestCase):
 
     @parameterized.expand([
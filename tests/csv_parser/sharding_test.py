@@ -0,0 +1,79 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from csv_parser.merge_join import read_rows
+from csv_parser.product_parser import ProductParser
+from csv_parser.sharding import find_key_offset, plan_shards, read_range_rows, row_aligned_ranges
+from tests.csv_parser.csv_files import NUTRIENTS_HEADER, PRODUCTS_HEADER, product_row, write_csv
+
+
+class ShardingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.csv_dir = tempfile.TemporaryDirectory()
+        self.products_path = Path(self.csv_dir.name).joinpath("Products.csv")
+        self.nutrients_path = Path(self.csv_dir.name).joinpath("Nutrient.csv")
+        write_csv(self.products_path, PRODUCTS_HEADER, [product_row(product_id) for product_id in range(100, 150)])
+        write_csv(self.nutrients_path, NUTRIENTS_HEADER, [
+            [str(product_id), code, f"Nutrient {code}", "LCCS", f"{product_id / 10}", "g"]
+            for product_id in range(95, 155, 2) for code in ("203", "204")
+        ])
+
+    def tearDown(self):
+        self.csv_dir.cleanup()
+
+    def test_ranges_cover_every_row_exactly_once(self):
+        ranges = row_aligned_ranges(self.products_path, 7)
+
+        rows = [row for byte_range in ranges for row in read_range_rows(self.products_path, byte_range)]
+
+        self.assertEqual(7, len(ranges))
+        self.assertEqual(list(read_rows(self.products_path)), rows)
+
+    def test_more_shards_than_rows(self):
+        ranges = row_aligned_ranges(self.products_path, 500)
+
+        rows = [row for byte_range in ranges for row in read_range_rows(self.products_path, byte_range)]
+
+        self.assertEqual(50, len(rows))
+
+    def test_find_key_offset(self):
+        with open(self.nutrients_path, "rb") as f:
+            f.readline()
+            start = f.tell()
+            size = self.nutrients_path.stat().st_size
+
+            for key_value, expected_key in [(0, "95"), (95, "95"), (96, "97"), (97, "97"), (153, "153")]:
+                f.seek(find_key_offset(f, key_value, start, size))
+                self.assertEqual(expected_key, f.readline().decode().split(",")[0])
+            self.assertEqual(size, find_key_offset(f, 1000, start, size))
+
+    def test_shards_pair_products_with_their_nutrient_rows(self):
+        for shard in plan_shards(self.products_path, self.nutrients_path, 4):
+            product_ids = {int(row[0]) for row in read_range_rows(self.products_path, shard.products)}
+            nutrient_ids = {int(row[0]) for row in read_range_rows(self.nutrients_path, shard.nutrients)}
+            self.assertTrue({i for i in nutrient_ids if 100 <= i < 150} <= product_ids)
+            self.assertTrue(all(i >= min(product_ids) for i in nutrient_ids if i >= 100))
+
+    def test_parallel_parse_is_identical_to_serial(self):
+        with mock.patch("csv_parser.product_parser.CSV_FILE_RELATIVE_LOCATION", Path(self.csv_dir.name)):
+            serial = ProductParser().parse()
+            parallel = ProductParser().parse(workers=3)
+
+        self.assertEqual(50, len(serial))
+        self.assertEqual(serial, parallel)
+
+    def test_parallel_parse_of_memos_with_line_breaks_is_identical_to_serial(self):
+        rows = [product_row(product_id) for product_id in range(100, 150)]
+        for row in rows[::3]:
+            row[7] = row[7].replace(", ", ",\n")
+        write_csv(self.products_path, PRODUCTS_HEADER, rows)
+
+        with mock.patch("csv_parser.product_parser.CSV_FILE_RELATIVE_LOCATION", Path(self.csv_dir.name)):
+            serial = ProductParser().parse()
+            parallel = ProductParser().parse(workers=4)
+
+        self.assertEqual(50, len(serial))
+        self.assertEqual(serial, parallel)
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from csv_parser.product_parser import ProductParser
+from csv_parser.snapshot import ProductSnapshot, source_fingerprint
+from tests.csv_parser.csv_files import NUTRIENTS_HEADER, PRODUCTS_HEADER, product_row, write_csv
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.csv_dir = tempfile.TemporaryDirectory()
+        self.snapshot_dir = tempfile.TemporaryDirectory()
+        csv_dir = Path(self.csv_dir.name)
+        self.products_path = csv_dir.joinpath("Products.csv")
+        self.nutrients_path = csv_dir.joinpath("Nutrient.csv")
+        write_csv(self.products_path, PRODUCTS_HEADER, [product_row(product_id) for product_id in range(100, 130)])
+        write_csv(self.nutrients_path, NUTRIENTS_HEADER, [
+            [str(product_id), code, f"Nutrient {code}", "LCCS" if code == "203" else "LCSL", f"{product_id / 10}",
+             "g" if code == "203" else "mg"]
+            for product_id in range(100, 130, 2) for code in ("203", "204")
+        ])
+        self.location = mock.patch("csv_parser.product_parser.CSV_FILE_RELATIVE_LOCATION", csv_dir)
+        self.location.start()
+
+    def tearDown(self):
+        self.location.stop()
+        self.csv_dir.cleanup()
+        self.snapshot_dir.cleanup()
+
+    def snapshots(self):
+        return sorted(path.name for path in Path(self.snapshot_dir.name).iterdir())
+
+    def test_snapshot_round_trip(self):
+        expected = ProductParser().parse()
+
+        written = ProductParser().parse(snapshot_dir=self.snapshot_dir.name)
+        with mock.patch.object(ProductParser, "_parse_csv", side_effect=AssertionError("CSVs were read")):
+            parser = ProductParser()
+            loaded = parser.parse(snapshot_dir=self.snapshot_dir.name)
+
+        self.assertEqual(expected, written)
+        self.assertEqual(expected, loaded)
+        self.assertEqual([source_fingerprint([self.products_path, self.nutrients_path])], self.snapshots())
+        self.assertIs(loaded[0].source, loaded[1].source)
+        self.assertIsInstance(loaded[0].nutrients.values_array(), np.memmap)
+        self.assertEqual(["102", "104"], loaded[0].nutrients.table.product_ids_where(203, 10.15, 10.45))
+
+    def test_changed_source_replaces_snapshot(self):
+        ProductParser().parse(snapshot_dir=self.snapshot_dir.name)
+        old = self.snapshots()
+        write_csv(self.products_path, PRODUCTS_HEADER, [product_row(product_id) for product_id in range(100, 110)])
+        os.utime(self.products_path, ns=(0, 0))
+
+        products = ProductParser().parse(snapshot_dir=self.snapshot_dir.name)
+
+        self.assertEqual(10, len(products))
+        self.assertEqual(1, len(self.snapshots()))
+        self.assertNotEqual(old, self.snapshots())
+        self.assertEqual(10, len(ProductSnapshot(Path(self.snapshot_dir.name).joinpath(self.snapshots()[0]))))
+
+    def test_only_stale_snapshots_are_removed(self):
+        snapshot_dir = Path(self.snapshot_dir.name)
+        unrelated = snapshot_dir.joinpath("notes")
+        unrelated.mkdir()
+        unrelated.joinpath("meta.json").write_text("{}")
+        dead_writer = snapshot_dir.joinpath("0123456789abcdef.tmp-999999999")
+        dead_writer.mkdir()
+        newer = snapshot_dir.joinpath("fedcba9876543210")
+        newer.mkdir()
+        newer.joinpath("meta.json").write_text("{}")
+        os.utime(newer.joinpath("meta.json"), ns=(1 << 62, 1 << 62))
+        older = snapshot_dir.joinpath("00000000000000aa")
+        older.mkdir()
+        older.joinpath("meta.json").write_text("{}")
+        os.utime(older.joinpath("meta.json"), ns=(0, 0))
+
+        ProductParser().parse(snapshot_dir=self.snapshot_dir.name)
+
+        self.assertEqual(sorted([source_fingerprint([self.products_path, self.nutrients_path]), "fedcba9876543210",
+                                 "notes"]), self.snapshots())
+
+    def test_abandoned_parse_leaves_no_snapshot(self):
+        products = ProductParser().parse_iter(snapshot_dir=self.snapshot_dir.name)
+        next(products)
+
+        products.close()
+
+        self.assertEqual([], self.snapshots())
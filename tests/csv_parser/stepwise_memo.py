@@ -0,0 +1,106 @@
+"""
+The original preprocess -> split -> postprocess ingredient memo pipeline, kept only as the reference that
+ingredient_tokenizer_test checks csv_parser.ingredient_tokenizer.tokenize_ingredients against.
+"""
+from typing import List
+
+
+def process_product_memo_stepwise(text: str) -> List[str]:
+    try:
+        preprocessed = _preprocess_product_memo(text)
+        items = _split_product_memo_to_items(preprocessed)
+        return _postprocess_product_memo(items)
+    except IndexError:  # the original pipeline gave up on memos that end up empty
+        return []
+
+
+def _preprocess_product_memo(text: str) -> str:
+
+    def remove_stars(text):
+        return text.replace("*", "")
+
+    def remove_text_in_brackets(text):
+        if text.find("(") == -1:
+            return text
+
+        def handle_unclosed_brackets(text):
+            if text.count("(") != text.count(")"):
+                return text.replace("(", ",").replace(")", "")
+            return text
+
+        text = handle_unclosed_brackets(text)
+
+        modified_memo = ""
+        while text.find("(") != -1:
+            next_bracket_open = text.find("(")
+            modified_memo += text[0:next_bracket_open]
+            text = text[text.find(")", next_bracket_open) + 1:]
+        modified_memo += text
+        return modified_memo
+
+    text = remove_stars(text)
+    text = remove_text_in_brackets(text)
+    text = text.rstrip(",")
+    return text.lower()
+
+
+def _split_product_memo_to_items(text: str) -> List[str]:
+    return [item.strip() for item in text.split(",")]
+
+
+def _postprocess_product_memo(items: List[str]) -> List[str]:
+    items = _split_last_items_ending_with_keyword_other_than_comma(items)
+    items = _remove_middle_captions(items)
+    items = _remove_last_item_trailing_dot(items)
+    items = _remove_invalid(items)
+    return _remove_empty_strings(items)
+
+
+def _split_last_items_ending_with_keyword_other_than_comma(items: List[str]) -> List[str]:
+    for separator in [" and ", " & "]:
+        if separator in items[-1]:
+            last_item = items.pop()
+            split_last_item = last_item.split(separator)
+            items += split_last_item
+            return items
+
+    return items
+
+
+def _remove_last_item_trailing_dot(items: List[str]) -> List[str]:
+    if items[-1][-1] == ".":
+        last_item = items.pop()
+        items.append(last_item[:-1])
+        return items
+
+    return items
+
+
+def _remove_middle_captions(items: List[str]) -> List[str]:
+    captions_indices = []
+
+    for i, item in enumerate(items):
+        if ":" in item:
+            captions_indices.append(i)
+
+    for captions_index in captions_indices[::-1]:  # reverse to be able to insert in right order
+        item = items.pop(captions_index)
+        if item[-1] == ".":  # remove trailing dot, eg for captions that have last element
+            item = item[:-1]
+        for item in item.split(".")[::-1]:  # reverse to be able to insert in right order
+            if item.find(": ") != -1:
+                new_item = item[item.index(": ") + 2:]
+            else:
+                new_item = item
+
+            items.insert(captions_index, new_item)
+
+    return items
+
+
+def _remove_invalid(items):
+    return filter(lambda item: len(item) != 0, items)
+
+
+def _remove_empty_strings(items):
+    return list(filter(lambda x: x != "", items))
@@ -0,0 +1,41 @@
+import unittest
+
+from models.node_registry import NodeRegistry
+from models.product_models import Ingredient, Manufacturer
+
+
+class NodeRegistryTest(unittest.TestCase):
+
+    def test_same_uid_returns_shared_instance(self):
+        registry = NodeRegistry()
+
+        first = registry.get(Ingredient, "_:ingredient_sugar", "sugar")
+        second = registry.get(Ingredient, "_:ingredient_sugar", "sugar")
+        other = registry.get(Manufacturer, "_:manufacturer_Hershey", "Hershey")
+
+        self.assertIs(first, second)
+        self.assertEqual(Manufacturer("_:manufacturer_Hershey", "Hershey"), other)
+        self.assertEqual({"nodes": 2, "hits": 1, "misses": 2, "evictions": 0}, registry.stats())
+
+    def test_least_recently_used_nodes_are_evicted(self):
+        registry = NodeRegistry(max_nodes=2)
+        sugar = registry.get(Ingredient, "_:ingredient_sugar", "sugar")
+        registry.get(Ingredient, "_:ingredient_salt", "salt")
+        registry.get(Ingredient, "_:ingredient_sugar", "sugar")
+
+        registry.get(Ingredient, "_:ingredient_water", "water")
+
+        self.assertEqual(2, len(registry))
+        self.assertNotIn("_:ingredient_salt", registry)
+        self.assertIs(sugar, registry.get(Ingredient, "_:ingredient_sugar", "sugar"))
+        self.assertEqual(Ingredient("_:ingredient_salt", "salt"), registry.get(Ingredient, "_:ingredient_salt", "salt"))
+        self.assertEqual(2, registry.stats()["evictions"])
+
+    def test_clear(self):
+        registry = NodeRegistry()
+        registry.get(Ingredient, "_:ingredient_sugar", "sugar")
+
+        registry.clear()
+
+        self.assertNotIn("_:ingredient_sugar", registry)
+        self.assertEqual({"nodes": 0, "hits": 0, "misses": 0, "evictions": 0}, registry.stats())
@@ -0,0 +1,56 @@
+import math
+import unittest
+
+from models.nutrient_table import NutrientTable
+from models.product_models import Amount, Nutrient
+
+
+class NutrientTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = NutrientTable(capacity=2)
+        self.chocolate = self.table.append("45001524", [
+            ("203", "Protein", "LCCS", "7.5", "g"),
+            ("204", "Total lipid (fat)", "LCCS", "30.0", "g"),
+            ("307", "Sodium, Na", "LCCD", "45", "mg"),
+        ])
+        self.peanuts = self.table.append("45001525", [("203", "Protein", "LCCS", "25.8", "g")])
+        self.water = self.table.append("45001526", [])
+
+    def test_view_behaves_like_nutrient_amount_dict(self):
+        protein = Nutrient("_:nutrient_Protein_203_LCCS", "Protein", "203", "LCCS")
+
+        self.assertEqual(3, len(self.chocolate))
+        self.assertEqual(Amount("_:amount_7.5_g", "7.5", "g"), self.chocolate[protein])
+        self.assertEqual({protein: Amount("_:amount_25.8_g", "25.8", "g")}, dict(self.peanuts))
+        self.assertEqual({}, self.water)
+        self.assertEqual(["g", "g", "mg"], self.chocolate.units())
+
+    def test_names_and_categories_are_stored_once(self):
+        self.assertEqual({203: "Protein", 204: "Total lipid (fat)", 307: "Sodium, Na"}, self.table.nutrient_names)
+        self.assertEqual(["g", "mg"], self.table.units.values)
+        self.assertEqual(4, self.table.size)
+
+    def test_vectorized_filter(self):
+        self.assertEqual(["45001525"], self.table.product_ids_where(203, min_value=10))
+        self.assertEqual(["45001524", "45001525"], self.table.product_ids_where(203))
+        self.assertEqual([], self.table.product_ids_where(999))
+
+    def test_nutrients_differing_in_derivation_code_are_separate_nodes(self):
+        calculated = self.table.append("1", [("203", "Protein", "LCCS", "5.0", "g")])
+        analysed = self.table.append("2", [("203", "Protein", "LCCD", "5.0", "g")])
+
+        (calculated_protein,), (analysed_protein,) = list(calculated), list(analysed)
+        self.assertEqual(("LCCS", "LCCD"), (calculated_protein.derivation_code, analysed_protein.derivation_code))
+        self.assertNotEqual(calculated_protein.uid, analysed_protein.uid)
+
+    def test_unparseable_value_is_nan(self):
+        amounts = self.table.append("45001527", [("203", "Protein", "LCCS", "", "g")])
+
+        self.assertTrue(math.isnan(amounts.values_array()[0]))
+
+    def test_more_units_than_the_code_column_holds_is_an_error(self):
+        self.table.units.max_codes = 2
+
+        with self.assertRaises(OverflowError):
+            self.table.append("45001527", [("203", "Protein", "LCCS", "1.0", "kcal")])
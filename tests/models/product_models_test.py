@@ -0,0 +1,28 @@
+import dataclasses
+import pickle
+import unittest
+
+from models.product_models import Ingredient, Manufacturer, Nutrient
+
+
+class ProductModelsTest(unittest.TestCase):
+
+    def test_label_is_a_class_attribute(self):
+        ingredient = Ingredient("_:ingredient_sugar", "sugar")
+
+        self.assertEqual("ingredient", ingredient.label)
+        self.assertEqual("company", Manufacturer.label)
+        self.assertIsInstance(ingredient, Ingredient)
+        self.assertNotIn("label", [field.name for field in dataclasses.fields(ingredient)])
+
+    def test_models_are_slotted_and_shared_nodes_frozen(self):
+        ingredient = Ingredient("_:ingredient_sugar", "sugar")
+
+        self.assertFalse(hasattr(ingredient, "__dict__"))
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            ingredient.name = "salt"
+
+    def test_pickle_round_trip(self):
+        nutrient = Nutrient("_:nutrient_Protein", "Protein", "203", "LCCS")
+
+        self.assertEqual(nutrient, pickle.loads(pickle.dumps(nutrient)))
@@ -0,0 +1,100 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from pydgraph import AbortedError
+
+from repository.async_product_repository import AlphaPool, AsyncProductRepository
+from repository.uid_cache import UidCache
+from tests.repository.fake_dgraph_server import FakeAlpha, max_concurrent_calls, start_fake_alpha
+from tests.repository.factories import products
+
+
+class AsyncProductRepositoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.alphas = [FakeAlpha("alpha1", delay=0.02), FakeAlpha("alpha2", delay=0.02)]
+        self.servers, self.endpoints = zip(*(start_fake_alpha(alpha) for alpha in self.alphas))
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop(None)
+
+    def repository(self, **options) -> AsyncProductRepository:
+        return AsyncProductRepository(AlphaPool(self.endpoints), **options)
+
+    def test_batches_are_spread_across_alphas(self):
+        async def load():
+            async with self.repository(max_in_flight_mutations=4) as repo:
+                return await repo.bulkAddProducts(products(40), batch_size=5)
+
+        report = asyncio.run(load())
+
+        self.assertEqual((40, 8, 0), (report.products, report.batches, report.retries))
+        self.assertEqual([4, 4], [len(alpha.mutations) for alpha in self.alphas])
+        self.assertEqual([4, 4], [alpha.commits for alpha in self.alphas])
+        self.assertEqual(40, sum(len(nodes) for alpha in self.alphas for nodes in alpha.mutations))
+
+    def test_in_flight_mutations_are_capped(self):
+        for alpha in self.alphas:
+            alpha.delay = 0.1  # long enough for every slot to be taken at once
+
+        async def load():
+            async with self.repository(max_in_flight_mutations=3) as repo:
+                await asyncio.gather(*(repo.addProducts(products(1)) for _ in range(12)))
+
+        asyncio.run(load())
+
+        self.assertEqual(3, max_concurrent_calls(self.alphas))
+        self.assertEqual(12, sum(alpha.commits for alpha in self.alphas))
+
+    def test_repository_created_outside_a_loop_works_in_several(self):
+        repo = self.repository(max_in_flight_mutations=2)
+
+        async def load():
+            await asyncio.gather(*(repo.addProducts(products(1)) for _ in range(4)))
+
+        try:
+            asyncio.run(load())
+            asyncio.run(load())
+        finally:
+            repo.close()
+
+        self.assertEqual(8, sum(alpha.commits for alpha in self.alphas))
+
+    def test_concurrent_queries(self):
+        async def query_all():
+            async with self.repository(max_in_flight_queries=2) as repo:
+                return await asyncio.gather(*(repo.query("{ alpha(func: has(name)) { name } }") for _ in range(6)))
+
+        results = asyncio.run(query_all())
+
+        self.assertEqual({"alpha1", "alpha2"}, {result["alpha"][0]["name"] for result in results})
+        self.assertEqual([3, 3], [len(alpha.queries) for alpha in self.alphas])
+        self.assertLessEqual(max_concurrent_calls(self.alphas), 2)
+
+    def test_shared_nodes_are_created_once(self):
+        uid_cache = UidCache()
+
+        async def load():
+            async with self.repository(uid_cache=uid_cache) as repo:
+                await repo.bulkAddProducts(products(6), batch_size=2)
+
+        asyncio.run(load())
+
+        mutations = [nodes for alpha in self.alphas for nodes in alpha.mutations]
+        self.assertEqual(1, sum(1 for nodes in mutations for node in nodes if node.get("xid") == "source_LI"))
+        self.assertIn("manufacturer_Hershey", uid_cache)
+
+    def test_aborted_mutation_is_retried(self):
+        async def load():
+            async with self.repository() as repo:
+                return await repo.bulkAddProducts(products(5), batch_size=5, backoff_seconds=0)
+
+        real = "repository.async_product_repository._mutate_and_commit"
+        with mock.patch(real, side_effect=[AbortedError(), mock.DEFAULT]) as mutate:
+            mutate.return_value = mock.Mock(uids={})
+            report = asyncio.run(load())
+
+        self.assertEqual((5, 1), (report.products, report.retries))
+        self.assertEqual(2, mutate.call_count)
@@ -0,0 +1,63 @@
+import gzip
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from models.product_models import Amount, Ingredient, Nutrient
+from repository.bulk_export import export_bulk, nquads
+from repository.product_repository import SCHEMA
+from tests.repository.factories import product
+
+
+class BulkExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self.output.name)
+        cocoa_butter = Ingredient("_:ingredient_cocoa butter", "cocoa butter")
+        protein = Nutrient("_:nutrient_Protein", "Protein", "203", "LCCS")
+        self.products = [
+            product(str(barcode), [cocoa_butter], {protein: Amount(f"_:amount_{barcode}_g", f"{barcode}.5", "g")})
+            for barcode in range(1, 21)
+        ]
+
+    def tearDown(self):
+        self.output.cleanup()
+
+    def test_rdf_export(self):
+        report = export_bulk(self.products, self.output_dir, "rdf", shard_bytes=1000)
+
+        quads = [line for path in report.files for line in gzip.open(path, "rt", encoding="utf8")]
+        self.assertEqual(20, report.products)
+        self.assertGreater(len(report.files), 1)
+        self.assertEqual(SCHEMA.lstrip(), report.schema.read_text())
+        self.assertIn('_:1 <name> "name 1" .\n', quads)
+        self.assertIn("_:1 <ingredients> _:ingredient_cocoa-20butter .\n", quads)
+        self.assertIn('_:20 <nutrients> _:nutrient_Protein (amount=20.5, unit="g") .\n', quads)
+        self.assertEqual(1, quads.count('_:ingredient_cocoa-20butter <name> "cocoa butter" .\n'))
+        self.assertEqual(1, quads.count('_:nutrient_Protein <xid> "nutrient_Protein" .\n'))
+
+    def test_json_export_shards_are_valid_json(self):
+        report = export_bulk(self.products, self.output_dir, "json", shard_bytes=1000)
+
+        nodes = [node for path in report.files for node in json.load(gzip.open(path, "rt", encoding="utf8"))]
+        self.assertEqual([f"_:{barcode}" for barcode in range(1, 21)], [node["uid"] for node in nodes])
+        self.assertEqual("cocoa butter", nodes[0]["ingredients"][0]["name"])
+        self.assertEqual([{"uid": "_:ingredient_cocoa butter"}], nodes[1]["ingredients"])
+
+    def test_stale_shards_are_removed(self):
+        export_bulk(self.products, self.output_dir, "rdf", shard_bytes=1000)
+
+        report = export_bulk(self.products[:1], self.output_dir, "rdf", shard_bytes=1000)
+
+        self.assertEqual(report.files, sorted(self.output_dir.glob("products-*")))
+
+    def test_literals_are_escaped(self):
+        quads = list(nquads({"uid": "0x1", "name": 'say "hi"\n'}))
+
+        self.assertEqual(['<0x1> <name> "say \\"hi\\"\\n" .\n'], quads)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            export_bulk(self.products, self.output_dir, "csv")
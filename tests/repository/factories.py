@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from models.product_models import FoodProduct, InformationSource, Manufacturer
+
+
+def product(barcode: str, ingredients, nutrients) -> FoodProduct:
+    return FoodProduct(f"_:{barcode}", f"id_{barcode}", f"name {barcode}", InformationSource("_:source_LI", "LI"),
+                       barcode, Manufacturer("_:manufacturer_Hershey", "Hershey"), datetime(2017, 11, 15, 19, 19, 38),
+                       datetime(2017, 11, 16), ingredients, nutrients)
+
+
+def products(count: int):
+    for i in range(count):
+        yield FoodProduct(f"_:{i}", str(i), f"product {i}", InformationSource("_:source_LI", "LI"), str(i),
+                          Manufacturer("_:manufacturer_Hershey", "Hershey"), datetime(2017, 11, 15),
+                          datetime(2017, 11, 15), [], {})
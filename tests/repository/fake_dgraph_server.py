@@ -0,0 +1,86 @@
+import json
+import threading
+import time
+from concurrent import futures
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Tuple
+
+import grpc
+from pydgraph.proto import api_pb2 as api
+from pydgraph.proto import api_pb2_grpc as api_grpc
+
+
+class FakeAlpha(api_grpc.DgraphServicer):
+    """In-process Dgraph Alpha gRPC service that records mutations, queries and when each call ran."""
+
+    def __init__(self, name: str, delay: float = 0.0) -> None:
+        self.name = name
+        self.delay = delay
+        self.mutations: List[List[Dict[str, Any]]] = []
+        self.queries: List[str] = []
+        self.commits = 0
+        self.calls: List[Tuple[float, float]] = []
+        self._start_ts = 0
+        self._lock = threading.Lock()
+
+    def Mutate(self, request, context):
+        with self._tracked():
+            nodes = json.loads(request.set_json) if request.set_json else []
+            with self._lock:
+                self.mutations.append(nodes)
+                start_ts = self._next_start_ts()
+            uids = {node["uid"][2:]: f"{self.name}-{start_ts}-{i}"
+                    for i, node in enumerate(nodes) if node.get("uid", "").startswith("_:")}
+            return api.Assigned(uids=uids, context=api.TxnContext(start_ts=start_ts))
+
+    def CommitOrAbort(self, request, context):
+        with self._lock:
+            if not request.aborted:
+                self.commits += 1
+        return api.TxnContext(start_ts=request.start_ts, commit_ts=request.start_ts + 1)
+
+    def Query(self, request, context):
+        with self._tracked():
+            with self._lock:
+                self.queries.append(request.query)
+                start_ts = self._next_start_ts()
+            return api.Response(json=json.dumps({"alpha": [{"name": self.name}]}).encode("utf8"),
+                                txn=api.TxnContext(start_ts=start_ts))
+
+    def Alter(self, request, context):
+        return api.Payload()
+
+    def CheckVersion(self, request, context):
+        return api.Version(tag="fake")
+
+    def _next_start_ts(self) -> int:
+        self._start_ts += 2
+        return self._start_ts
+
+    @contextmanager
+    def _tracked(self):
+        started = time.perf_counter()
+        time.sleep(self.delay)
+        yield
+        with self._lock:
+            self.calls.append((started, time.perf_counter()))
+
+
+def max_concurrent_calls(alphas: Iterable[FakeAlpha]) -> int:
+    """Most calls that were running at the same time across all `alphas`."""
+    events = sorted((time, change) for alpha in alphas for started, ended in alpha.calls
+                    for time, change in ((started, 1), (ended, -1)))
+    running = peak = 0
+    for _, change in events:
+        running += change
+        peak = max(peak, running)
+    return peak
+
+
+def start_fake_alpha(alpha: FakeAlpha) -> Tuple[grpc.Server, str]:
+    """Serves `alpha` on a free localhost port, returns the server and its endpoint."""
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=16))
+    api_grpc.add_DgraphServicer_to_server(alpha, server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, f"localhost:{port}"
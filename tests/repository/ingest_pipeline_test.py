@@ -0,0 +1,86 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from pydgraph import AbortedError
+
+from benchmarks.fake_dgraph_client import FakeDataSource, FakeDgraphClient
+from repository.ingest_pipeline import IngestPipeline
+from repository.product_repository import ProductRepository
+from repository.uid_cache import UidCache
+from tests.repository.factories import products
+from utils.metrics import Metrics
+
+
+class IngestPipelineTest(unittest.TestCase):
+
+    def test_every_product_is_loaded(self):
+        client = FakeDgraphClient()
+        pipeline = IngestPipeline(ProductRepository(FakeDataSource(client), UidCache()), batch_size=10, loaders=3)
+
+        report = pipeline.run(products(95))
+
+        self.assertEqual((95, 10, 0), (report.load.products, report.load.batches, report.load.retries))
+        self.assertEqual({str(i) for i in range(95)},
+                         {obj["barcode"] for obj in client.committed_objects if "barcode" in obj})
+        self.assertEqual([10, 10, 10], [stage.items for stage in report.stages])
+        self.assertIn(report.bottleneck, {"parse", "serialize", "load"})
+        self.assertIn("bottleneck", report.summary())
+
+    def test_stage_and_queue_figures_reach_the_metrics(self):
+        metrics = Metrics(enabled=True)
+        pipeline = IngestPipeline(ProductRepository(FakeDataSource(FakeDgraphClient()), UidCache()), batch_size=10)
+
+        with mock.patch("repository.ingest_pipeline.METRICS", metrics):
+            report = pipeline.run(products(30))
+
+        gauges = metrics.to_dict()["gauges"]
+        self.assertAlmostEqual(report.stages[2].utilization(report.load.seconds), gauges["pipeline.load.utilization"],
+                               places=5)
+        self.assertEqual(report.queues[0].max_depth, gauges["pipeline.batches.max_depth"])
+        self.assertIn("pipeline.payloads.mean_depth", gauges)
+
+    def test_queues_stay_bounded_when_loading_is_slow(self):
+        client = FakeDgraphClient()
+        commit = client.commit
+        parsed = []
+
+        def slow_commit(*args):
+            time.sleep(0.01)
+            commit(*args)
+
+        def tracked_products():
+            for product in products(200):
+                parsed.append(product)
+                yield product
+
+        client.commit = slow_commit
+        pipeline = IngestPipeline(ProductRepository(FakeDataSource(client)), batch_size=5, loaders=1, queue_depth=2)
+        in_flight = []
+        load_batch = pipeline.repository._loadBatch
+
+        def tracking_load_batch(prepared, *args):
+            in_flight.append(len(parsed) - len(client.committed_objects))
+            return load_batch(prepared, *args)
+
+        with mock.patch.object(pipeline.repository, "_loadBatch", tracking_load_batch):
+            report = pipeline.run(tracked_products())
+
+        self.assertEqual(200, report.load.products)
+        # two full queues, a batch in each stage and the one being parsed
+        self.assertLessEqual(max(in_flight), 5 * (2 + 2 + 3))
+        self.assertLessEqual(max(q.max_depth for q in report.queues), 2)
+        self.assertEqual("load", report.bottleneck)
+        self.assertGreater(report.stages[0].blocked_seconds, 0)
+
+    @mock.patch("repository.product_repository.time.sleep")
+    def test_a_failing_stage_stops_the_pipeline(self, sleep):
+        client = FakeDgraphClient(aborts=1000)
+        pipeline = IngestPipeline(ProductRepository(FakeDataSource(client)), batch_size=5, loaders=2, max_retries=1)
+
+        with self.assertRaises(AbortedError):
+            pipeline.run(products(10_000))
+
+        self.assertEqual([], client.committed)
+        self.assertFalse([thread for thread in threading.enumerate() if thread.name.startswith("ingest-")])
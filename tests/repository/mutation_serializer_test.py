@@ -0,0 +1,63 @@
+import json
+import unittest
+
+from models.product_models import Amount, Ingredient, Nutrient
+from repository.mutation_serializer import MutationSerializer
+from repository.uid_cache import UidCache
+from tests.repository.factories import product
+
+
+class MutationSerializerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sugar = Ingredient("_:ingredient_sugar", "sugar")
+        self.protein = Nutrient("_:nutrient_Protein", "Protein", "203", "LCCS")
+
+    def test_product_is_serialized_in_one_pass(self):
+        result = MutationSerializer().serialize(
+            [product("1", [self.sugar], {self.protein: Amount("_:amount_7.5_g", "7.5", "g")})])
+
+        self.assertEqual([{
+            "uid": "_:1",
+            "usda_food_db_id": "id_1",
+            "name": "name 1",
+            "source": {"uid": "_:source_LI", "abbreviation": "LI", "label": "source", "xid": "source_LI"},
+            "barcode": "1",
+            "manufactured_by": {"uid": "_:manufacturer_Hershey", "name": "Hershey", "label": "company",
+                                "xid": "manufacturer_Hershey"},
+            "date_modified": "2017-11-15T19:19:38",
+            "date_available": "2017-11-16T00:00:00",
+            "ingredients": [{"uid": "_:ingredient_sugar", "name": "sugar", "label": "ingredient",
+                             "xid": "ingredient_sugar"}],
+            "nutrients": [{"uid": "_:nutrient_Protein", "name": "Protein", "code": "203", "derivation_code": "LCCS",
+                           "label": "nutrient", "xid": "nutrient_Protein", "nutrients|amount": 7.5,
+                           "nutrients|unit": "g"}],
+            "label": "product",
+        }], result)
+
+    def test_shared_nodes_are_written_once_per_payload(self):
+        result = MutationSerializer().serialize([
+            product("1", [self.sugar], {self.protein: Amount("_:amount_7.5_g", "7.5", "g")}),
+            product("2", [self.sugar], {self.protein: Amount("_:amount_nan_g", "nan", "g")}),
+        ])
+
+        self.assertEqual({"uid": "_:manufacturer_Hershey"}, result[1]["manufactured_by"])
+        self.assertEqual([{"uid": "_:ingredient_sugar"}], result[1]["ingredients"])
+        self.assertEqual([{"uid": "_:nutrient_Protein", "nutrients|unit": "g"}], result[1]["nutrients"])
+
+    def test_cached_nodes_reference_their_real_uid(self):
+        uid_cache = UidCache()
+        uid_cache.update({"ingredient_sugar": "0x1", "nutrient_Protein": "0x2"})
+
+        result = MutationSerializer(uid_cache).serialize(
+            [product("1", [self.sugar], {self.protein: Amount("_:amount_7.5_g", "7.5", "g")})])
+
+        self.assertEqual([{"uid": "0x1"}], result[0]["ingredients"])
+        self.assertEqual([{"uid": "0x2", "nutrients|amount": 7.5, "nutrients|unit": "g"}], result[0]["nutrients"])
+        self.assertEqual("manufacturer_Hershey", result[0]["manufactured_by"]["xid"])
+
+    def test_serialize_bytes(self):
+        products = [product("1", [self.sugar], {})]
+
+        self.assertEqual(MutationSerializer().serialize(products),
+                         json.loads(MutationSerializer().serialize_bytes(products)))
@@ -0,0 +1,212 @@
+import itertools
+import re
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from pydgraph import AbortedError
+
+from benchmarks.fake_dgraph_client import FakeDataSource, FakeDgraphClient
+from models.product_models import Amount, Ingredient, Nutrient
+from repository.ingest_checkpoint import IngestCheckpoint
+from repository.mutation_serializer import MutationSerializer
+from repository.product_repository import PRODUCT_FIELDS, ProductRepository
+from repository.uid_cache import UidCache
+from tests.repository.factories import product, products
+
+
+def requested_fields(fields: str) -> set:
+    """The fields a query's selection asks for as dotted paths, e.g. {"uid", "source", "source.abbreviation"}."""
+    paths, parents, last = set(), [], None
+    for token in re.findall(r"@\w+\([^)]*\)|[{}]|\w+", fields):
+        if token == "{":
+            parents.append(last)
+        elif token == "}":
+            parents.pop()
+        elif not token.startswith("@"):
+            last = ".".join(parents + [token])
+            paths.add(last)
+    return paths
+
+
+def written_fields(nodes, prefix: str = "") -> set:
+    """The predicates serialized nodes write as dotted paths; facets are left out."""
+    paths = set()
+    for node in nodes:
+        for predicate, value in node.items():
+            if "|" in predicate:
+                continue
+            paths.add(prefix + predicate)
+            children = value if isinstance(value, list) else [value] if isinstance(value, dict) else []
+            paths |= written_fields(children, f"{prefix}{predicate}.")
+    return paths
+
+
+class BulkAddProductsTest(unittest.TestCase):
+
+    def test_products_are_committed_in_batches(self):
+        client = FakeDgraphClient()
+
+        report = ProductRepository(FakeDataSource(client)).bulkAddProducts(products(25), batch_size=10,
+                                                                            concurrency=3)
+
+        self.assertEqual((25, 3, 0), (report.products, report.batches, report.retries))
+        self.assertEqual([10, 10, 5], sorted((len(mutation) for mutation in client.committed), reverse=True))
+        self.assertEqual({str(i) for i in range(25)}, {obj["barcode"] for obj in client.committed_objects})
+        self.assertGreater(report.products_per_second, 0)
+
+    def test_add_products_consumes_the_stream_in_batches(self):
+        client = FakeDgraphClient()
+
+        report = ProductRepository(FakeDataSource(client)).addProducts(products(25), batch_size=10)
+
+        self.assertEqual((25, 3), (report.products, report.batches))
+        self.assertEqual([10, 10, 5], sorted((len(mutation) for mutation in client.committed), reverse=True))
+
+    @mock.patch("repository.product_repository.time.sleep")
+    def test_aborted_batches_are_retried(self, sleep):
+        client = FakeDgraphClient(aborts=2)
+
+        report = ProductRepository(FakeDataSource(client)).bulkAddProducts(products(5), batch_size=5)
+
+        self.assertEqual((5, 1, 2), (report.products, report.batches, report.retries))
+        self.assertEqual(2, sleep.call_count)
+        self.assertEqual(1, len(client.committed))
+
+    @mock.patch("repository.product_repository.time.sleep")
+    def test_gives_up_after_max_retries(self, sleep):
+        client = FakeDgraphClient(aborts=10)
+
+        with self.assertRaises(AbortedError):
+            ProductRepository(FakeDataSource(client)).bulkAddProducts(products(5), max_retries=2)
+
+
+class UidCacheLoadTest(unittest.TestCase):
+
+    def test_shared_nodes_are_written_once_across_batches_and_runs(self):
+        client = FakeDgraphClient()
+        ProductRepository(FakeDataSource(client), UidCache()).bulkAddProducts(products(6), batch_size=2,
+                                                                              concurrency=3)
+        repo = ProductRepository(FakeDataSource(client), UidCache())
+
+        self.assertEqual(2, repo.warmUidCache())
+        repo.bulkAddProducts(products(2))
+
+        xid_objects = [obj for obj in client.committed_objects if "xid" in obj]
+        self.assertEqual(["manufacturer_Hershey", "source_LI"], sorted(obj["xid"] for obj in xid_objects))
+        manufacturer_uid = client.xids["manufacturer_Hershey"]
+        self.assertEqual(8, [obj.get("manufactured_by") for obj in client.committed_objects].count(
+            {"uid": manufacturer_uid}))
+
+    def test_cache_is_persistent(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir).joinpath("uids.sqlite3")
+            uid_cache = UidCache(path)
+            uid_cache.update({"ingredient_sugar": "0x1"})
+            uid_cache.close()
+
+            self.assertEqual("0x1", UidCache(path).get("ingredient_sugar"))
+
+
+    @mock.patch("repository.product_repository.WARM_PAGE_SIZE", 2)
+    def test_warm_up_pages_through_dgraph_and_drops_stale_entries(self):
+        client = FakeDgraphClient()
+        client.xids = {"source_LI": "0x1", "manufacturer_Hershey": "0x2", "ingredient_salt": "0x5"}
+        uid_cache = UidCache()
+        uid_cache.update({"ingredient_sugar": "0x9", "source_LI": "0x7"})
+
+        self.assertEqual(3, ProductRepository(FakeDataSource(client), uid_cache).warmUidCache())
+
+        self.assertEqual(2, len([query for query in client.queries if "has(xid)" in query]))
+        self.assertEqual(("0x1", "0x5", None), (uid_cache.get("source_LI"), uid_cache.get("ingredient_salt"),
+                                                 uid_cache.get("ingredient_sugar")))
+
+
+class SyncProductsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeDgraphClient()
+        self.repo = ProductRepository(FakeDataSource(self.client), UidCache())
+        self.checkpoint = IngestCheckpoint()
+
+    def test_only_new_or_changed_products_are_sent(self):
+        self.repo.syncProducts(products(4), self.checkpoint, batch_size=2)
+        first_run_uids = {product_id: self.checkpoint.uid(product_id) for product_id in "0123"}
+        self.client.committed.clear()
+        self.client.requests.clear()
+
+        changed = list(products(5))
+        changed[1].name = "renamed"
+        report = self.repo.syncProducts(changed, self.checkpoint, batch_size=2)
+
+        self.assertEqual((2, 3, 0), (report.products, report.skipped, report.removed))
+        sent = {obj["barcode"]: obj["uid"] for obj in self.client.committed_objects if "barcode" in obj}
+        self.assertEqual({"1": first_run_uids["1"], "4": "_:4"}, sent)
+        self.assertEqual([{"uid": first_run_uids["1"], "ingredients": None, "nutrients": None}], self.client.deleted)
+        self.assertEqual(("set",), self.client.requests[self.client.requests.index(("delete",)) + 1])
+        self.assertNotIn(("delete", "set"), self.client.requests)
+        self.assertEqual(first_run_uids["1"], self.checkpoint.uid("1"))
+        self.assertTrue(self.checkpoint.uid("4").startswith("0x"))
+
+    def test_products_missing_from_a_run_are_deleted(self):
+        self.repo.syncProducts(products(3), self.checkpoint)
+        removed_uid = self.checkpoint.uid("2")
+
+        report = self.repo.syncProducts(products(2), self.checkpoint)
+
+        self.assertEqual((0, 2, 1), (report.products, report.skipped, report.removed))
+        self.assertEqual([{"uid": removed_uid}], self.client.deleted)
+        self.assertIsNone(self.checkpoint.uid("2"))
+
+    @mock.patch("repository.product_repository.time.sleep")
+    def test_resumes_after_crash(self, sleep):
+        self.client.aborts = 100
+        with self.assertRaises(AbortedError):
+            self.repo.syncProducts(products(6), self.checkpoint, batch_size=2, concurrency=1, max_retries=0)
+        self.assertEqual(0, len(self.checkpoint))
+
+        self.client.aborts = 0
+        self.repo.bulkAddProducts(itertools.islice(products(6), 2), checkpoint=self.checkpoint)
+        report = self.repo.syncProducts(products(6), self.checkpoint, batch_size=2)
+
+        self.assertEqual((4, 2, 0), (report.products, report.skipped, report.removed))
+
+
+class PointLookupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeDgraphClient()
+        self.repo = ProductRepository(FakeDataSource(self.client))
+        self.repo.bulkAddProducts(products(5))
+
+    def test_products_are_found_by_barcode_and_usda_id(self):
+        by_barcode = self.repo.getProductsByBarcodes(["1", "3", "missing"])
+        by_id = self.repo.getProductsByUsdaIds(["4"])
+
+        self.assertEqual(["1", "3"], sorted(by_barcode))
+        self.assertEqual("product 3", by_barcode["3"]["name"])
+        self.assertEqual(["4"], list(by_id))
+
+    def test_lookups_on_deferred_indexes_fail_until_they_are_rebuilt(self):
+        with self.repo.schema.deferredIndexes():
+            with self.assertRaises(RuntimeError):
+                self.repo.getProductsByBarcodes(["1"])
+
+        self.assertEqual(["1"], list(self.repo.getProductsByBarcodes(["1"])))
+
+    def test_lookups_request_only_fields_the_serializer_writes(self):
+        written = written_fields(MutationSerializer().serialize([product(
+            "1", [Ingredient("_:ingredient_sugar", "sugar")],
+            {Nutrient("_:nutrient_Protein_203_LCCS", "Protein", "203", "LCCS"): Amount("_:a", "7.5", "g")})]))
+
+        self.assertEqual(set(), requested_fields(PRODUCT_FIELDS) - written)
+
+    @mock.patch("repository.product_repository.LOOKUP_BATCH_SIZE", 2)
+    def test_lookups_are_batched_into_one_query_per_chunk(self):
+        found = self.repo.getProductsByUsdaIds(["0", "1", "2", "1", "4"])
+
+        lookups = [query for query in self.client.queries if "eq(usda_food_db_id" in query]
+        self.assertEqual(2, len(lookups))
+        self.assertIn('["0", "1"]', lookups[0])
+        self.assertEqual(["0", "1", "2", "4"], sorted(found))
@@ -0,0 +1,138 @@
+import json
+import unittest
+
+from benchmarks.fake_dgraph_client import FakeDataSource, FakeDgraphClient
+from repository.product_repository import ProductRepository
+from repository.query_cache import QueryCache, TouchedNodes
+from tests.repository.factories import products
+
+PRODUCTS = '{ q(func: eq(label, "product")) { uid name } }'
+BY_VARIABLE = "query q($label: string) { q(func: eq(label, $label)) { name } }"
+
+
+def loader(result, calls):
+    def load():
+        calls.append(result)
+        return json.dumps(result).encode("utf8")
+    return load
+
+
+class QueryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.cache = QueryCache(max_entries=3, max_bytes=1000, ttl_seconds=10, clock=lambda: self.now)
+        self.calls = []
+
+    def test_results_are_loaded_once_and_decoded_per_hit(self):
+        load = loader({"q": [{"uid": "0x1", "name": "a"}]}, self.calls)
+
+        first = self.cache.get_or_load(PRODUCTS, None, load)
+        first["q"].clear()
+        second = self.cache.get_or_load(PRODUCTS, None, load)
+
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual([{"uid": "0x1", "name": "a"}], second["q"])
+        self.assertEqual((1, 1, 0.5), (self.cache.stats.hits, self.cache.stats.misses, self.cache.stats.hit_rate))
+
+    def test_variables_are_part_of_the_key(self):
+        self.cache.get_or_load(BY_VARIABLE, {"$label": "product"}, loader({"q": []}, self.calls))
+        self.cache.get_or_load(BY_VARIABLE, {"$label": "company"}, loader({"q": []}, self.calls))
+
+        self.assertEqual(2, len(self.cache))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for i in range(3):
+            self.cache.get_or_load(f"{PRODUCTS} # {i}", None, loader({"q": []}, self.calls))
+        self.cache.get_or_load(f"{PRODUCTS} # 0", None, loader({"q": []}, self.calls))
+        self.cache.get_or_load(f"{PRODUCTS} # 3", None, loader({"q": []}, self.calls))
+        self.cache.get_or_load(f"{PRODUCTS} # 1", None, loader({"q": []}, self.calls))
+
+        self.assertEqual(5, len(self.calls))
+        self.assertEqual(2, self.cache.stats.evictions)
+
+    def test_memory_limit(self):
+        self.cache.get_or_load(PRODUCTS, None, loader({"q": ["x" * 600]}, self.calls))
+        self.cache.get_or_load(BY_VARIABLE, {"$label": "product"}, loader({"q": ["y" * 600]}, self.calls))
+        self.cache.get_or_load("{ huge }", None, loader({"q": ["z" * 2000]}, self.calls))
+
+        self.assertEqual(1, len(self.cache))
+        self.assertLessEqual(self.cache.stats.bytes, 1000)
+
+    def test_entries_expire(self):
+        self.cache.get_or_load(PRODUCTS, None, loader({"q": []}, self.calls))
+        self.now = 11
+        self.cache.get_or_load(PRODUCTS, None, loader({"q": []}, self.calls))
+
+        self.assertEqual((2, 1), (len(self.calls), self.cache.stats.expirations))
+
+    def test_writes_invalidate_entries_by_label_and_uid(self):
+        self.cache.get_or_load(PRODUCTS, None, loader({"q": [{"uid": "0x1"}]}, self.calls))
+        self.cache.get_or_load(BY_VARIABLE, {"$label": "company"}, loader({"q": []}, self.calls))
+        self.cache.get_or_load("{ q(func: uid(0x2)) { label } }", None, loader({"q": [{"label": "nutrient"}]},
+                                                                               self.calls))
+
+        self.assertEqual(1, self.cache.invalidate(TouchedNodes(labels={"product"})))
+        self.assertEqual(0, self.cache.invalidate(TouchedNodes(labels={"ingredient"})))
+        self.assertEqual(1, self.cache.invalidate(TouchedNodes({"0x7"}, {"company"})))
+        self.assertEqual(1, len(self.cache))
+
+    def test_results_without_labels_are_invalidated_by_any_write(self):
+        self.cache.get_or_load("{ q(func: has(xid)) { xid } }", None, loader({"q": [{"xid": "a"}]}, self.calls))
+
+        self.assertEqual(1, self.cache.invalidate(TouchedNodes(labels={"ingredient"})))
+
+    def test_result_loaded_across_a_write_is_not_cached(self):
+        def load_while_writing():
+            self.cache.invalidate(TouchedNodes(labels={"product"}))
+            return b'{"q": []}'
+
+        self.cache.get_or_load(PRODUCTS, None, load_while_writing)
+
+        self.assertEqual(0, len(self.cache))
+
+    def test_touched_nodes_are_only_computed_when_there_are_entries(self):
+        computed = []
+
+        def touched():
+            computed.append(True)
+            return TouchedNodes(labels={"product"})
+
+        self.assertEqual(0, self.cache.invalidate(touched))
+        self.cache.get_or_load(PRODUCTS, None, loader({"q": []}, self.calls))
+        self.assertEqual(1, self.cache.invalidate(touched))
+        self.assertEqual(1, len(computed))
+
+    def test_touched_nodes_of_a_mutation(self):
+        touched = TouchedNodes.of([{"uid": "0x5", "label": "product", "manufactured_by": {"uid": "0x9"},
+                                    "ingredients": [{"uid": "_:ingredient_salt", "label": "ingredient"}]}])
+
+        self.assertEqual(({"0x5", "0x9"}, {"product", "ingredient"}), (touched.uids, touched.labels))
+
+
+class ProductRepositoryQueryCacheTest(unittest.TestCase):
+
+    def test_lookups_are_cached_until_products_are_added(self):
+        client = FakeDgraphClient()
+        repo = ProductRepository(FakeDataSource(client))
+        repo.bulkAddProducts(products(3))
+
+        repo.getProductsByBarcodes(["1", "7"])
+        repo.getProductsByBarcodes(["1", "7"])
+        lookups_before_write = len(client.queries)
+        repo.addProducts(list(products(8))[7:])
+        found = repo.getProductsByBarcodes(["1", "7"])
+
+        self.assertEqual(1, lookups_before_write)
+        self.assertEqual(2, len(client.queries))
+        self.assertEqual(["1", "7"], sorted(found))
+        self.assertEqual((1, 2), (repo.query_cache.stats.hits, repo.query_cache.stats.misses))
+
+    def test_bulk_loads_invalidate_the_cache(self):
+        client = FakeDgraphClient()
+        repo = ProductRepository(FakeDataSource(client))
+
+        self.assertEqual({}, repo.getProductsByUsdaIds(["2"]))
+        repo.bulkAddProducts(products(3))
+
+        self.assertEqual(["2"], list(repo.getProductsByUsdaIds(["2"])))
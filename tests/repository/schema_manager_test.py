@@ -0,0 +1,64 @@
+import unittest
+
+from pydgraph import Operation
+
+from benchmarks.fake_dgraph_client import FakeDgraphClient
+from repository.schema_manager import PREDICATES, SCHEMA, PredicateSchema, SchemaManager
+
+
+class SchemaManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeDgraphClient()
+        self.manager = SchemaManager(self.client)
+
+    def test_lookup_predicates_are_indexed(self):
+        self.assertIn("<barcode>: string @index(hash) .", SCHEMA)
+        self.assertIn("<usda_food_db_id>: string @index(hash) .", SCHEMA)
+        self.assertIn("<name>: string @index(exact, term) .", SCHEMA)
+        self.assertIn("<ingredients>: uid @count @reverse .", SCHEMA)
+
+    def test_apply_alters_only_changed_predicates(self):
+        self.client.alter(Operation(schema=SCHEMA.replace("<barcode>: string @index(hash)", "<barcode>: string")))
+
+        changes = self.manager.apply()
+
+        self.assertEqual(["barcode"], [predicate.name for predicate in changes])
+        self.assertEqual("<barcode>: string @index(hash) .\n", self.client.operations[-1].schema)
+        self.assertEqual([], self.manager.apply())
+        self.assertEqual(2, len(self.client.operations))
+
+    def test_empty_database_gets_the_whole_schema_in_one_alter(self):
+        self.assertEqual(len(PREDICATES), len(self.manager.apply()))
+        self.assertEqual(1, len(self.client.operations))
+        self.assertEqual(set(SCHEMA.splitlines()), set(self.client.operations[0].schema.splitlines()))
+
+    def test_deferred_indexes_are_dropped_during_the_load_and_rebuilt_in_one_pass(self):
+        self.manager.apply()
+
+        with self.manager.deferredIndexes():
+            during_load = self.manager.current()
+        rebuilt = self.client.operations[-1].schema
+
+        self.assertEqual((), during_load["barcode"].indexes)
+        self.assertFalse(during_load["ingredients"].reverse)
+        self.assertEqual(("exact",), during_load["xid"].indexes)
+        self.assertEqual(("exact",), during_load["label"].indexes)
+        self.assertEqual(3, len(self.client.operations))
+        self.assertIn("<barcode>: string @index(hash) .", rebuilt)
+        self.assertNotIn("<xid>", rebuilt)
+        self.assertEqual([], self.manager.diff())
+
+    def test_indexes_are_rebuilt_when_the_load_fails(self):
+        self.manager.apply()
+
+        with self.assertRaises(RuntimeError):
+            with self.manager.deferredIndexes():
+                raise RuntimeError("load failed")
+
+        self.assertEqual([], self.manager.diff())
+
+    def test_render(self):
+        predicate = PredicateSchema("code", "string", indexes=("exact",), upsert=True)
+
+        self.assertEqual("<code>: string @index(exact) @upsert .", predicate.render())
@@ -0,0 +1,51 @@
+import random
+import unittest
+
+import numpy as np
+
+from search.compressed_bitmap import ARRAY_LIMIT, BITMAP_BYTES, CompressedBitmap
+
+
+class CompressedBitmapTest(unittest.TestCase):
+
+    def test_add_discard_contains(self):
+        bitmap = CompressedBitmap([5, 3, 70000, 3])
+
+        bitmap.discard(5)
+        bitmap.discard(12345)
+
+        self.assertEqual([3, 70000], list(bitmap))
+        self.assertIn(70000, bitmap)
+        self.assertNotIn(5, bitmap)
+        self.assertEqual(2, len(bitmap))
+
+    def test_dense_groups_switch_to_bitmaps_and_back(self):
+        bitmap = CompressedBitmap.from_array(np.arange(ARRAY_LIMIT + 1))
+        self.assertEqual(BITMAP_BYTES, bitmap.size_in_bytes())
+
+        bitmap.discard(0)
+
+        self.assertEqual(ARRAY_LIMIT * 2, bitmap.size_in_bytes())
+        self.assertEqual(list(range(1, ARRAY_LIMIT + 1)), list(bitmap))
+
+    def test_set_operations_match_python_sets(self):
+        rng = random.Random(7)
+        for _ in range(20):
+            # mixes sparse and dense groups across several high words
+            a = {rng.randrange(200000) for _ in range(rng.choice([10, 5000, 30000]))}
+            b = {rng.randrange(200000) for _ in range(rng.choice([10, 5000, 30000]))}
+            bitmap_a, bitmap_b = CompressedBitmap.from_array(np.array(sorted(a))), CompressedBitmap(b)
+
+            self.assertEqual(sorted(a & b), list(bitmap_a & bitmap_b))
+            self.assertEqual(sorted(a | b), list(bitmap_a | bitmap_b))
+            self.assertEqual(sorted(a - b), list(bitmap_a - bitmap_b))
+            self.assertEqual(sorted(b - a), list(bitmap_b - bitmap_a))
+            self.assertEqual(len(a), len(bitmap_a))
+
+    def test_operations_do_not_share_containers(self):
+        a = CompressedBitmap([1, 2])
+        union = a | CompressedBitmap([70000])
+
+        union.add(3)
+
+        self.assertEqual([1, 2], list(a))
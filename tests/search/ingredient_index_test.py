@@ -0,0 +1,67 @@
+import unittest
+from datetime import datetime
+
+from models.product_models import FoodProduct, Ingredient, InformationSource, Manufacturer
+from search.ingredient_index import IngredientIndex
+
+
+def product(product_id: str, *ingredients: str) -> FoodProduct:
+    return FoodProduct(f"_:{product_id}", product_id, f"product {product_id}", InformationSource("_:source_LI", "LI"),
+                       product_id, Manufacturer("_:manufacturer_Hershey", "Hershey"), datetime(2017, 11, 15),
+                       datetime(2017, 11, 15), [Ingredient(f"_:ingredient_{name}", name) for name in ingredients], {})
+
+
+class IngredientIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = IngredientIndex()
+        self.index.add_all([
+            product("1", "sugar", "cocoa butter", "palm oil"),
+            product("2", "sugar", "cocoa butter"),
+            product("3", "peanuts", "salt"),
+            product("4", "sugar", "salt", "sugar"),
+        ])
+
+    def test_and_or_not(self):
+        self.assertEqual(["2", "4"], self.index.query(all_of=["sugar"], none_of=["palm oil"]))
+        self.assertEqual(["1", "2"], self.index.query(all_of=["sugar", "cocoa butter"]))
+        self.assertEqual(["1", "3", "4"], self.index.query(any_of=["salt", "palm oil"]))
+        self.assertEqual(["4"], self.index.query(all_of=["sugar"], any_of=["salt", "peanuts"]))
+        self.assertEqual(["3"], self.index.query(none_of=["sugar"]))
+        self.assertEqual([], self.index.query(all_of=["sugar", "unknown"]))
+        self.assertEqual(["1", "2", "3", "4"], self.index.query())
+
+    def test_query_terms_are_normalized(self):
+        self.assertEqual(["1"], self.index.query(all_of=[" Palm Oil "]))
+        self.assertEqual(3, self.index.document_frequency("SUGAR"))
+
+    def test_readding_a_product_replaces_its_ingredients(self):
+        self.index.add(product("1", "sugar"))
+
+        self.assertEqual([], self.index.query(all_of=["palm oil"]))
+        self.assertNotIn("palm oil", self.index.ingredients())
+        self.assertEqual(["1", "2", "4"], self.index.query(all_of=["sugar"]))
+        self.assertEqual(4, len(self.index))
+
+    def test_remove(self):
+        self.index.remove("4")
+
+        self.assertEqual(["3"], self.index.query(all_of=["salt"]))
+        self.assertEqual(["1", "2", "3"], self.index.query())
+        self.assertNotIn("4", self.index)
+
+    def test_indexing_passes_products_through(self):
+        index = IngredientIndex()
+        products = [product("5", "water"), product("6", "water", "salt")]
+
+        self.assertEqual(products, list(index.indexing(products)))
+        self.assertEqual(["5", "6"], index.query(all_of=["water"]))
+
+    def test_many_products(self):
+        index = IngredientIndex()
+        index.add_all(product(str(i), "water", "salt" if i % 3 == 0 else "sugar") for i in range(100000))
+
+        salty = index.match(all_of=["water"], none_of=["sugar"])
+
+        self.assertEqual(33334, len(salty))
+        self.assertLess(index.size_in_bytes(), 100000)
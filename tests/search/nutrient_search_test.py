@@ -0,0 +1,97 @@
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from models.nutrient_table import NutrientTable
+from models.product_models import Amount, FoodProduct, InformationSource, Manufacturer, Nutrient
+from search.nutrient_search import NutrientColumn, NutrientSearch, normalize_amount
+
+
+def product(product_id: str, nutrients) -> FoodProduct:
+    return FoodProduct(f"_:{product_id}", product_id, f"product {product_id}", InformationSource("_:source_LI", "LI"),
+                       product_id, Manufacturer("_:manufacturer_Hershey", "Hershey"), datetime(2017, 11, 15),
+                       datetime(2017, 11, 15), [], nutrients)
+
+
+class NutrientSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        table = NutrientTable()
+        self.products = [
+            product(product_id, table.append(product_id, [
+                ("203", "Protein", "LCCS", protein, "g"),
+                ("204", "Total lipid (fat)", "LCCS", fat, "g"),
+                ("307", "Sodium, Na", "LCCS", sodium, "mg"),
+            ]))
+            for product_id, protein, fat, sodium in [
+                ("1", "25.0", "1.0", "100"),
+                ("2", "24.0", "1.5", "120"),
+                ("3", "2.0", "30.0", "5"),
+                ("4", "3.0", "28.0", "10"),
+                ("5", "10.0", "10.0", "2000"),
+            ]
+        ]
+        self.search = NutrientSearch.from_products(self.products)
+
+    def test_amounts_are_normalized(self):
+        self.assertEqual((0.5, "g"), normalize_amount("500", "mg"))
+        self.assertEqual((2.0, "g"), normalize_amount("2000000", "µg"))
+        self.assertEqual((1.0, "kcal"), normalize_amount("4.184", "kJ"))
+        self.assertEqual((100.0, "IU"), normalize_amount("100", "IU"))
+        self.assertTrue(np.isnan(normalize_amount("n/a", "g")[0]))
+
+    def test_profiles_form_a_dense_matrix(self):
+        self.assertEqual(np.float32, self.search.matrix.dtype)
+        self.assertEqual((5, 3), self.search.matrix.shape)
+        self.assertEqual(NutrientColumn("307", "Sodium, Na", "g"), self.search.columns[2])
+        np.testing.assert_allclose([25.0, 1.0, 0.1], self.search.vector("1"))
+
+    def test_mapping_profiles_match_table_profiles(self):
+        protein = Nutrient("_:nutrient_Protein", "Protein", "203", "LCCS")
+        sodium = Nutrient("_:nutrient_Sodium, Na", "Sodium, Na", "307", "LCCS")
+        search = NutrientSearch.from_products([product("1", {
+            protein: Amount("_:amount_25_g", "25.0", "g"),
+            sodium: Amount("_:amount_100_mg", "100", "mg"),
+        })])
+
+        np.testing.assert_allclose([25.0, 0.1], search.vector("1"))
+
+    def test_top_by_nutrient(self):
+        self.assertEqual([("1", 25.0), ("2", 24.0)], self.search.top_by("203", k=2))
+        self.assertEqual(["3", "4"], [product_id for product_id, _ in self.search.top_by("307", k=2, largest=False)])
+        self.assertEqual("5", self.search.top_by("307", k=1, unit="mg")[0][0])
+
+    def test_nearest_products(self):
+        cosine = self.search.nearest(["1", "3"], k=1)
+        l2 = self.search.nearest(["4"], k=2, metric="l2")
+
+        self.assertEqual([["2"], ["4"]], [[product_id for product_id, _ in hits] for hits in cosine])
+        self.assertEqual("3", l2[0][0][0])
+        self.assertLess(l2[0][0][1], l2[0][1][1])
+
+    def test_nearest_to_profile(self):
+        hits = self.search.nearest_to_profiles(np.array([2.5, 29.0, 0.007]), k=2)
+
+        self.assertEqual({"3", "4"}, {product_id for product_id, _ in hits[0]})
+
+    def test_approximate_index_finds_exact_neighbours_when_probing_all_lists(self):
+        rng = np.random.default_rng(1)
+        search = NutrientSearch([str(i) for i in range(500)], self.search.columns,
+                                rng.random((500, 3), dtype=np.float32))
+        search.build_approximate_index(lists=10)
+
+        exact = search.nearest(["0", "1", "2"], k=5)
+        approximate = search.nearest(["0", "1", "2"], k=5, approximate=True, probes=10)
+        partial = search.nearest(["0"], k=5, approximate=True, probes=2)
+
+        self.assertEqual(exact, approximate)
+        self.assertEqual(5, len(partial[0]))
+
+    def test_approximate_query_needs_an_index(self):
+        with self.assertRaises(ValueError):
+            self.search.nearest(["1"], approximate=True)
+
+    def test_unknown_metric(self):
+        with self.assertRaises(ValueError):
+            self.search.nearest(["1"], metric="manhattan")
@@ -0,0 +1,70 @@
+import json
+import unittest
+
+from utils.metrics import Metrics
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_disabled_records_nothing(self):
+        metrics = Metrics()
+
+        with metrics.stage("parse.memo"):
+            pass
+        metrics.count("parse.products")
+        metrics.observe("load.batch_latency_seconds", 0.1)
+        metrics.gauge("pipeline.load.utilization", 0.5)
+        items = [1, 2]
+
+        self.assertIs(items, metrics.timed_iter("parse.csv_read", items))
+        self.assertEqual({}, metrics.stages)
+        self.assertEqual({}, metrics.counters)
+        self.assertEqual({}, metrics.gauges)
+        self.assertEqual({}, metrics.histograms)
+
+    def test_stages_counters_and_histograms(self):
+        metrics = Metrics(enabled=True)
+
+        for _ in range(2):
+            with metrics.stage("parse.memo"):
+                pass
+        self.assertEqual(["a", "b"], list(metrics.timed_iter("parse.csv_read", ["a", "b"])))
+        metrics.count("load.products", 3)
+        metrics.count("load.products")
+        metrics.observe("load.batch_latency_seconds", 0.02)
+        metrics.observe("load.batch_latency_seconds", 100)
+
+        report = metrics.to_dict()
+        self.assertEqual(2, report["stages"]["parse.memo"]["calls"])
+        self.assertEqual(3, report["stages"]["parse.csv_read"]["calls"])  # two rows plus the exhausted call
+        self.assertEqual(4, report["counters"]["load.products"]["value"])
+        histogram = report["histograms"]["load.batch_latency_seconds"]
+        self.assertEqual(2, histogram["count"])
+        self.assertEqual(1, histogram["buckets"]["0.025"])
+        self.assertEqual(1, histogram["buckets"]["+Inf"])
+        self.assertEqual(report["stages"], json.loads(metrics.to_json())["stages"])
+
+    def test_prometheus_format(self):
+        metrics = Metrics(enabled=True)
+        with metrics.stage("load.commit"):
+            pass
+        metrics.count("parse.products", 5)
+        metrics.observe("load.batch_latency_seconds", 0.3)
+        metrics.gauge("pipeline.load.utilization", 0.75)
+
+        text = metrics.to_prometheus()
+
+        self.assertIn('ingest_stage_calls_total{stage="load.commit"} 1', text)
+        self.assertIn('ingest_rows_total{counter="parse.products"} 5', text)
+        self.assertIn('ingest_gauge{gauge="pipeline.load.utilization"} 0.75', text)
+        self.assertIn('ingest_load_batch_latency_seconds_bucket{le="0.25"} 0', text)
+        self.assertIn('ingest_load_batch_latency_seconds_bucket{le="0.5"} 1', text)
+        self.assertIn("ingest_load_batch_latency_seconds_count 1", text)
+
+    def test_enable_resets(self):
+        metrics = Metrics(enabled=True)
+        metrics.count("parse.products")
+
+        metrics.enable()
+
+        self.assertEqual({}, metrics.counters)
@@ -6,7 +6,11 @@ import json
 class JSONEncoderEnhancedWithDateSerialization(json.JSONEncoder):
     def default(self, obj):
         if dataclasses.is_dataclass(obj):
-            return dataclasses.asdict(obj)
+            # shallow on purpose, nested models come back through default() and get their own label
+            obj_dict = {field.name: getattr(obj, field.name) for field in dataclasses.fields(obj)}
+            if hasattr(obj, "label"):
+                obj_dict["label"] = obj.label
+            return obj_dict
         elif isinstance(obj, datetime.datetime):
             return obj.isoformat()
         elif isinstance(obj, datetime.date):
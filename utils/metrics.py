@@ -0,0 +1,184 @@
+import bisect
+import json
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Tuple, TypeVar
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+T = TypeVar("T")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+_END = object()
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "wall", "cpu")
+
+    def __init__(self, metrics: "Metrics", name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.metrics._add_stage(self.name, time.perf_counter() - self.wall, time.thread_time() - self.cpu)
+        return False
+
+
+class Histogram:
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> dict:
+        return {"buckets": dict(zip([str(bucket) for bucket in self.buckets] + ["+Inf"], self.counts)),
+                "count": self.count, "sum": round(self.sum, 6)}
+
+
+class Metrics:
+    """
+    Per-stage wall/CPU timers, counters, gauges and histograms for the ingest pipeline. Disabled by default, in which case
+    every call returns straight away and `stage()` hands out a shared no-op context manager.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self) -> None:
+        self.reset()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self.started = time.perf_counter()
+        self.stages: Dict[str, List[float]] = {}  # name -> [calls, wall seconds, cpu seconds]
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}  # last value set
+        self.histograms: Dict[str, Histogram] = {}
+
+    def stage(self, name: str):
+        return _Stage(self, name) if self.enabled else _NULL_STAGE
+
+    def timed_iter(self, name: str, iterable: Iterable[T]) -> Iterable[T]:
+        """Times every step of `iterable` as stage `name`; returns it untouched when disabled."""
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(name, iter(iterable))
+
+    def _timed_iter(self, name: str, iterator: Iterator[T]) -> Iterator[T]:
+        while True:
+            with self.stage(name):
+                item = next(iterator, _END)
+            if item is _END:
+                return
+            yield item
+
+    def count(self, name: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def _add_stage(self, name: str, wall: float, cpu: float) -> None:
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = [0, 0.0, 0.0]
+            stage[0] += 1
+            stage[1] += wall
+            stage[2] += cpu
+
+    def to_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "elapsed_seconds": round(elapsed, 6),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": {name: {"calls": calls, "wall_seconds": round(wall, 6), "cpu_seconds": round(cpu, 6)}
+                       for name, (calls, wall, cpu) in sorted(self.stages.items())},
+            "counters": {name: {"value": value, "per_second": round(value / elapsed, 2) if elapsed else None}
+                         for name, value in sorted(self.counters.items())},
+            "gauges": {name: round(value, 6) for name, value in sorted(self.gauges.items())},
+            "histograms": {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = "ingest") -> str:
+        lines = [f"# TYPE {prefix}_peak_rss_bytes gauge", f"{prefix}_peak_rss_bytes {peak_rss_bytes()}"]
+        for metric, index in (("stage_calls_total", 0), ("stage_wall_seconds_total", 1),
+                              ("stage_cpu_seconds_total", 2)):
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            lines += [f'{prefix}_{metric}{{stage="{name}"}} {values[index]}'
+                      for name, values in sorted(self.stages.items())]
+        lines.append(f"# TYPE {prefix}_rows_total counter")
+        lines += [f'{prefix}_rows_total{{counter="{name}"}} {value}' for name, value in sorted(self.counters.items())]
+        lines.append(f"# TYPE {prefix}_gauge gauge")
+        lines += [f'{prefix}_gauge{{gauge="{name}"}} {value}' for name, value in sorted(self.gauges.items())]
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f"{prefix}_{name.replace('.', '_')}"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bucket, count in zip([str(bucket) for bucket in histogram.buckets] + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bucket}"}} {cumulative}')
+            lines += [f"{metric}_sum {histogram.sum}", f"{metric}_count {histogram.count}"]
+        return "\n".join(lines) + "\n"
+
+
+def peak_rss_bytes() -> int:
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+METRICS = Metrics()